@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'system.metrics.MetricsMiddleware',
+    'system.instrumentation.RequestTimingMiddleware',
+    'system.db_routing.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -55,8 +61,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'reports.audit.AuditMiddleware',
 ]
 
+# ASGI（backend/asgi.py）的 request 另外指定 backend.urls_async，讀取端點使用 async view
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -92,6 +100,24 @@ LOGGING = {
     },
 }
 
+# 請求計時：Server-Timing header，慢請求與疑似 N+1 查詢記錄到 equip_mgmt logger
+REQUEST_TIMING_ENABLED = True
+SLOW_REQUEST_MS = 500
+# 同一個 SQL 在單一請求中重複執行達此次數即視為疑似 N+1
+REPEATED_QUERY_THRESHOLD = 10
+
+# Prometheus 格式的 metrics（/api/system/metrics）
+METRICS_ENABLED = True
+# 多個 gunicorn worker 時需指定共用目錄，各 worker 定期寫入自己的累計值；未指定時只統計本行程
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_DUMP_INTERVAL = 5
+# scraper 以 Authorization: Bearer <METRICS_TOKEN> 讀取；部署在反向代理（nginx 等）之後必須設定
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# 未設定 METRICS_TOKEN 時只允許本機直接連線的 scraper 讀取。
+# 注意：同一台機器上的反向代理轉發時 REMOTE_ADDR 一律是 127.0.0.1，
+# 因此帶有 X-Forwarded-For / X-Real-IP / Forwarded 的請求一律拒絕
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -106,12 +132,79 @@ DATABASES = {
     }
 }
 
+# 唯讀副本：DB_REPLICA_HOSTS=host1,host2:5433（帳號密碼與 default 相同）
+# 設定後 GET 請求的查詢改送副本（system.db_routing），未設定時全部使用 default
+DATABASE_REPLICAS = []
+for _index, _address in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    _host, _, _port = _address.strip().partition(':')
+    DATABASES[f'replica{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'OPTIONS': {'connect_timeout': 2},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['system.db_routing.ReplicaRouter']
+# 副本健康檢查間隔（秒）；複寫延遲超過 REPLICA_MAX_LAG 秒的副本暫停使用
+REPLICA_HEALTH_CHECK_INTERVAL = 5
+REPLICA_MAX_LAG = 5
+# 寫入後此秒數內，同一用戶端的讀取都走主庫（read-your-writes），應大於 REPLICA_MAX_LAG
+# 同源用戶端靠 cookie；跨來源的前端由 axios interceptor 把回應的 header 帶回（見 CORS_EXPOSE_HEADERS）
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'db_primary_until'
+REPLICA_STICKY_HEADER = 'X-DB-Primary-Until'
+
+
+# SystemSetting 行程內快取的版本檢查間隔（秒），設定變更最多延遲此時間生效於其他 worker
+SYSTEM_SETTINGS_CACHE_TTL = 5
+
+
+# 序列化結果（資產 / 產品 / 人員）的行程內 LRU 快取筆數上限
+FRAGMENT_CACHE_MAX_ENTRIES = 20000
+
+# 稽核紀錄：事件先放入行程內緩衝區，達到筆數或間隔秒數時批次寫入
+AUDIT_ENABLED = True
+AUDIT_BUFFER_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 2.0
+# 超過保留天數的稽核紀錄由 archive_audit_events 移到壓縮檔（gzip JSONL）後刪除
+AUDIT_RETENTION_DAYS = 365
+AUDIT_ARCHIVE_DIR = BASE_DIR / 'audit_archive'
+
+# 背景工作（manage.py run_job_workers）：大量匯入改由 worker 執行，API 立即回傳 job
+# 目前前端（PeopleManagement 等）匯入後直接重新載入列表、不會輪詢 /api/system/jobs/<id>/，
+# 需先讓前端改為輪詢並部署 worker 才能開啟
+IMPORT_IN_BACKGROUND = False
+JOB_WORKER_PROCESSES = 2
+# 上傳的 CSV 暫存於此，匯入結束後刪除（worker 需能讀取同一目錄）
+JOB_UPLOAD_DIR = BASE_DIR / 'job_uploads'
+JOB_POLL_INTERVAL = 1.0
+# 執行中的工作每 JOB_HEARTBEAT_INTERVAL 秒回報一次；超過 JOB_STALE_AFTER 秒未回報視為 worker 中斷，重新排入佇列
+JOB_HEARTBEAT_INTERVAL = 10
+JOB_STALE_AFTER = 60
+JOB_MAX_ATTEMPTS = 3
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# JWT 驗證：token 內帶人員 claim，一般請求不查詢資料庫
+# 人員停用狀態的版本檢查間隔（秒），停用後最多延遲此時間於其他 worker 失效
+AUTH_VERSION_CHECK_INTERVAL = 5
+# 沒有 claim 的舊 token 改查資料庫時的快取時間（秒）
+AUTH_USER_CACHE_TTL = 30
+# refresh token 黑名單的行程內 Bloom filter：預估筆數與誤判率（誤判時才查詢資料庫）
+TOKEN_BLACKLIST_FILTER_CAPACITY = 100000
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = 0.001
+# 黑名單 id 缺號（未 commit 或已 rollback）最多等待的秒數；期間每次同步都重新讀取缺號之後的黑名單
+TOKEN_BLACKLIST_SYNC_OVERLAP = 60
+
+# 批次匯入人員時，密碼雜湊使用的 process 數（None = CPU 核心數，最多 4）；每個行程共用一個 pool
+PASSWORD_HASH_WORKERS = None
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -162,9 +255,13 @@ CSRF_TRUSTED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# read-your-writes header（REPLICA_STICKY_HEADER）需讓前端讀取並回傳
+CORS_EXPOSE_HEADERS = [REPLICA_STICKY_HEADER]
+CORS_ALLOW_HEADERS = (*default_headers, REPLICA_STICKY_HEADER.lower())
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -23,4 +23,5 @@ urlpatterns = [
     path('api/inventory/', include('inventory.urls')),
     path('api/departments/', include('departments.urls')),
     path("api/system/", include("system.urls")),
+    path('api/reports/', include('reports.urls')),
 ]
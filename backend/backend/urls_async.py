@@ -0,0 +1,23 @@
+"""
+ASGI 使用的 URL 設定（backend/asgi.py 預設）
+
+與 backend.urls 相同，但下列讀取端點改用 async view（GET 使用 async ORM，
+其他 method 仍交給原本的 sync view）。放在 backend.urls 之前，先比對到者優先
+"""
+from django.urls import path
+
+from backend.urls import urlpatterns as sync_urlpatterns
+from departments import views_async as departments_async
+from inventory import views as inventory_views
+from inventory import views_async as inventory_async
+from users.views import views_async as users_async
+
+urlpatterns = [
+    path('api/users/', users_async.users_list, name='users_list'),
+    path('api/inventory/assets/', inventory_async.assets_list, name='assets_list'),
+    path('api/inventory/assets/<int:pk>/', inventory_async.asset_detail, name='asset_detail'),
+    # 需在 stock_history/<str:asset_tag>/ 之前，否則 "batch" 會被當成 asset_tag
+    path('api/inventory/stock_history/batch/', inventory_views.stock_history_batch),
+    path('api/inventory/stock_history/<str:asset_tag>/', inventory_async.stock_history),
+    path('api/departments/', departments_async.departments_list, name='departments_list'),
+] + sync_urlpatterns
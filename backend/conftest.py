@@ -0,0 +1,11 @@
+import pytest
+from django.db import connection
+
+
+@pytest.fixture(scope="session")
+def django_db_setup(django_db_setup, django_db_blocker):
+    # --nomigrations 不會執行 users 0006 / 0007 migration，PostgreSQL 需自行建立 pg_trgm（UserNameResolver 使用）
+    with django_db_blocker.unblock():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
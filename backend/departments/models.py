@@ -1,6 +1,9 @@
 from django.db import models
 
-class Department(models.Model):
+from system.tracking import LoadedValuesMixin
+
+
+class Department(LoadedValuesMixin, models.Model):
     name = models.CharField(max_length=100, unique=True)
     manager = models.ForeignKey(
         "users.CustomUser",
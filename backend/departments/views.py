@@ -1,12 +1,14 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from system.versioning import conditional_on_tables
 from .models import Department
 from .serializers import DepartmentSerializer
 
 # 列表 + 新增
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@conditional_on_tables(Department)
 def departments_list(request):
     if request.method == 'GET':
         depts = Department.objects.all()
@@ -22,6 +24,7 @@ def departments_list(request):
 # 詳細 GET / PUT / DELETE
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@conditional_on_tables(Department)
 def department_detail(request, dept_id):
     try:
         dept = Department.objects.get(id=dept_id)
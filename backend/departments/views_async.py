@@ -0,0 +1,15 @@
+from system.async_api import async_read_view, json_response
+from system.versioning import conditional_on_tables
+from . import views
+from .models import Department
+from .serializers import DepartmentSerializer
+
+# ASGI（backend.urls_async）使用的 async 讀取端點；POST 仍由 views.departments_list 處理
+
+
+# 列表
+@async_read_view(views.departments_list)
+@conditional_on_tables(Department)
+async def departments_list(request):
+    depts = [dept async for dept in Department.objects.all()]
+    return json_response(DepartmentSerializer(depts, many=True).data)
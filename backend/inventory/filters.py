@@ -0,0 +1,92 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Asset, StockTransaction
+
+# 庫存狀態：in = 在倉庫（無持有人），out = 已出庫（在員工手上）
+ASSET_STATUS_IN = "in"
+ASSET_STATUS_OUT = "out"
+
+
+def asset_queryset():
+    """資產讀取路徑：一次帶出產品、持有人與持有人部門，避免 N+1"""
+    return Asset.objects.select_related("product", "owner_user__department")
+
+
+def filter_assets(params, queryset=None):
+    """
+    依 query 參數篩選資產：
+    - product_code：產品代碼
+    - type：產品種類
+    - owner：持有人身份證字號
+    - status：in（在庫）/ out（出庫）
+    """
+    qs = queryset if queryset is not None else asset_queryset()
+
+    product_code = params.get("product_code")
+    if product_code:
+        qs = qs.filter(product__code=product_code)
+
+    type_ = params.get("type")
+    if type_:
+        qs = qs.filter(product__type=type_)
+
+    owner = params.get("owner")
+    if owner:
+        qs = qs.filter(owner_user_id=owner)
+
+    status_ = (params.get("status") or "").lower()
+    if status_ == ASSET_STATUS_IN:
+        qs = qs.filter(owner_user__isnull=True)
+    elif status_ == ASSET_STATUS_OUT:
+        qs = qs.filter(owner_user__isnull=False)
+
+    return qs
+
+
+def filter_transactions(params, queryset=None):
+    """
+    依 query 參數篩選出入庫紀錄：
+    - asset_tag、product_code、transaction_type（IN / OUT）
+    - date_from / date_to
+    """
+    qs = queryset if queryset is not None else StockTransaction.objects.all()
+
+    asset_tag = params.get("asset_tag")
+    if asset_tag:
+        qs = qs.filter(asset__asset_tag=asset_tag)
+
+    product_code = params.get("product_code")
+    if product_code:
+        qs = qs.filter(asset__product__code=product_code)
+
+    transaction_type = (params.get("transaction_type") or "").upper()
+    if transaction_type:
+        qs = qs.filter(transaction_type=transaction_type)
+
+    return filter_transaction_dates(qs, params)
+
+
+def filter_transaction_dates(queryset, params):
+    """date_from / date_to：ISO 日期或日期時間"""
+    date_from = params.get("date_from")
+    if date_from:
+        queryset = queryset.filter(date__gte=parse_query_datetime(date_from))
+    date_to = params.get("date_to")
+    if date_to:
+        queryset = queryset.filter(date__lte=parse_query_datetime(date_to, end_of_day=True))
+    return queryset
+
+
+def parse_query_datetime(value, end_of_day=False):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"日期格式錯誤：{value}")
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
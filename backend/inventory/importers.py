@@ -0,0 +1,379 @@
+import codecs
+import csv
+import time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from reports.audit import record_created
+from reports.summary import add_assets
+from system.metrics import record_import
+from system.versioning import touch_tables
+from users.name_resolver import AMBIGUOUS, UNMATCHED, UserNameResolver
+from .models import Asset, AssetTagSequence, Product, format_asset_tag, parse_asset_tag_number
+
+# CSV 中文欄位 → 內部欄位
+CSV_FIELD_MAP = {
+    "產品代碼": "product_code",
+    "名稱": "name",
+    "種類": "type",
+    "價格": "price",
+    "持有人": "owner_name",
+}
+
+DEFAULT_CHUNK_SIZE = 1000
+
+ROW_CREATED = "created"
+ROW_VALID = "valid"
+ROW_ERROR = "error"
+
+STAGE_VALIDATE = "validate"
+STAGE_WRITE = "write"
+
+# 檔案內同一個新產品代碼需一致的欄位
+PRODUCT_FIELDS = (("name", "名稱"), ("type", "種類"))
+
+
+def iter_csv_rows(uploaded_file):
+    """逐行串流讀取上傳的 CSV（不一次載入整個檔案），自動去除 UTF-8 BOM"""
+    lines = codecs.iterdecode(uploaded_file, "utf-8-sig")
+    for row in csv.DictReader(lines):
+        yield {
+            key: (row.get(header) or "").strip()
+            for header, key in CSV_FIELD_MAP.items()
+        }
+
+
+def parse_price(value):
+    """
+    空白視為 0；其餘需能存入 Product.price（max_digits=10, decimal_places=2），
+    NaN / Infinity 與超出位數的值在檢查階段列為錯誤，不會到寫入時才失敗
+    """
+    if not value:
+        return Decimal("0")
+    field = Product._meta.get_field("price")
+    try:
+        price = field.to_python(value)
+        field.run_validators(price)
+    except ValidationError:
+        raise ValueError(
+            f"價格格式錯誤：{value}（最多 {field.max_digits - field.decimal_places} 位整數、{field.decimal_places} 位小數）"
+        )
+    return price
+
+
+class AssetCsvImporter:
+    """
+    資產 CSV 匯入，分兩個階段：
+    1. validate()：讀完整個檔案，以批次查詢檢查所有資料列，一次回報所有問題，不寫入資料庫
+       - 產品代碼必填、價格格式
+       - 同一個新產品代碼在檔案中的名稱 / 種類不一致（價格不一致列於 warnings）
+       - 持有人比對（多個匹配或找不到，附候選人員）
+       - 預計配發的 asset_tag 與既有資產衝突（略過該流水號，列於 warnings）
+    2. commit()：單一 transaction 內建立缺少的產品、每個產品保留一次流水號，
+       以 bulk_create 寫入所有有效資料列；任一步驟失敗則整批 rollback
+    dry_run=True 時只執行第 1 階段，報告中的有效資料列附上預計的 asset_tag
+    progress(stage, done, total)：stage 為 "validate" 或 "write"，讀檔時 total 為 None；
+    寫入階段只在進入 transaction 前回報一次（transaction 內的更新在 commit 前其他連線看不到）
+    回傳報告：{"dry_run", "total", "valid", "created", "failed", "rows": [...], "warnings": [...]}
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, progress=None):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.progress = progress
+        self.products = {}      # code → 既有的 Product
+        self.new_products = {}  # code → (第一次出現的列號, entry)
+        self.owners = {}        # name → UserNameResolver 結果
+        self.valid = []         # (列號, entry, 持有人)
+        self.planned_tags = {}  # code → 預計配發的 asset_tag
+        self.rows = []
+        self.warnings = []
+        self.total = 0
+        self.created_count = 0
+        self.error_count = 0
+
+    def run(self, rows, before_commit=None):
+        """
+        before_commit(report)：在 commit 的 transaction 內、寫入完成後呼叫，
+        可將匯入結果與資料一起 commit（例如背景工作的進度）
+        """
+        start = time.perf_counter()
+        self.validate(rows)
+        if self.dry_run:
+            return self.report()
+
+        self._report_progress(STAGE_WRITE, 0, len(self.valid))
+        with transaction.atomic():
+            self.commit()
+            if before_commit:
+                before_commit(self.report())
+        record_import(
+            "assets", time.perf_counter() - start,
+            created=self.created_count, failed=self.error_count,
+        )
+        return self.report()
+
+    def report(self):
+        return {
+            "dry_run": self.dry_run,
+            "total": self.total,
+            "valid": len(self.valid),
+            "created": self.created_count,
+            "failed": self.error_count,
+            "rows": sorted(self.rows, key=lambda r: r["row"]),
+            "warnings": self.warnings,
+        }
+
+    # ------------------------------------------------------------
+    # 第 1 階段：檢查
+    # ------------------------------------------------------------
+    def validate(self, rows):
+        entries = []
+        for row_number, entry in enumerate(rows, start=2):
+            self.total += 1
+            if self.total % self.chunk_size == 0:
+                self._report_progress(STAGE_VALIDATE, self.total, None)
+            if not entry["product_code"]:
+                self._error(row_number, "產品代碼為必填欄位")
+                continue
+            try:
+                entry["has_price"] = bool(entry["price"])
+                entry["price"] = parse_price(entry["price"])
+            except ValueError as e:
+                self._error(row_number, str(e))
+                continue
+            entries.append((row_number, entry))
+        self._report_progress(STAGE_VALIDATE, self.total, self.total)
+
+        self._load_products({entry["product_code"] for _, entry in entries})
+        entries = self._check_new_products(entries)
+        self._resolve_owners({entry["owner_name"] for _, entry in entries if entry["owner_name"]})
+
+        for row_number, entry in entries:
+            owner = None
+            name = entry["owner_name"]
+            if name:
+                match = self.owners[name]
+                if match["status"] == AMBIGUOUS:
+                    self._error(row_number, f"持有人名稱 {name} 有多個匹配", candidates=match["candidates"])
+                    continue
+                if match["status"] == UNMATCHED:
+                    self._error(row_number, f"找不到持有人 {name}", candidates=match["candidates"])
+                    continue
+                owner = match["user"]
+            self.valid.append((row_number, entry, owner))
+
+        self._plan_tags()
+        if self.dry_run:
+            counters = {}
+            for row_number, entry, _ in self.valid:
+                code = entry["product_code"]
+                index = counters[code] = counters.get(code, -1) + 1
+                self.rows.append({
+                    "row": row_number,
+                    "status": ROW_VALID,
+                    "asset_tag": self.planned_tags[code][index],
+                })
+
+    def _load_products(self, codes):
+        codes = sorted(codes)
+        for start in range(0, len(codes), self.chunk_size):
+            for product in Product.objects.filter(code__in=codes[start:start + self.chunk_size]):
+                self.products[product.code] = product
+
+    def _check_new_products(self, entries):
+        """
+        新產品以檔案中第一次出現的資料建立；之後同代碼的資料列：
+        - 名稱或種類有填寫且不一致：錯誤
+        - 價格不一致：沿用第一次出現的價格，列於 warnings
+        """
+        checked = []
+        for row_number, entry in entries:
+            code = entry["product_code"]
+            if code in self.products:
+                checked.append((row_number, entry))
+                continue
+            first_row, first = self.new_products.setdefault(code, (row_number, entry))
+            conflicts = [
+                label for field, label in PRODUCT_FIELDS
+                if entry[field] and entry[field] != first[field]
+            ]
+            if conflicts:
+                self._error(
+                    row_number,
+                    f"產品代碼 {code} 的{'、'.join(conflicts)}與第 {first_row} 列不一致",
+                )
+                continue
+            if entry["has_price"] and entry["price"] != first["price"]:
+                self.warnings.append({
+                    "row": row_number,
+                    "warning": f"產品代碼 {code} 的價格與第 {first_row} 列不一致，將使用 {first['price']}",
+                })
+            checked.append((row_number, entry))
+        return checked
+
+    def _resolve_owners(self, names):
+        names = sorted(names - self.owners.keys())
+        for start in range(0, len(names), self.chunk_size):
+            self.owners.update(self.resolver.resolve(names[start:start + self.chunk_size]))
+
+    @property
+    def resolver(self):
+        if not hasattr(self, "_resolver"):
+            self._resolver = UserNameResolver()
+        return self._resolver
+
+    def _plan_tags(self):
+        """
+        依各產品目前的流水號推算將配發的 asset_tag，與既有資產衝突的編號略過並列於 warnings
+        所有產品一起以批次查詢檢查，衝突時才需要下一輪
+        """
+        counts = {}
+        for _, entry, _ in self.valid:
+            code = entry["product_code"]
+            counts[code] = counts.get(code, 0) + 1
+        if not counts:
+            return
+
+        last_numbers = self._last_numbers(counts)
+        pending = dict(counts)
+        self.planned_tags = {code: [] for code in counts}
+        while pending:
+            candidates = {}
+            for code, needed in pending.items():
+                start = last_numbers[code]
+                for number in range(start + 1, start + needed + 1):
+                    candidates[format_asset_tag(code, number)] = code
+                last_numbers[code] = start + needed
+            taken = self._existing_tags(list(candidates))
+            for tag, code in candidates.items():
+                if tag in taken:
+                    self.warnings.append({"asset_tag": tag, "warning": f"資產編號 {tag} 已被其他資產使用，將略過此編號"})
+                else:
+                    self.planned_tags[code].append(tag)
+            pending = {code: counts[code] - len(self.planned_tags[code]) for code in pending}
+            pending = {code: needed for code, needed in pending.items() if needed > 0}
+
+    def _last_numbers(self, codes):
+        """各產品目前的最後流水號：有計數器時讀計數器，否則依既有資產的最大流水號（與 AssetTagSequence 初始化相同）"""
+        existing = {code: self.products[code] for code in codes if code in self.products}
+        last_numbers = {code: 0 for code in codes}
+        sequences = dict(
+            AssetTagSequence.objects.filter(product__in=existing.values()).values_list("product_id", "last_number")
+        )
+        code_by_id = {product.id: code for code, product in existing.items()}
+        without_sequence = [pid for pid in code_by_id if pid not in sequences]
+        for pid, tag in Asset.objects.filter(product_id__in=without_sequence).values_list("product_id", "asset_tag").iterator():
+            code = code_by_id[pid]
+            last_numbers[code] = max(last_numbers[code], parse_asset_tag_number(tag))
+        for pid, last in sequences.items():
+            last_numbers[code_by_id[pid]] = last
+        return last_numbers
+
+    def _existing_tags(self, tags):
+        taken = set()
+        for start in range(0, len(tags), self.chunk_size):
+            taken.update(
+                Asset.objects.filter(asset_tag__in=tags[start:start + self.chunk_size]).values_list("asset_tag", flat=True)
+            )
+        return taken
+
+    # ------------------------------------------------------------
+    # 第 2 階段：寫入（需在 transaction 內）
+    # ------------------------------------------------------------
+    def commit(self):
+        if not self.valid:
+            return
+        self._create_products()
+        tags = self._reserve_tags()
+
+        assets = [
+            Asset(product=self.products[entry["product_code"]], owner_user=owner, asset_tag=next(tags[entry["product_code"]]))
+            for _, entry, owner in self.valid
+        ]
+        for start in range(0, len(assets), self.chunk_size):
+            batch = assets[start:start + self.chunk_size]
+            Asset.objects.bulk_create(batch)
+            add_assets(Asset.objects.filter(pk__in=[asset.pk for asset in batch]))
+        record_created(Asset, assets)
+        touch_tables(Asset)
+
+        for (row_number, _, _), asset in zip(self.valid, assets):
+            self.rows.append({
+                "row": row_number,
+                "status": ROW_CREATED,
+                "id": asset.pk,
+                "asset_tag": asset.asset_tag,
+            })
+        self.created_count = len(assets)
+
+    def _create_products(self):
+        """
+        建立檔案中的新產品；檢查階段之後其他匯入可能已建立同代碼的產品（ignore_conflicts 略過），
+        重新讀取後比對名稱 / 種類，有填寫且不一致的資料列改為錯誤，不會掛到別人建立的產品下
+        """
+        missing = {entry["product_code"] for _, entry, _ in self.valid} - self.products.keys()
+        if not missing:
+            return
+        planned = {code: entry for code, (_, entry) in self.new_products.items() if code in missing}
+        Product.objects.bulk_create(
+            [
+                Product(code=code, name=entry["name"], type=entry["type"], price=entry["price"])
+                for code, entry in planned.items()
+            ],
+            batch_size=self.chunk_size,
+            ignore_conflicts=True,
+        )
+        created = []
+        for product in Product.objects.filter(code__in=missing):
+            self.products[product.code] = product
+            entry = planned[product.code]
+            if (product.name, product.type, product.price) == (entry["name"], entry["type"], entry["price"]):
+                created.append(product)
+        record_created(Product, created)
+        touch_tables(Product)
+
+        valid = []
+        for row_number, entry, owner in self.valid:
+            code = entry["product_code"]
+            product = self.products[code]
+            conflicts = [
+                label for field, label in PRODUCT_FIELDS
+                if code in missing and entry[field] and entry[field] != getattr(product, field)
+            ]
+            if conflicts:
+                self._error(row_number, f"產品代碼 {code} 已由其他匯入建立，{'、'.join(conflicts)}不一致")
+                continue
+            valid.append((row_number, entry, owner))
+        self.valid = valid
+
+    def _reserve_tags(self):
+        """
+        每個產品一次保留所需的流水號，與既有資產衝突的編號略過後再補足
+        （檢查階段之後若有其他匯入先配號，實際編號會與預計的不同，但不會重複）
+        回傳 code → tag iterator
+        """
+        counts = {}
+        for _, entry, _ in self.valid:
+            code = entry["product_code"]
+            counts[code] = counts.get(code, 0) + 1
+        tags = {}
+        for code, count in counts.items():
+            assigned = []
+            while len(assigned) < count:
+                reserved = AssetTagSequence.reserve_tags(self.products[code], count - len(assigned))
+                taken = self._existing_tags(reserved)
+                assigned.extend(tag for tag in reserved if tag not in taken)
+            tags[code] = iter(assigned)
+        return tags
+
+    # ------------------------------------------------------------
+    def _error(self, row_number, message, **extra):
+        self.rows.append({"row": row_number, "status": ROW_ERROR, "error": message, **extra})
+        self.error_count += 1
+
+    def _report_progress(self, stage, done, total):
+        if self.progress:
+            self.progress(stage, done, total)
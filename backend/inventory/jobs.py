@@ -0,0 +1,73 @@
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+from system.jobs import enqueue, job_handler
+from .importers import ROW_ERROR, AssetCsvImporter, iter_csv_rows
+
+ASSET_IMPORT = "asset_import"
+
+
+def enqueue_asset_import(uploaded_file, user, dry_run=False):
+    """上傳的 CSV 先寫入 JOB_UPLOAD_DIR，由 worker 讀檔匯入"""
+    directory = Path(settings.JOB_UPLOAD_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"assets_{uuid.uuid4().hex}.csv"
+    with path.open("wb") as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+    payload = {"path": str(path), "filename": uploaded_file.name, "dry_run": dry_run}
+    return enqueue(ASSET_IMPORT, payload, user=user)
+
+
+def remove_upload(payload):
+    Path(payload["path"]).unlink(missing_ok=True)
+
+
+@job_handler(ASSET_IMPORT, cleanup=remove_upload)
+def run_asset_import(job, progress):
+    """
+    資產 CSV 匯入：先檢查整個檔案，再以單一 transaction 寫入
+    結果與資料在同一個 transaction 內 commit，worker 在 commit 後中斷時重新執行直接回傳結果，不會重複建立資產
+    commit 前中斷則整批 rollback，重新執行時從頭檢查
+    結果只保留錯誤列（成功列只計數），避免大檔案的結果過大
+    失敗（例外或多次中斷）時由 fail_job 呼叫 remove_upload 刪除檔案；
+    行程被中止（KeyboardInterrupt / SystemExit）時保留檔案，由下一個 worker 重新執行
+    """
+    if job.result.get("committed"):
+        remove_upload(job.payload)
+        return job.result
+
+    result = _import_file(Path(job.payload["path"]), job, progress)
+    remove_upload(job.payload)
+    return result
+
+
+def _import_file(path, job, progress):
+    def report_progress(stage, done, total):
+        fields = {"stage": stage, "rows_done": done}
+        if total is not None:
+            fields["rows_total"] = total
+        progress.update(**fields)
+
+    def save_result(report):
+        progress.update(error_count=report["failed"], result={**_compact(report), "committed": True})
+
+    importer = AssetCsvImporter(dry_run=job.payload.get("dry_run", False), progress=report_progress)
+    with path.open("rb") as f:
+        report = importer.run(iter_csv_rows(f), before_commit=save_result)
+    progress.update(error_count=report["failed"])
+    return _compact(report)
+
+
+def _compact(report):
+    return {
+        "dry_run": report["dry_run"],
+        "total": report["total"],
+        "valid": report["valid"],
+        "created": report["created"],
+        "failed": report["failed"],
+        "errors": [row for row in report["rows"] if row["status"] == ROW_ERROR],
+        "warnings": report["warnings"],
+    }
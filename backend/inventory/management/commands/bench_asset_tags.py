@@ -0,0 +1,81 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from inventory.models import AssetTagSequence, Product
+
+
+class Command(BaseCommand):
+    help = "asset_tag 配號效能測試：多個執行緒同時向同一產品配號，檢查是否重號並比較前後段延遲"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--allocations", type=int, default=500, help="每個 worker 的配號次數")
+        parser.add_argument("--batch", type=int, default=1, help="每次保留的流水號數量")
+        parser.add_argument("--product-code", default="__BENCH__")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        allocations = options["allocations"]
+        batch = options["batch"]
+
+        product, _ = Product.objects.get_or_create(
+            code=options["product_code"], defaults={"name": "benchmark"}
+        )
+        AssetTagSequence.objects.filter(product=product).delete()
+
+        results = [[] for _ in range(workers)]
+        errors = []
+
+        def worker(index):
+            try:
+                for _ in range(allocations):
+                    start = time.perf_counter()
+                    numbers = AssetTagSequence.reserve(product, batch)
+                    results[index].append((time.perf_counter() - start, numbers))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            if errors:
+                for e in errors:
+                    self.stderr.write(f"worker error: {e!r}")
+                return
+
+            numbers = [n for r in results for _, reserved in r for n in reserved]
+            latencies = [latency for r in results for latency, _ in r]
+            duplicates = len(numbers) - len(set(numbers))
+
+            # 依各 worker 的執行順序切成前後兩段，比較延遲是否隨已配號數增加
+            first = [lat for r in results for lat, _ in r[: len(r) // 10 or 1]]
+            last = [lat for r in results for lat, _ in r[-(len(r) // 10 or 1):]]
+
+            self.stdout.write(f"workers={workers} allocations={workers * allocations} batch={batch}")
+            self.stdout.write(f"tags={len(numbers)} duplicates={duplicates}")
+            self.stdout.write(f"throughput={workers * allocations / elapsed:.0f} reservations/s")
+            self.stdout.write(f"p50={_ms(statistics.median(latencies))} p99={_ms(_percentile(latencies, 99))}")
+            self.stdout.write(f"first 10% median={_ms(statistics.median(first))} last 10% median={_ms(statistics.median(last))}")
+        finally:
+            product.delete()
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.2f}ms"
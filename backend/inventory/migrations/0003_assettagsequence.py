@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    # 依既有資產的最大流水號建立計數器
+    Asset = apps.get_model('inventory', 'Asset')
+    AssetTagSequence = apps.get_model('inventory', 'AssetTagSequence')
+    last_numbers = {}
+    for product_id, asset_tag in Asset.objects.values_list('product_id', 'asset_tag').iterator():
+        suffix = asset_tag.rpartition('-')[2]
+        number = int(suffix) if suffix.isdigit() else 0
+        last_numbers[product_id] = max(last_numbers.get(product_id, 0), number)
+    AssetTagSequence.objects.bulk_create(
+        AssetTagSequence(product_id=product_id, last_number=number)
+        for product_id, number in last_numbers.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_asset_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetTagSequence',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tag_sequence', serialize=False, to='inventory.product')),
+                ('last_number', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
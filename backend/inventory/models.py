@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from system.tracking import LoadedValuesMixin
 from users.models import CustomUser
 
 class ItemModel(models.Model):
@@ -9,31 +11,94 @@ class ItemModel(models.Model):
         return self.name
 
 
-class Product(models.Model):
+class Product(LoadedValuesMixin, models.Model):
     code = models.CharField(max_length=100, unique=True)  # 產品代碼，例如 SK
     name = models.CharField(max_length=255)
     type = models.CharField(max_length=100, blank=True, default="")
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["type"], name="product_type_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.code})"
 
 
-class Asset(models.Model):
+class Asset(LoadedValuesMixin, models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="assets")
     asset_tag = models.CharField(max_length=100, unique=True)  # SK-001
     owner_user = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL, to_field="id_number")
-    
+
+    class Meta:
+        indexes = [
+            # keyset 分頁：依產品 / 持有人篩選後以 id 排序
+            models.Index(fields=["product", "id"], name="asset_product_id_idx"),
+            models.Index(fields=["owner_user", "id"], name="asset_owner_id_idx"),
+        ]
+
     def __str__(self):
         return f"{self.asset_tag} ({self.product})"
     
     def save(self, *args, **kwargs):
         if not self.asset_tag:
-            existing_count = Asset.objects.filter(product=self.product).count()
-            self.asset_tag = f"{self.product.code}-{existing_count + 1:03d}"
+            self.asset_tag = AssetTagSequence.next_tag(self.product)
         super().save(*args, **kwargs)
 
 
+def format_asset_tag(product_code, number):
+    return f"{product_code}-{number:03d}"
+
+
+def parse_asset_tag_number(asset_tag):
+    """取出 asset_tag 的流水號（SK-012 → 12），格式不符時回傳 0"""
+    _, _, suffix = asset_tag.rpartition("-")
+    return int(suffix) if suffix.isdigit() else 0
+
+
+class AssetTagSequence(models.Model):
+    """
+    各產品 asset_tag 流水號計數器：
+    每次配號只更新一列計數器，不需 count 資產；
+    以 UPDATE ... SET last_number = last_number + n 取得列鎖，併發配號不會重複
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="tag_sequence")
+    last_number = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product.code}: {self.last_number}"
+
+    @classmethod
+    def reserve(cls, product, count=1):
+        """一次保留 count 個流水號，回傳 range"""
+        with transaction.atomic(savepoint=False):
+            updated = cls.objects.filter(product=product).update(last_number=F("last_number") + count)
+            if not updated:
+                cls._initialize(product)
+                cls.objects.filter(product=product).update(last_number=F("last_number") + count)
+            last = cls.objects.filter(product=product).values_list("last_number", flat=True).get()
+        return range(last - count + 1, last + 1)
+
+    @classmethod
+    def reserve_tags(cls, product, count):
+        return [format_asset_tag(product.code, n) for n in cls.reserve(product, count)]
+
+    @classmethod
+    def next_tag(cls, product):
+        return cls.reserve_tags(product, 1)[0]
+
+    @classmethod
+    def _initialize(cls, product):
+        # 第一次配號：從既有資產的最大流水號接續，避免與舊資料撞號
+        last = max(
+            (parse_asset_tag_number(tag) for tag in
+             Asset.objects.filter(product=product).values_list("asset_tag", flat=True).iterator()),
+            default=0,
+        )
+        cls.objects.get_or_create(product=product, defaults={"last_number": last})
+
+
 class StockTransaction(models.Model):
     """出入庫紀錄"""
     IN = 'IN'
@@ -47,5 +112,11 @@ class StockTransaction(models.Model):
     date = models.DateTimeField(auto_now_add=True)
     remark = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # 某資產歷史：依日期由新到舊
+            models.Index(fields=["asset", "-date", "-id"], name="stocktx_asset_date_idx"),
+        ]
+
     def __str__(self):
         return f"{self.asset.asset_tag} {self.transaction_type}"
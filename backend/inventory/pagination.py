@@ -0,0 +1,27 @@
+from rest_framework.pagination import CursorPagination
+
+
+class AssetCursorPagination(CursorPagination):
+    """
+    資產列表 keyset 分頁：
+    以唯一欄位（id / asset_tag）排序，深層分頁與第一頁成本相同
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = "id"
+    ordering_fields = ("id", "-id", "asset_tag", "-asset_tag")
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get("ordering")
+        if ordering in self.ordering_fields:
+            return (ordering,)
+        return (self.ordering,)
+
+
+class StockHistoryCursorPagination(CursorPagination):
+    """出入庫紀錄 keyset 分頁：依日期由新到舊"""
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = ("-date", "-id")
@@ -1,16 +1,17 @@
 from rest_framework import serializers
 from .models import Asset, Product
 from django.contrib.auth import get_user_model
-from users.serializers import CustomUserSerializer
+from users.serializers import CustomUserSerializer, user_fragment_version
+from system.fragments import CachedRepresentationMixin, row_values
 
 User = get_user_model()
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(CachedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'type', 'price']
 
-class AssetSerializer(serializers.ModelSerializer):
+class AssetSerializer(CachedRepresentationMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     owner_user = CustomUserSerializer(read_only=True)
     holder_user = CustomUserSerializer(read_only=True)
@@ -28,6 +29,15 @@ class AssetSerializer(serializers.ModelSerializer):
         fields = ['id', 'asset_tag', 'product', 'owner_user', 'holder_user', 'owner_user_id', 'holder_user_id']
         read_only_fields = ['asset_tag']
 
+    def fragment_version(self, instance):
+        # 巢狀的產品與持有人各自也有快取，版本一併納入
+        owner = instance.owner_user if instance.owner_user_id is not None else None
+        return (
+            row_values(instance),
+            row_values(instance.product),
+            user_fragment_version(owner) if owner is not None else None,
+        )
+
     def create(self, validated_data):
         # 把 owner_user_id / holder_user_id 拿出來轉成關聯
         owner = validated_data.pop('owner_user_id', None)
@@ -0,0 +1,134 @@
+from django.db import transaction
+
+from reports.audit import record_updates
+from reports.summary import track_inventory
+from system.fragments import fragment_cache
+from system.versioning import touch_tables
+from users.models import CustomUser
+from .models import Asset, StockTransaction
+
+# 單次批次出入庫的上限，避免一次鎖定過多資產
+MAX_BATCH_ITEMS = 1000
+# 每筆項目中必須是字串的欄位（未提供則略過，由 _apply 判斷是否缺少）
+STRING_FIELDS = ("asset_tag", "transaction_type", "person_id", "remark")
+
+
+class StockError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def apply_stock_transactions(items, all_or_nothing=False):
+    """
+    批次出入庫：
+    - 先鎖定出庫對象的人員，再依 asset_tag 排序以 select_for_update 鎖定所有相關資產
+      （固定順序避免死結；人員轉移部門時也是先鎖人員再鎖資產，彙總表不會記到舊部門）
+    - 依輸入順序在記憶體中套用狀態變更（同一資產可先出庫再入庫）
+    - 資產以 bulk_update、交易紀錄以 bulk_create 寫入，全部在同一個 transaction 內
+    all_or_nothing=True 時只要有一筆失敗就全部不寫入
+    欄位型別錯誤的項目直接記為該筆失敗，不參與鎖定
+    回傳 (results, assets)：results 為逐筆結果，assets 為 asset_tag → Asset
+    """
+    results = []
+    invalid = {index: message for index, item in enumerate(items) if (message := _invalid_field(item))}
+    valid_items = [item for index, item in enumerate(items) if index not in invalid]
+    with transaction.atomic():
+        person_ids = {item.get("person_id") for item in valid_items if item.get("person_id")}
+        persons = {
+            person.id_number: person
+            for person in CustomUser.objects.select_for_update().filter(id_number__in=person_ids).order_by("id")
+        } if person_ids else {}
+        tags = sorted({item.get("asset_tag") or "" for item in valid_items} - {""})
+        assets = {
+            asset.asset_tag: asset
+            for asset in Asset.objects.select_for_update().filter(asset_tag__in=tags).order_by("asset_tag")
+        }
+
+        changed = {}
+        owners_before = {tag: asset.owner_user_id for tag, asset in assets.items()}
+        logs = []
+        for index, item in enumerate(items):
+            try:
+                if index in invalid:
+                    raise StockError(invalid[index])
+                asset = _apply(item, assets, persons)
+            except StockError as e:
+                tag = item.get("asset_tag")
+                results.append({
+                    "index": index,
+                    "asset_tag": tag if isinstance(tag, str) else None,
+                    "success": False,
+                    "error": e.message,
+                    "status": e.status,
+                })
+                continue
+
+            changed[asset.asset_tag] = asset
+            logs.append(StockTransaction(
+                asset=asset,
+                transaction_type=item.get("transaction_type"),
+                remark=item.get("remark", ""),
+            ))
+            results.append({
+                "index": index,
+                "asset_tag": asset.asset_tag,
+                "success": True,
+                "owner_user": asset.owner_user_id,
+            })
+
+        if all_or_nothing and any(not r["success"] for r in results):
+            return results, assets
+
+        if changed:
+            # 資產已鎖定，前後彙總的差異即為本批次造成的變化
+            with track_inventory(Asset.objects.filter(pk__in=[a.pk for a in changed.values()])):
+                Asset.objects.bulk_update(changed.values(), ["owner_user"])
+            StockTransaction.objects.bulk_create(logs)
+            touch_tables(Asset)
+            fragment_cache.evict(Asset, [asset.pk for asset in changed.values()])
+            record_updates(Asset, [
+                (asset.pk, {"owner_user_id": owners_before[tag]}, {"owner_user_id": asset.owner_user_id})
+                for tag, asset in changed.items()
+            ])
+
+    return results, assets
+
+
+def _invalid_field(item):
+    for field in STRING_FIELDS:
+        value = item.get(field)
+        if value is not None and not isinstance(value, str):
+            return f"{field} 必須是字串"
+    return None
+
+
+def _apply(item, assets, persons):
+    asset = assets.get(item.get("asset_tag") or "")
+    if asset is None:
+        raise StockError("資產不存在", status=404)
+
+    transaction_type = item.get("transaction_type")
+    if transaction_type == StockTransaction.OUT:
+        # 已在員工手上
+        if asset.owner_user_id is not None:
+            raise StockError("該資產已在員工手上")
+        person_id_number = item.get("person_id")
+        if not person_id_number:
+            raise StockError("缺少員工 ID")
+        person = persons.get(person_id_number)
+        if person is None:
+            raise StockError("員工不存在", status=404)
+        asset.owner_user = person
+
+    elif transaction_type == StockTransaction.IN:
+        # 已在倉庫中
+        if asset.owner_user_id is None:
+            raise StockError("該資產已在倉庫中")
+        asset.owner_user = None
+
+    else:
+        raise StockError("無效交易類型")
+
+    return asset
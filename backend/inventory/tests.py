@@ -1,3 +1,402 @@
-from django.test import TestCase
+import io
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections, transaction
+from django.db.models.query import QuerySet
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from departments.models import Department
+from system.fragments import fragment_cache
+from users.models import CustomUser
+from users.name_resolver import memory_index
+from .importers import ROW_ERROR, AssetCsvImporter, iter_csv_rows
+from .models import Asset, AssetTagSequence, Product, StockTransaction, format_asset_tag
+from .stock import MAX_BATCH_ITEMS, apply_stock_transactions
+
+
+class InventoryTestCase(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.product = Product.objects.create(code="NB", name="筆電", type="電腦", price=100)
+        self.person = CustomUser.objects.create_user("worker", "B100000001", "員工甲")
+
+
+# ================================================================
+# 資產列表（keyset 分頁）
+# ================================================================
+class AssetsListTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        desktop = Product.objects.create(code="PC", name="桌機", type="主機", price=300)
+        department = Department.objects.create(name="資訊部")
+        self.owners = [
+            CustomUser.objects.create_user(f"owner{i}", f"C10000000{i}", f"持有人{i}", department=department)
+            for i in range(4)
+        ]
+        self.assets = [Asset.objects.create(product=self.product) for _ in range(3)]
+        self.assets += [Asset.objects.create(product=desktop, owner_user=owner) for owner in self.owners]
+
+    def list_assets(self, url="/api/inventory/assets/", **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor_pages_cover_every_asset_once(self):
+        seen = []
+        page = self.list_assets(page_size=3)
+        while True:
+            seen.extend(asset["id"] for asset in page["results"])
+            if not page["next"]:
+                break
+            page = self.list_assets(page["next"])
+
+        self.assertEqual(seen, [asset.pk for asset in self.assets])
+
+    def test_filters(self):
+        out = self.list_assets(status="out", product_code="PC", page_size=10)["results"]
+        self.assertEqual([asset["owner_user"]["id_number"] for asset in out], [owner.id_number for owner in self.owners])
+        self.assertEqual(len(self.list_assets(status="in", page_size=10)["results"]), 3)
+        self.assertEqual(len(self.list_assets(type="主機", owner="C100000001", page_size=10)["results"]), 1)
+
+    def test_related_rows_are_fetched_with_the_page(self):
+        def queries_for(page_size):
+            fragment_cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                page = self.list_assets(page_size=page_size, ordering="-id")
+            self.assertEqual(page["results"][0]["owner_user"]["department_name"], "資訊部")
+            return len(queries.captured_queries)
+
+        self.assertEqual(queries_for(1), queries_for(7))
+
+
+# ================================================================
+# 批次出入庫
+# ================================================================
+class StockTransactionBatchTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.in_stock = Asset.objects.create(product=self.product)
+        self.checked_out = Asset.objects.create(product=self.product, owner_user=self.person)
+
+    def post_batch(self, items, **extra):
+        return self.client.post(
+            "/api/inventory/stock_transaction/batch/", {"items": items, **extra}, format="json",
+        )
+
+    def test_applies_items_in_order_within_one_batch(self):
+        # 同一資產可在同一批次內先出庫再入庫
+        response = self.post_batch([
+            {"asset_tag": self.in_stock.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+            {"asset_tag": self.in_stock.asset_tag, "transaction_type": "IN"},
+            {"asset_tag": self.checked_out.asset_tag, "transaction_type": "IN"},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["applied"], response.data["failed"]), (3, 0))
+        self.in_stock.refresh_from_db()
+        self.checked_out.refresh_from_db()
+        self.assertIsNone(self.in_stock.owner_user_id)
+        self.assertIsNone(self.checked_out.owner_user_id)
+        self.assertEqual(
+            list(StockTransaction.objects.filter(asset=self.in_stock).order_by("id").values_list("transaction_type", flat=True)),
+            ["OUT", "IN"],
+        )
+
+    def test_partial_failure_applies_valid_items(self):
+        response = self.post_batch([
+            {"asset_tag": self.in_stock.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+            {"asset_tag": "NB-999", "transaction_type": "IN"},
+            {"asset_tag": self.checked_out.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["applied"], response.data["failed"]), (1, 2))
+        errors = {r["index"]: (r["status"], r["error"]) for r in response.data["results"] if not r["success"]}
+        self.assertEqual(errors, {1: (404, "資產不存在"), 2: (400, "該資產已在員工手上")})
+        self.in_stock.refresh_from_db()
+        self.assertEqual(self.in_stock.owner_user_id, "B100000001")
+
+    def test_all_or_nothing_writes_nothing_when_any_item_fails(self):
+        response = self.post_batch([
+            {"asset_tag": self.in_stock.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+            {"asset_tag": self.checked_out.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+        ], all_or_nothing=True)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["applied"], 0)
+        self.in_stock.refresh_from_db()
+        self.assertIsNone(self.in_stock.owner_user_id)
+        self.assertFalse(StockTransaction.objects.exists())
+
+    def test_all_or_nothing_accepts_string_flags(self):
+        items = [
+            {"asset_tag": self.in_stock.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+            {"asset_tag": "NB-999", "transaction_type": "IN"},
+        ]
+
+        self.assertEqual(self.post_batch(items, all_or_nothing="true").data["applied"], 0)
+        self.assertEqual(self.post_batch(items, all_or_nothing="false").data["applied"], 1)
+
+    def test_locks_assets_in_tag_order_before_applying(self):
+        # 先鎖定出庫對象，再依 asset_tag 排序鎖定所有相關資產（固定順序避免死結）
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def record_lock(queryset, *args, **kwargs):
+            locked.append(queryset.model)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, "select_for_update", autospec=True, side_effect=record_lock):
+            with CaptureQueriesContext(connection) as queries:
+                apply_stock_transactions([
+                    {"asset_tag": self.checked_out.asset_tag, "transaction_type": "IN"},
+                    {"asset_tag": self.in_stock.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+                ])
+
+        self.assertEqual(locked, [CustomUser, Asset])
+        lock_query = next(q["sql"] for q in queries.captured_queries if '"inventory_asset"' in q["sql"])
+        self.assertIn('ORDER BY "inventory_asset"."asset_tag" ASC', lock_query)
+
+    def test_non_string_fields_fail_per_item(self):
+        response = self.post_batch([
+            {"asset_tag": self.in_stock.asset_tag, "transaction_type": "OUT", "person_id": ["B100000001"]},
+            {"asset_tag": {"tag": self.checked_out.asset_tag}, "transaction_type": "IN"},
+            {"asset_tag": self.checked_out.asset_tag, "transaction_type": 1},
+            {"asset_tag": self.checked_out.asset_tag, "transaction_type": "IN", "remark": {"a": 1}},
+            {"asset_tag": self.in_stock.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["applied"], response.data["failed"]), (1, 4))
+        errors = {r["index"]: (r["asset_tag"], r["error"]) for r in response.data["results"] if not r["success"]}
+        self.assertEqual(errors, {
+            0: (self.in_stock.asset_tag, "person_id 必須是字串"),
+            1: (None, "asset_tag 必須是字串"),
+            2: (self.checked_out.asset_tag, "transaction_type 必須是字串"),
+            3: (self.checked_out.asset_tag, "remark 必須是字串"),
+        })
+        self.checked_out.refresh_from_db()
+        self.assertEqual(self.checked_out.owner_user_id, "B100000001")
+
+    def test_rejects_invalid_payloads(self):
+        self.assertEqual(self.post_batch([]).status_code, 400)
+        self.assertEqual(self.post_batch(["NB-001"]).status_code, 400)
+        too_many = [{"asset_tag": "NB-001", "transaction_type": "IN"}] * (MAX_BATCH_ITEMS + 1)
+        self.assertEqual(self.post_batch(too_many).status_code, 400)
+
+
+# ================================================================
+# 多資產歷史（每個資產最新 limit 筆）
+# ================================================================
+class StockHistoryBatchTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = Asset.objects.create(product=self.product)
+        self.second = Asset.objects.create(product=self.product)
+        for i in range(3):
+            StockTransaction.objects.create(asset=self.first, transaction_type="OUT", remark=f"first-{i}")
+        StockTransaction.objects.create(asset=self.second, transaction_type="IN", remark="second-0")
+
+    def get_history(self, **params):
+        return self.client.get("/api/inventory/stock_history/batch/", params)
+
+    def test_returns_latest_rows_per_asset(self):
+        tags = f"{self.first.asset_tag},{self.second.asset_tag},NB-999"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_history(asset_tags=tags, limit=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t["remark"] for t in response.data[self.first.asset_tag]], ["first-2", "first-1"])
+        self.assertEqual([t["remark"] for t in response.data[self.second.asset_tag]], ["second-0"])
+        self.assertEqual(response.data["NB-999"], [])
+        self.assertEqual(sum("ROW_NUMBER()" in q["sql"] for q in queries.captured_queries), 1)
+
+    def test_rejects_invalid_limit(self):
+        for limit in ("0", "-1", "abc"):
+            response = self.get_history(asset_tags=self.first.asset_tag, limit=limit)
+            self.assertEqual(response.status_code, 400, limit)
+        self.assertEqual(self.get_history().status_code, 400)
+
+
+# ================================================================
+# 資產 CSV 匯入（檢查 → 單一 transaction 寫入）
+# ================================================================
+CSV_HEADER = "產品代碼,名稱,種類,價格,持有人"
+
+
+def csv_bytes(*rows):
+    return "\n".join((CSV_HEADER, *rows)).encode("utf-8-sig")
+
+
+class AssetCsvImportTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        # 姓名模糊比對的行程內索引依 commit 後 bump 的版本號重建，測試的 transaction 不會 commit
+        memory_index.invalidate()
+
+    def validate(self, *rows):
+        return AssetCsvImporter(dry_run=True).run(iter_csv_rows(io.BytesIO(csv_bytes(*rows))))
+
+    def upload(self, *rows, dry_run=False):
+        url = "/api/inventory/assets/?dry_run=true" if dry_run else "/api/inventory/assets/"
+        return self.client.post(url, {"file": SimpleUploadedFile("assets.csv", csv_bytes(*rows))}, format="multipart")
+
+    def errors(self, report):
+        return {row["row"]: row["error"] for row in report["rows"] if row["status"] == ROW_ERROR}
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def queries_for(count):
+            rows = [f"PC{count},桌機,電腦,300,員工甲" if i % 2 else "NB,,,," for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.upload(*rows)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data["created"], count)
+            return len(queries.captured_queries)
+
+        # 第一次匯入另有建立索引、流水號計數器等一次性查詢
+        queries_for(2)
+        self.assertEqual(queries_for(4), queries_for(40))
+
+    def test_file_with_only_row_errors_writes_nothing(self):
+        response = self.upload("PC,桌機,電腦,300,員工丙", ",,,,", "NB,,,abc,")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.data["valid"], response.data["created"], response.data["failed"]), (0, 0, 3))
+        self.assertEqual(sorted(self.errors(response.data)), [2, 3, 4])
+        # 第 1 階段沒有有效資料列，不進入寫入階段（新產品也不建立）
+        self.assertFalse(Product.objects.filter(code="PC").exists())
+        self.assertFalse(Asset.objects.exists())
+
+    def test_prices_that_do_not_fit_the_column_are_row_errors(self):
+        rows = ["NB,,,NaN,", "NB,,,Infinity,", "NB,,,1e20,", "NB,,,1.234,", "NB,,,12345678.99,", "NB,,,,"]
+
+        report = self.validate(*rows)
+        self.assertEqual((report["valid"], report["failed"]), (2, 4))
+        self.assertEqual(sorted(self.errors(report)), [2, 3, 4, 5])
+        self.assertTrue(all(error.startswith("價格格式錯誤") for error in self.errors(report).values()))
+
+        response = self.upload(*rows, dry_run=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(self.errors(response.data)), [2, 3, 4, 5])
+
+        response = self.upload(*rows)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["created"], response.data["failed"]), (2, 4))
+        self.assertEqual(Asset.objects.count(), 2)
+
+    def test_dry_run_plans_tags_without_writing(self):
+        response = self.upload("NB,,,,", "PC,桌機,電腦,300,員工甲", dry_run=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["asset_tag"] for row in response.data["rows"]], ["NB-001", "PC-001"])
+        self.assertFalse(Asset.objects.exists())
+        self.assertFalse(Product.objects.filter(code="PC").exists())
+
+    def test_new_product_conflicts_and_price_mismatch(self):
+        report = self.validate("PC,桌機,電腦,300,", "PC,筆電,電腦,,", "PC,,,350,")
+
+        self.assertEqual(self.errors(report), {3: "產品代碼 PC 的名稱與第 2 列不一致"})
+        self.assertEqual([warning["row"] for warning in report["warnings"]], [4])
+
+    def test_product_created_concurrently_with_other_fields_is_row_error(self):
+        importer = AssetCsvImporter()
+        importer.validate(iter_csv_rows(io.BytesIO(csv_bytes("PC,桌機,電腦,300,", "PC,,,,", "PC,桌機,,,"))))
+        # 檢查階段之後，其他匯入以不同名稱建立了同代碼的產品
+        other = Product.objects.create(code="PC", name="工作站", type="電腦", price=500)
+        with transaction.atomic():
+            importer.commit()
+
+        report = importer.report()
+        self.assertEqual(self.errors(report), {
+            2: "產品代碼 PC 已由其他匯入建立，名稱不一致",
+            4: "產品代碼 PC 已由其他匯入建立，名稱不一致",
+        })
+        self.assertEqual((report["valid"], report["created"], report["failed"]), (1, 1, 2))
+        self.assertEqual(list(Asset.objects.values_list("product_id", flat=True)), [other.pk])
+        self.assertEqual(Product.objects.get(code="PC").name, "工作站")
+
+    def test_owner_must_resolve_to_one_person(self):
+        CustomUser.objects.create_user("worker2", "B100000002", "員工甲")
+        CustomUser.objects.create_user("worker3", "B100000003", "員工乙")
+
+        report = self.validate("NB,,,,員工甲", "NB,,,,員工丙", "NB,,,,員工乙")
+
+        errors = self.errors(report)
+        self.assertEqual(errors, {2: "持有人名稱 員工甲 有多個匹配", 3: "找不到持有人 員工丙"})
+        self.assertEqual(report["valid"], 1)
+
+    def test_existing_tags_are_skipped_with_warning(self):
+        AssetTagSequence.objects.create(product=self.product, last_number=0)
+        Asset.objects.create(product=self.product, asset_tag="NB-001")
+
+        planned = self.validate("NB,,,,", "NB,,,,")
+        self.assertEqual([row["asset_tag"] for row in planned["rows"]], ["NB-002", "NB-003"])
+        self.assertEqual([warning["asset_tag"] for warning in planned["warnings"]], ["NB-001"])
+
+        response = self.upload("NB,,,,", "NB,,,,")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row["asset_tag"] for row in response.data["rows"]], ["NB-002", "NB-003"])
+
+    def test_failure_while_writing_rolls_back_the_whole_file(self):
+        with mock.patch("inventory.importers.record_created", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                AssetCsvImporter().run(iter_csv_rows(io.BytesIO(csv_bytes("PC,桌機,電腦,300,", "NB,,,,"))))
+
+        self.assertFalse(Product.objects.filter(code="PC").exists())
+        self.assertFalse(Asset.objects.exists())
+
+
+# ================================================================
+# asset_tag 流水號（併發配號）
+# ================================================================
+class AssetTagSequenceTests(InventoryTestCase):
+    def test_reservations_continue_from_existing_tags(self):
+        Asset.objects.create(product=self.product, asset_tag="NB-007")
+
+        first = AssetTagSequence.reserve_tags(self.product, 3)
+        Asset.objects.filter(asset_tag="NB-007").delete()
+        second = AssetTagSequence.reserve_tags(self.product, 2)
+
+        self.assertEqual(first, ["NB-008", "NB-009", "NB-010"])
+        # 刪除資產後不會重用編號
+        self.assertEqual(second, ["NB-011", "NB-012"])
+        self.assertEqual(Asset.objects.create(product=self.product).asset_tag, "NB-013")
+
+
+# SQLite 的寫入會鎖定整個資料庫，只在有列鎖的資料庫（PostgreSQL）執行
+@skipUnlessDBFeature("has_select_for_update")
+class AssetTagSequenceConcurrencyTests(TransactionTestCase):
+    def test_parallel_reservations_do_not_duplicate_or_skip(self):
+        product = Product.objects.create(code="NB", name="筆電", type="電腦", price=100)
+        Asset.objects.create(product=product)
+        workers, rounds = 4, 10
+        barrier = threading.Barrier(workers)
+        reserved, errors = [], []
+
+        def reserve(count):
+            try:
+                barrier.wait()
+                for _ in range(rounds):
+                    with transaction.atomic():
+                        reserved.extend(AssetTagSequence.reserve_tags(product, count))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reserve, args=(count,)) for count in range(1, workers + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        total = rounds * sum(range(1, workers + 1))
+        self.assertEqual(sorted(reserved), [format_asset_tag("NB", n) for n in range(2, total + 2)])
+        self.assertEqual(AssetTagSequence.objects.get(product=product).last_number, total + 1)
@@ -5,5 +5,7 @@ urlpatterns = [
     path("assets/", views.assets_list, name="assets_list"),            # GET: 列表 / POST: 新增
     path("assets/<int:pk>/", views.asset_detail, name="asset_detail"), # GET / PUT / DELETE
     path('stock_transaction/', views.stock_transaction),
+    path('stock_transaction/batch/', views.stock_transaction_batch),
+    path('stock_history/batch/', views.stock_history_batch),
     path('stock_history/<str:asset_tag>/', views.stock_history),
 ]
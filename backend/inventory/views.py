@@ -1,34 +1,69 @@
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Asset, Product, StockTransaction
-from users.models import CustomUser
+from users.name_resolver import AMBIGUOUS, UserNameResolver
+from users.filters import parse_bool
 from system.models import SystemSetting
+from system.versioning import conditional_on_tables
+from users.models import CustomUser
+from departments.models import Department
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from users.authentication import ClaimJWTAuthentication
 from .serializers import AssetSerializer
-import io, csv
+from .filters import asset_queryset, filter_assets, filter_transaction_dates
+from .pagination import AssetCursorPagination, StockHistoryCursorPagination
+from .importers import AssetCsvImporter, iter_csv_rows
+from .jobs import enqueue_asset_import
+from system.jobs import job_data
+from .stock import MAX_BATCH_ITEMS, apply_stock_transactions
+
+MAX_HISTORY_BATCH_ASSETS = 200
+MAX_HISTORY_BATCH_LIMIT = 50
 
 # ================================================================
 # 資產列表（GET/POST）
 # ================================================================
 @api_view(['GET', 'POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimJWTAuthentication])
 @permission_classes([IsAuthenticated])
+@conditional_on_tables(Asset, Product, CustomUser, Department)
 def assets_list(request):
     if request.method == 'GET':
-        assets = Asset.objects.select_related('product', 'owner_user').all()
-        serializer = AssetSerializer(assets, many=True)
+        assets = filter_assets(request.query_params)
+
+        # 帶 cursor / page_size 時使用 keyset 分頁，否則維持原本的完整列表
+        if "cursor" in request.query_params or "page_size" in request.query_params:
+            paginator = AssetCursorPagination()
+            page = paginator.paginate_queryset(assets, request)
+            serializer = AssetSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
+        serializer = AssetSerializer(assets.order_by('id'), many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     elif request.method == 'POST':
-        created = []
-        asset_entries = []
-
         # -----------------------
-        # 判斷是否為 CSV 匯入
+        # CSV 匯入：先檢查整個檔案並回報所有錯誤，再以單一 transaction 寫入有效的列
+        # dry_run=true 時只檢查不寫入（回傳每列的檢查結果與預計的 asset_tag）
+        # IMPORT_IN_BACKGROUND 時改為背景工作，立即回傳 job（進度見 /api/system/jobs/<id>/）
         # -----------------------
-        is_csv_import = 'file' in request.FILES
+        if 'file' in request.FILES:
+            dry_run = bool(parse_bool(request.query_params.get('dry_run') or request.data.get('dry_run')))
+            if settings.IMPORT_IN_BACKGROUND:
+                job = enqueue_asset_import(request.FILES['file'], request.user, dry_run=dry_run)
+                return Response(job_data(job), status=status.HTTP_202_ACCEPTED)
+            report = AssetCsvImporter(dry_run=dry_run).run(iter_csv_rows(request.FILES['file']))
+            if dry_run:
+                return Response(report, status=status.HTTP_200_OK)
+            if report["created"] == 0 and report["failed"] > 0:
+                return Response(report, status=status.HTTP_400_BAD_REQUEST)
+            return Response(report, status=status.HTTP_201_CREATED)
+
+        created = []
 
         # -----------------------
         # 讀取系統設定：是否啟用產品重複檢查
@@ -40,29 +75,16 @@ def assets_list(request):
             check_duplicates = False
 
         # -----------------------
-        # 統一處理 CSV 或單筆新增
+        # 單筆新增
         # -----------------------
-        if is_csv_import:
-            file = request.FILES['file']
-            decoded_file = file.read().decode('utf-8')
-            reader = csv.DictReader(io.StringIO(decoded_file))
-            for row in reader:
-                asset_entries.append({
-                    "product_code": row.get('產品代碼'),
-                    "name": row.get('名稱'),
-                    "type": row.get('種類', ''),
-                    "price": float(row.get('價格', 0) or 0),
-                    "owner_name": row.get('持有人', None)
-                })
-        else:
-            data = request.data
-            asset_entries.append({
-                "product_code": data.get('product_code'),
-                "name": data.get('name'),
-                "type": data.get('type', ''),
-                "price": float(data.get('price', 0) or 0),
-                "owner_name": data.get('owner_user', None)
-            })
+        data = request.data
+        asset_entries = [{
+            "product_code": data.get('product_code'),
+            "name": data.get('name'),
+            "type": data.get('type', ''),
+            "price": float(data.get('price', 0) or 0),
+            "owner_name": data.get('owner_user', None)
+        }]
 
         # ============================================================
         # 資產建立處理
@@ -76,58 +98,40 @@ def assets_list(request):
 
             if not product_code:
                 return Response({"detail": "產品代碼為必填欄位"}, status=status.HTTP_400_BAD_REQUEST)
+            if owner_name is not None and not isinstance(owner_name, str):
+                return Response({"detail": "持有人必須是姓名字串"}, status=status.HTTP_400_BAD_REQUEST)
 
             # -----------------------
             # 產品處理邏輯
             # -----------------------
-            product = None
-
-            if is_csv_import:
-                # 匯入時：不檢查重複，直接建立或取得
+            if check_duplicates:
+                # ✅ 系統設定開啟：允許重複 → 若存在直接取用
+                product = Product.objects.filter(code=product_code).first()
+                if not product:
+                    product = Product.objects.create(
+                        code=product_code,
+                        name=name,
+                        type=type_,
+                        price=price
+                    )
+            else:
+                # 🚫 關閉檢查：每筆都視為新產品
+                # 若 code 唯一會報錯，交由 unique constraint 處理
                 product, _ = Product.objects.get_or_create(
                     code=product_code,
                     defaults={'name': name, 'type': type_, 'price': price}
                 )
-            else:
-                if check_duplicates:
-                    # ✅ 系統設定開啟：允許重複 → 若存在直接取用
-                    product = Product.objects.filter(code=product_code).first()
-                    if not product:
-                        product = Product.objects.create(
-                            code=product_code,
-                            name=name,
-                            type=type_,
-                            price=price
-                        )
-                else:
-                    # 🚫 關閉檢查：每筆都視為新產品
-                    # 若 code 唯一會報錯，交由 unique constraint 處理
-                    product, _ = Product.objects.get_or_create(
-                        code=product_code,
-                        defaults={'name': name, 'type': type_, 'price': price}
-                    )
 
             # -----------------------
             # 找持有人（可模糊比對）
             # -----------------------
             owner_user = None
             if owner_name:
-                qs = CustomUser.objects.filter(name__icontains=owner_name)
-                if qs.count() == 1:
-                    owner_user = qs.first()
-                elif qs.count() > 1:
-                    candidates = [
-                        {
-                            "id_number": p.id_number,
-                            "name": p.name,
-                            "department": p.department.name if p.department else None,
-                            "email": p.email,
-                            "phone": p.phone
-                        } for p in qs
-                    ]
+                match = UserNameResolver().resolve([owner_name]).get(owner_name.strip())
+                if match and match["status"] == AMBIGUOUS:
                     return Response({
                         "detail": f"持有人名稱 {owner_name} 有多個匹配",
-                        "candidates": candidates,
+                        "candidates": match["candidates"],
                         "asset_data": {
                             "product_code": product_code,
                             "name": name,
@@ -135,6 +139,8 @@ def assets_list(request):
                             "price": price
                         }
                     }, status=status.HTTP_409_CONFLICT)
+                if match:
+                    owner_user = match["user"]
 
             # -----------------------
             # 建立資產（asset_tag 自動生成）
@@ -155,11 +161,12 @@ def assets_list(request):
 # 單一資產 CRUD（GET / PUT / DELETE）
 # ================================================================
 @api_view(['GET', 'PUT', 'DELETE'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimJWTAuthentication])
 @permission_classes([IsAuthenticated])
+@conditional_on_tables(Asset, Product, CustomUser, Department)
 def asset_detail(request, pk):
     try:
-        asset = Asset.objects.get(pk=pk)
+        asset = asset_queryset().get(pk=pk)
     except Asset.DoesNotExist:
         return Response({"error": "Asset not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -183,7 +190,7 @@ def asset_detail(request, pk):
 # 出入庫操作
 # ================================================================
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def stock_transaction(request):
     data = request.data
@@ -192,69 +199,139 @@ def stock_transaction(request):
     person_id_number = data.get("person_id")  # 前端選單用 id_number
     remark = data.get("remark", "")
 
-    # 確認資產存在
-    try:
-        asset = Asset.objects.get(asset_tag=asset_tag)
-    except Asset.DoesNotExist:
-        return Response({"error": "資產不存在"}, status=status.HTTP_404_NOT_FOUND)
-
-    if transaction_type == "OUT":
-        # 已在員工手上
-        if asset.owner_user is not None:
-            return Response({"error": "該資產已在員工手上"}, status=status.HTTP_400_BAD_REQUEST)
-
-        if not person_id_number:
-            return Response({"error": "缺少員工 ID"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 用 id_number 查找員工
-        try:
-            person = CustomUser.objects.get(id_number=person_id_number)
-        except CustomUser.DoesNotExist:
-            return Response({"error": "員工不存在"}, status=status.HTTP_404_NOT_FOUND)
-
-        asset.owner_user = person
-        asset.save()
-
-    elif transaction_type == "IN":
-        # 已在倉庫中
-        if asset.owner_user is None:
-            return Response({"error": "該資產已在倉庫中"}, status=status.HTTP_400_BAD_REQUEST)
-        asset.owner_user = None
-        asset.save()
-    else:
-        return Response({"error": "無效交易類型"}, status=status.HTTP_400_BAD_REQUEST)
-
-    # 記錄交易
-    StockTransaction.objects.create(
-        asset=asset,
-        transaction_type=transaction_type,
-        remark=remark
-    )
+    # 鎖定資產後檢查狀態並記錄交易（同一 transaction 內，避免重複出庫）
+    results, assets = apply_stock_transactions([{
+        "asset_tag": asset_tag,
+        "transaction_type": transaction_type,
+        "person_id": person_id_number,
+        "remark": remark,
+    }])
+    result = results[0]
+    if not result["success"]:
+        return Response({"error": result["error"]}, status=result["status"])
 
+    asset = asset_queryset().get(asset_tag=result["asset_tag"])
     return Response(
         {"success": True, "asset": AssetSerializer(asset).data},
         status=status.HTTP_200_OK
     )
 
 
+# ================================================================
+# 批次出入庫
+# ================================================================
+@api_view(['POST'])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def stock_transaction_batch(request):
+    """
+    items=[{"asset_tag", "transaction_type", "person_id", "remark"}, ...]
+    all_or_nothing=true 時任一筆失敗即全部不寫入
+    """
+    items = request.data.get("items")
+    if not isinstance(items, list) or not items:
+        return Response({"error": "items 必須是非空陣列"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_BATCH_ITEMS:
+        return Response({"error": f"單次最多 {MAX_BATCH_ITEMS} 筆"}, status=status.HTTP_400_BAD_REQUEST)
+    if not all(isinstance(item, dict) for item in items):
+        return Response({"error": "items 內容格式錯誤"}, status=status.HTTP_400_BAD_REQUEST)
+
+    all_or_nothing = bool(parse_bool(request.data.get("all_or_nothing")))
+    results, _ = apply_stock_transactions(items, all_or_nothing=all_or_nothing)
+    failed = sum(1 for r in results if not r["success"])
+    applied = 0 if all_or_nothing and failed else len(results) - failed
+
+    return Response({
+        "applied": applied,
+        "failed": failed,
+        "results": results,
+    }, status=status.HTTP_200_OK if applied or not failed else status.HTTP_400_BAD_REQUEST)
+
+
 # ================================================================
 # 某資產歷史
 # ================================================================
 @api_view(['GET'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def stock_history(request, asset_tag):
     try:
-        asset = Asset.objects.get(asset_tag=asset_tag)
+        asset = Asset.objects.only("id").get(asset_tag=asset_tag)
     except Asset.DoesNotExist:
         return Response({"error": "資產不存在"}, status=status.HTTP_404_NOT_FOUND)
 
-    transactions = StockTransaction.objects.filter(asset=asset).order_by("-date")
-    data = [{
+    try:
+        transactions = filter_transaction_dates(
+            StockTransaction.objects.filter(asset=asset), request.query_params
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # 帶 cursor / page_size 時使用 keyset 分頁，否則維持原本的完整列表
+    if "cursor" in request.query_params or "page_size" in request.query_params:
+        paginator = StockHistoryCursorPagination()
+        page = paginator.paginate_queryset(transactions, request)
+        return paginator.get_paginated_response([transaction_data(t) for t in page])
+
+    data = [transaction_data(t) for t in transactions.order_by("-date", "-id")]
+    return Response(data, status=status.HTTP_200_OK)
+
+
+# ================================================================
+# 多資產歷史（每個資產取最新 N 筆）
+# ================================================================
+@api_view(['GET'])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def stock_history_batch(request):
+    """
+    asset_tags=SK-001,SK-002&limit=5
+    以 window function 一次查出每個資產最新 limit 筆紀錄
+    """
+    tags = [t for t in request.query_params.get("asset_tags", "").split(",") if t]
+    if not tags:
+        return Response({"error": "請提供 asset_tags"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(tags) > MAX_HISTORY_BATCH_ASSETS:
+        return Response({"error": f"單次最多 {MAX_HISTORY_BATCH_ASSETS} 個資產"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = min(int(request.query_params.get("limit", 5)), MAX_HISTORY_BATCH_LIMIT)
+    except ValueError:
+        return Response({"error": "limit 必須是數字"}, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({"error": "limit 必須大於 0"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        transactions = filter_transaction_dates(
+            StockTransaction.objects.filter(asset__asset_tag__in=tags), request.query_params
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    transactions = (
+        transactions
+        .annotate(
+            asset_tag=F("asset__asset_tag"),
+            rank=Window(
+                expression=RowNumber(),
+                partition_by=[F("asset_id")],
+                order_by=[F("date").desc(), F("id").desc()],
+            ),
+        )
+        .filter(rank__lte=limit)
+        .order_by("asset_tag", "rank")
+    )
+
+    data = {tag: [] for tag in tags}
+    for t in transactions:
+        data[t.asset_tag].append(transaction_data(t))
+    return Response(data, status=status.HTTP_200_OK)
+
+
+def transaction_data(t):
+    return {
         "id": t.id,
         "transaction_type": t.transaction_type,
         "date": t.date,
         "remark": t.remark
-    } for t in transactions]
-
-    return Response(data, status=status.HTTP_200_OK)
+    }
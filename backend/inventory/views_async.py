@@ -0,0 +1,68 @@
+from departments.models import Department
+from system.async_api import async_read_view, json_response, paginate
+from system.versioning import conditional_on_tables
+from users.models import CustomUser
+from . import views
+from .filters import asset_queryset, filter_assets, filter_transaction_dates
+from .models import Asset, Product, StockTransaction
+from .pagination import AssetCursorPagination, StockHistoryCursorPagination
+from .serializers import AssetSerializer
+
+# ASGI（backend.urls_async）使用的 async 讀取端點，回應格式與 views.py 相同
+# 寫入（POST / PUT / DELETE）仍由 views.py 的 sync view 處理
+
+
+# ================================================================
+# 資產列表（GET）
+# ================================================================
+@async_read_view(views.assets_list)
+@conditional_on_tables(Asset, Product, CustomUser, Department)
+async def assets_list(request):
+    assets = filter_assets(request.GET)
+
+    # 帶 cursor / page_size 時使用 keyset 分頁，否則維持原本的完整列表
+    if "cursor" in request.GET or "page_size" in request.GET:
+        page, paginated = await paginate(AssetCursorPagination(), assets, request)
+        return json_response(paginated(AssetSerializer(page, many=True).data))
+
+    rows = [asset async for asset in assets.order_by("id")]
+    return json_response(AssetSerializer(rows, many=True).data)
+
+
+# ================================================================
+# 單一資產（GET）
+# ================================================================
+@async_read_view(views.asset_detail)
+@conditional_on_tables(Asset, Product, CustomUser, Department)
+async def asset_detail(request, pk):
+    try:
+        asset = await asset_queryset().aget(pk=pk)
+    except Asset.DoesNotExist:
+        return json_response({"error": "Asset not found"}, status=404)
+    return json_response(AssetSerializer(asset).data)
+
+
+# ================================================================
+# 某資產歷史（GET）
+# ================================================================
+@async_read_view(views.stock_history)
+async def stock_history(request, asset_tag):
+    try:
+        asset = await Asset.objects.only("id").aget(asset_tag=asset_tag)
+    except Asset.DoesNotExist:
+        return json_response({"error": "資產不存在"}, status=404)
+
+    try:
+        transactions = filter_transaction_dates(
+            StockTransaction.objects.filter(asset=asset), request.GET
+        )
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+
+    # 帶 cursor / page_size 時使用 keyset 分頁，否則維持原本的完整列表
+    if "cursor" in request.GET or "page_size" in request.GET:
+        page, paginated = await paginate(StockHistoryCursorPagination(), transactions, request)
+        return json_response(paginated([views.transaction_data(t) for t in page]))
+
+    data = [views.transaction_data(t) async for t in transactions.order_by("-date", "-id")]
+    return json_response(data)
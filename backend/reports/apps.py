@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
+
+    def ready(self):
+        from system.jobs import job_finished
+        from . import signals  # noqa: F401
+        from .audit import flush_audit_events
+
+        # 請求的事件由緩衝區依筆數 / 間隔批次寫入；背景工作則於每個工作結束後寫入
+        job_finished.connect(flush_audit_events, dispatch_uid="flush_audit_events_job")
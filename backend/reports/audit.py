@@ -0,0 +1,279 @@
+import atexit
+import contextvars
+import logging
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+
+from system.jobs import current_job
+from .models import AuditEvent
+
+logger = logging.getLogger("equip_mgmt")
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+# 不寫入稽核紀錄的欄位：密碼雜湊、每次登入都會變動的欄位
+EXCLUDED_FIELDS = frozenset({"password", "last_login", "updated_at"})
+
+# 目前請求（由 AuditMiddleware 設定），用來取得操作者
+_current_request = contextvars.ContextVar("audit_request", default=None)
+
+
+# ================================================================
+# 差異計算
+# ================================================================
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def field_value(field, value):
+    # 金額欄位可能被指定為 int / float，統一成資料庫的小數位數再比較
+    if isinstance(field, models.DecimalField) and value is not None:
+        try:
+            return format(field.to_python(value), f".{field.decimal_places}f")
+        except ValidationError:
+            return str(value)
+    return json_value(value)
+
+
+def snapshot(instance):
+    """
+    實體欄位的 JSON 快照（ForeignKey 以 *_id 記錄）
+    只讀取已載入的欄位，.only() / .defer() 延遲載入的欄位不會觸發額外查詢
+    """
+    loaded = instance.__dict__
+    return {
+        field.attname: field_value(field, loaded[field.attname])
+        for field in instance._meta.concrete_fields
+        if field.attname in loaded and field.name not in EXCLUDED_FIELDS
+    }
+
+
+def loaded_snapshot(instance, loaded, fields):
+    """載入時的欄位值（LoadedValuesMixin._loaded_values，格式同 snapshot），只取 fields 中已載入的欄位"""
+    return {
+        attname: field_value(instance._meta.get_field(attname), loaded[attname])
+        for attname in fields if attname in loaded
+    }
+
+
+def stored_snapshot(instance, fields, using=None):
+    """資料庫中目前的欄位值（格式同 snapshot），只讀取 fields（attname）；資料列不存在時回傳 None"""
+    model_fields = [instance._meta.get_field(attname) for attname in fields]
+    row = (
+        type(instance)._base_manager.using(using)
+        .filter(pk=instance.pk).values(*[field.attname for field in model_fields]).first()
+    )
+    if row is None:
+        return None
+    return {field.attname: field_value(field, row[field.attname]) for field in model_fields}
+
+
+def compact_diff(before, after):
+    """只保留有變動的欄位，回傳 (data_before, data_after)"""
+    changed = [key for key in after if before.get(key) != after[key]]
+    return {key: before.get(key) for key in changed}, {key: after[key] for key in changed}
+
+
+def entity_name(model):
+    return model._meta.label_lower
+
+
+def current_actor_id():
+    request = _current_request.get()
+    user = getattr(request, "user", None) if request is not None else None
+    # DRF 驗證後會把使用者寫回原始的 HttpRequest
+    if user is not None and getattr(user, "is_authenticated", False):
+        return user.pk
+    # 背景工作：以建立工作的人員作為操作者
+    job = current_job()
+    return job.created_by_id if job is not None else None
+
+
+# ================================================================
+# 行程內緩衝區
+# ================================================================
+
+class AuditBuffer:
+    """
+    稽核事件緩衝區：
+    - 事件在交易 commit 後才進入緩衝區（rollback 的變更不會被記錄）
+    - 達到 AUDIT_BUFFER_SIZE 時喚醒背景 thread 寫入，或每 AUDIT_FLUSH_INTERVAL 秒寫入一次；
+      多個請求的事件累積在同一批寫入，請求本身不做任何寫入
+    - 背景工作結束（job_finished）與行程結束時強制寫入
+    寫入以 bulk_create 一次完成，不佔用請求本身的資料庫往返
+    """
+
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @property
+    def max_size(self):
+        return getattr(settings, "AUDIT_BUFFER_SIZE", 500)
+
+    @property
+    def interval(self):
+        return getattr(settings, "AUDIT_FLUSH_INTERVAL", 2.0)
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, events):
+        with self._lock:
+            self._events.extend(events)
+            full = len(self._events) >= self.max_size
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """將緩衝區內的事件以 bulk_create 寫入，回傳寫入筆數"""
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+            try:
+                AuditEvent.objects.bulk_create(events, batch_size=self.max_size)
+            except Exception:
+                logger.exception("稽核紀錄寫入失敗，%d 筆事件放回緩衝區", len(events))
+                with self._lock:
+                    # 上限為緩衝區大小的 10 倍，避免資料庫長時間無法寫入時記憶體無限成長
+                    self._events = (events + self._events)[-self.max_size * 10:]
+                return 0
+            return len(events)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("稽核背景寫入失敗")
+
+
+audit_buffer = AuditBuffer()
+atexit.register(audit_buffer.flush)
+
+
+def flush_audit_events(**kwargs):
+    """job_finished 的 receiver，也可在批次作業結束時直接呼叫"""
+    return audit_buffer.flush()
+
+
+# ================================================================
+# 記錄事件
+# ================================================================
+
+def audit_enabled():
+    return getattr(settings, "AUDIT_ENABLED", True)
+
+
+def record(entity, changes, actor_id=None):
+    """
+    changes：[(entity_id, action, data_before, data_after), ...]
+    在目前交易 commit 後放入緩衝區；不在交易中時立即放入
+    """
+    if not changes or not audit_enabled():
+        return
+    if actor_id is None:
+        actor_id = current_actor_id()
+    occurred_at = timezone.now()
+    events = [
+        AuditEvent(
+            entity=entity,
+            entity_id=str(entity_id),
+            action=action,
+            actor_id=actor_id,
+            data_before=before,
+            data_after=after,
+            occurred_at=occurred_at,
+        )
+        for entity_id, action, before, after in changes
+    ]
+    transaction.on_commit(lambda: audit_buffer.add(events))
+
+
+def record_created(model, instances):
+    """bulk_create 之後記錄新增事件"""
+    record(entity_name(model), [(obj.pk, CREATE, None, snapshot(obj)) for obj in instances])
+
+
+def record_updates(model, rows):
+    """
+    bulk 更新之後記錄異動事件
+    rows：[(pk, before_dict, after_dict), ...]，只記錄有差異的資料
+    """
+    changes = []
+    for pk, before, after in rows:
+        data_before, data_after = compact_diff(
+            {key: json_value(value) for key, value in before.items()},
+            {key: json_value(value) for key, value in after.items()},
+        )
+        if data_after:
+            changes.append((pk, UPDATE, data_before, data_after))
+    record(entity_name(model), changes)
+
+
+# ================================================================
+# Middleware
+# ================================================================
+
+class AuditMiddleware:
+    """
+    記錄目前請求以取得操作者；事件由 AuditBuffer 的背景 thread 跨請求批次寫入
+    同時支援 WSGI（sync）與 ASGI（async）
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_request.reset(token)
@@ -0,0 +1,78 @@
+import csv
+import tempfile
+from datetime import datetime
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_CHUNK_SIZE = 2000
+# 每次 yield 的列數，避免逐列輸出造成過多小區塊
+ROWS_PER_YIELD = 500
+
+CSV = "csv"
+XLSX = "xlsx"
+EXPORT_FILE_TYPES = (CSV, XLSX)
+
+
+class _Echo:
+    """csv.writer 的輸出目標：直接回傳寫入的字串"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows, bom=False):
+    writer = csv.writer(_Echo())
+    if bom:
+        # Excel 需要 BOM 才會以 UTF-8 開啟
+        yield "\ufeff"
+    yield writer.writerow(header)
+    buffer = []
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= ROWS_PER_YIELD:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def excel_value(value):
+    # openpyxl 不接受帶時區的 datetime
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.make_naive(value)
+    return value
+
+
+def export_response(filename, header, rows, file_type=CSV, bom=False):
+    """
+    rows 應為 QuerySet.values_list(...).iterator(chunk_size=...)，逐批讀取資料庫
+    CSV：StreamingHttpResponse 邊讀邊送，記憶體用量固定
+    XLSX：openpyxl write-only 模式寫入暫存檔後以檔案串流回傳
+    """
+    stamp = timezone.localtime().strftime("%Y%m%d%H%M%S")
+
+    if file_type == XLSX:
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(filename)
+        sheet.append(header)
+        for row in rows:
+            sheet.append([excel_value(v) for v in row])
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f"{filename}_{stamp}.xlsx",
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    response = StreamingHttpResponse(
+        iter_csv(header, rows, bom=bom),
+        content_type="text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}_{stamp}.csv"'
+    return response
@@ -0,0 +1,44 @@
+from inventory.filters import parse_query_datetime
+from .models import AuditEvent
+
+
+def filter_audit_events(params, queryset=None):
+    """
+    依 query 參數篩選稽核紀錄：
+    - entity：實體名稱，例如 inventory.asset
+    - entity_id：實體主鍵（需搭配 entity）
+    - actor：操作者 id
+    - action：create / update / delete
+    - date_from / date_to：發生時間區間（ISO 日期或日期時間）
+    """
+    qs = queryset if queryset is not None else AuditEvent.objects.all()
+
+    entity = params.get("entity")
+    if entity:
+        qs = qs.filter(entity=entity)
+
+    entity_id = params.get("entity_id")
+    if entity_id:
+        if not entity:
+            raise ValueError("entity_id 需搭配 entity 使用")
+        qs = qs.filter(entity_id=entity_id)
+
+    actor = params.get("actor")
+    if actor:
+        try:
+            qs = qs.filter(actor_id=int(actor))
+        except ValueError:
+            raise ValueError("actor 必須是數字")
+
+    action = params.get("action")
+    if action:
+        qs = qs.filter(action=action)
+
+    date_from = params.get("date_from")
+    if date_from:
+        qs = qs.filter(occurred_at__gte=parse_query_datetime(date_from))
+    date_to = params.get("date_to")
+    if date_to:
+        qs = qs.filter(occurred_at__lte=parse_query_datetime(date_to, end_of_day=True))
+
+    return qs
@@ -0,0 +1,67 @@
+import gzip
+import json
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from reports.models import AuditEvent
+
+ARCHIVE_FIELDS = ("id", "entity", "entity_id", "action", "actor_id", "data_before", "data_after", "occurred_at")
+
+
+class Command(BaseCommand):
+    help = "將超過保留天數的稽核紀錄寫入 gzip JSONL 封存檔後分批刪除"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="保留天數（預設 AUDIT_RETENTION_DAYS）")
+        parser.add_argument("--batch-size", type=int, default=5000, help="每批封存並刪除的筆數")
+        parser.add_argument("--archive-dir", default=None, help="封存目錄（預設 AUDIT_ARCHIVE_DIR）")
+        parser.add_argument("--dry-run", action="store_true", help="只計算筆數，不寫檔也不刪除")
+
+    def handle(self, *args, **options):
+        days = options["days"] if options["days"] is not None else settings.AUDIT_RETENTION_DAYS
+        if days < 0:
+            raise CommandError("--days 不可為負數")
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size 必須大於 0")
+
+        cutoff = timezone.now() - timedelta(days=days)
+        expired = AuditEvent.objects.filter(occurred_at__lt=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{expired.count()} events older than {cutoff.isoformat()}")
+            return
+
+        archive_dir = Path(options["archive_dir"] or settings.AUDIT_ARCHIVE_DIR)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        path = archive_dir / f"audit_events_{timezone.localtime().strftime('%Y%m%d%H%M%S')}.jsonl.gz"
+
+        archived = 0
+        while True:
+            # 依 (occurred_at, id) 由舊到新取一批，走 audit_time_idx
+            rows = list(
+                expired.order_by("occurred_at", "id").values(*ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+
+            # 每批寫成獨立的 gzip member 並關閉檔案後才刪除，
+            # 中途中斷時已刪除的資料一定已完整寫入封存檔
+            with gzip.open(path, "at", encoding="utf-8") as archive:
+                for row in rows:
+                    archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+                    archive.write("\n")
+
+            AuditEvent.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+            archived += len(rows)
+            self.stdout.write(f"archived {archived} events")
+
+        if archived:
+            self.stdout.write(self.style.SUCCESS(f"archived {archived} events to {path}"))
+        else:
+            self.stdout.write(f"no events older than {cutoff.isoformat()}")
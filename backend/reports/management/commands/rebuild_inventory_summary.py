@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from inventory.models import Product
+from reports.models import InventorySummary
+from reports.summary import rebuild_inventory_summary
+
+
+class Command(BaseCommand):
+    help = "由資產表完整重建庫存彙總表（用於修復增量更新的誤差）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product-code", action="append", dest="product_codes", help="只重建指定產品，可重複指定")
+
+    def handle(self, *args, **options):
+        product_ids = None
+        if options["product_codes"]:
+            product_ids = list(Product.objects.filter(code__in=options["product_codes"]).values_list("id", flat=True))
+
+        rebuild_inventory_summary(product_ids=product_ids)
+        self.stdout.write(f"rebuilt {InventorySummary.objects.count()} summary rows")
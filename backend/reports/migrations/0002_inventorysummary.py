@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0003_alter_department_manager'),
+        ('inventory', '0004_stocktransaction_asset_date_index'),
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('IN', '在庫'), ('OUT', '出庫')], max_length=3)),
+                ('asset_count', models.IntegerField(default=0)),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='departments.department')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'db_table': 'inventory_summary',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('department__isnull', False)), fields=('product', 'department', 'status'), name='inventory_summary_bucket_uniq'), models.UniqueConstraint(condition=models.Q(('department__isnull', True)), fields=('product', 'status'), name='inventory_summary_no_dept_uniq')],
+            },
+        ),
+    ]
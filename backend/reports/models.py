@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from users.models import CustomUser
 
 
@@ -18,7 +20,54 @@ class AuditEvent(models.Model):
     actor = models.ForeignKey(CustomUser, models.SET_NULL, db_column='actor_id', blank=True, null=True)
     data_before = models.JSONField(blank=True, null=True)
     data_after = models.JSONField(blank=True, null=True)
-    occurred_at = models.DateTimeField(auto_now_add=True)
+    # 事件由緩衝區批次寫入，時間在事件發生時指定，不使用 auto_now_add
+    occurred_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = 'audit_events'
+        indexes = [
+            # 單一實體的異動歷史（依 id 由新到舊分頁，見 AuditEventCursorPagination）
+            models.Index(fields=["entity", "entity_id", "-id"], name="audit_entity_id_idx"),
+            # 某人的操作紀錄
+            models.Index(fields=["actor", "-id"], name="audit_actor_id_idx"),
+            # 時間區間查詢與保留期限清理
+            models.Index(fields=["occurred_at", "id"], name="audit_time_idx"),
+        ]
+
+
+class InventorySummary(models.Model):
+    """
+    庫存彙總：產品 × 部門 × 狀態 的資產數量與總價值
+    在庫（IN）資產沒有持有人，department 為空；出庫（OUT）為持有人所屬部門
+    由 reports.summary 於資產 / 出入庫 / 人員異動時增量更新
+    """
+    IN = "IN"
+    OUT = "OUT"
+    STATUS_CHOICES = [
+        (IN, "在庫"),
+        (OUT, "出庫"),
+    ]
+
+    product = models.ForeignKey("inventory.Product", on_delete=models.CASCADE, related_name="+")
+    department = models.ForeignKey(
+        "departments.Department", on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    status = models.CharField(max_length=3, choices=STATUS_CHOICES)
+    asset_count = models.IntegerField(default=0)
+    total_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "inventory_summary"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "department", "status"],
+                condition=Q(department__isnull=False),
+                name="inventory_summary_bucket_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["product", "status"],
+                condition=Q(department__isnull=True),
+                name="inventory_summary_no_dept_uniq",
+            ),
+        ]
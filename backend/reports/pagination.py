@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class AuditEventCursorPagination(CursorPagination):
+    """
+    稽核紀錄 keyset 分頁：依 id 由新到舊（與寫入順序相同），對應 audit_entity_id_idx / audit_actor_id_idx 索引
+    不以 occurred_at 排序：同一批次（例如大量匯入）的事件時間相同，cursor 只以第一個排序欄位定位，
+    大量相同值時會退回 OFFSET
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    ordering = "-id"
@@ -0,0 +1,184 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from departments.models import Department
+from inventory.models import Asset, Product
+from users.models import CustomUser
+from .audit import (
+    CREATE, DELETE, UPDATE, compact_diff, entity_name, loaded_snapshot, record, record_updates, snapshot,
+    stored_snapshot,
+)
+from .summary import apply_delta, asset_delta, diff, rebuild_inventory_summary, summarize
+
+# ================================================================
+# 庫存彙總表的增量更新（單筆 save / delete）
+# bulk 操作（CSV 匯入、批次出入庫、人員批次異動）不會觸發 signal，
+# 由各自的程式以 reports.summary.track_inventory / add_assets 處理
+# ================================================================
+
+
+SUMMARY_FIELDS = ("product_id", "owner_user_id")
+
+
+def _summary_state(instance):
+    return tuple(getattr(instance, attname) for attname in SUMMARY_FIELDS)
+
+
+@receiver(pre_save, sender=Asset)
+def asset_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    # 原值取自載入時的欄位值（LoadedValuesMixin）；不是從資料庫載入的 instance 才查詢一次
+    instance._summary_before = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not {"product", "owner_user"} & set(update_fields):
+        instance._summary_before = _summary_state(instance)
+        return
+    loaded = getattr(instance, "_loaded_values", None)
+    if not instance._state.adding and loaded is not None and all(attname in loaded for attname in SUMMARY_FIELDS):
+        instance._summary_before = tuple(loaded[attname] for attname in SUMMARY_FIELDS)
+    else:
+        # 自行指定 pk 的 instance：資料列不存在時為 None（新增）
+        instance._summary_before = (
+            Asset._base_manager.filter(pk=instance.pk).values_list(*SUMMARY_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=Asset)
+def asset_post_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    apply_delta(asset_delta(instance, instance._summary_before, _summary_state(instance)))
+
+
+@receiver(post_delete, sender=Asset)
+def asset_post_delete(sender, instance, origin=None, **kwargs):
+    # 刪除產品時彙總列會一起 cascade 刪除，不需逐筆處理
+    if isinstance(origin, Product):
+        return
+    apply_delta(asset_delta(instance, _summary_state(instance), None))
+
+
+@receiver(pre_save, sender=Product)
+def product_pre_save(sender, instance, raw=False, **kwargs):
+    instance._price_before = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    loaded = getattr(instance, "_loaded_values", None)
+    if loaded is not None and "price" in loaded:
+        instance._price_before = loaded["price"]
+    else:
+        instance._price_before = Product.objects.filter(pk=instance.pk).values_list("price", flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def product_post_save(sender, instance, created=False, raw=False, **kwargs):
+    # 價格變更會影響該產品所有彙總列的總價值
+    if raw or created:
+        return
+    before = getattr(instance, "_price_before", None)
+    if before is not None and before != instance.price:
+        rebuild_inventory_summary(product_ids=[instance.pk])
+
+
+def _capture_owned_assets(instance, owners):
+    instance._summary_asset_ids = list(
+        Asset.objects.filter(owner_user__in=owners).values_list("pk", flat=True)
+    )
+    instance._summary_before = summarize(Asset.objects.filter(pk__in=instance._summary_asset_ids))
+
+
+def _apply_owned_assets(instance, deleted_department_id=None):
+    asset_ids = getattr(instance, "_summary_asset_ids", None)
+    if asset_ids:
+        after = summarize(Asset.objects.filter(pk__in=asset_ids))
+        delta = diff(instance._summary_before, after)
+        # 已刪除部門的彙總列已隨部門 cascade 刪除
+        apply_delta({
+            bucket: change for bucket, change in delta.items()
+            if deleted_department_id is None or bucket[1] != deleted_department_id
+        })
+
+
+@receiver(pre_delete, sender=CustomUser)
+def user_pre_delete(sender, instance, **kwargs):
+    # 刪除人員後其資產的持有人會被設為空（回到在庫）
+    _capture_owned_assets(instance, CustomUser.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_post_delete(sender, instance, **kwargs):
+    _apply_owned_assets(instance)
+    # SET_NULL 以 UPDATE 完成，不會觸發資產的 signal
+    record_updates(Asset, [
+        (pk, {"owner_user_id": instance.id_number}, {"owner_user_id": None})
+        for pk in getattr(instance, "_summary_asset_ids", [])
+    ])
+
+
+@receiver(pre_delete, sender=Department)
+def department_pre_delete(sender, instance, **kwargs):
+    # 刪除部門後成員的部門會被設為空
+    _capture_owned_assets(instance, CustomUser.objects.filter(department=instance))
+
+
+@receiver(post_delete, sender=Department)
+def department_post_delete(sender, instance, **kwargs):
+    _apply_owned_assets(instance, deleted_department_id=instance.pk)
+
+
+# ================================================================
+# 稽核紀錄（單筆 save / delete）
+# 原值取自載入時保存的欄位值（LoadedValuesMixin._loaded_values），儲存時不需再查詢資料庫；
+# 不是從資料庫載入的 instance（例如自行指定 pk 後 save）才以一次查詢讀取原值；
+# 事件於交易 commit 後放入 reports.audit 的緩衝區批次寫入
+# ================================================================
+
+AUDITED_MODELS = (Asset, Product, CustomUser, Department)
+
+
+def _audited_fields(instance, update_fields=None):
+    # 只比對已載入的欄位（.only() / .defer() 延遲載入的不比對）；指定 update_fields 時只比對這些欄位
+    fields = snapshot(instance).keys()
+    if update_fields is not None:
+        names = set(update_fields)
+        fields = [attname for attname in fields if instance._meta.get_field(attname).name in names]
+    return list(fields)
+
+
+def audit_pre_save(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    instance._audit_before = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    fields = _audited_fields(instance, update_fields)
+    if not fields:
+        return
+    loaded = getattr(instance, "_loaded_values", None)
+    if loaded is None:
+        instance._audit_before = stored_snapshot(instance, fields, using=using)
+    else:
+        instance._audit_before = loaded_snapshot(instance, loaded, fields)
+
+
+def audit_post_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        record(entity_name(sender), [(instance.pk, CREATE, None, snapshot(instance))])
+        return
+    before = getattr(instance, "_audit_before", None)
+    if before is None:
+        return
+    after = {key: value for key, value in snapshot(instance).items() if key in before}
+    data_before, data_after = compact_diff(before, after)
+    if data_after:
+        record(entity_name(sender), [(instance.pk, UPDATE, data_before, data_after)])
+
+
+def audit_post_delete(sender, instance, **kwargs):
+    record(entity_name(sender), [(instance.pk, DELETE, snapshot(instance), None)])
+
+
+for _model in AUDITED_MODELS:
+    pre_save.connect(audit_pre_save, sender=_model, dispatch_uid=f"audit_pre_save_{_model._meta.label_lower}")
+    post_save.connect(audit_post_save, sender=_model, dispatch_uid=f"audit_post_save_{_model._meta.label_lower}")
+    post_delete.connect(audit_post_delete, sender=_model, dispatch_uid=f"audit_post_delete_{_model._meta.label_lower}")
@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Sum, Value, When
+
+from inventory.models import Asset, Product
+from users.models import CustomUser
+from .models import InventorySummary
+
+
+def summarize(queryset):
+    """
+    將資產 queryset 依 (product_id, department_id, status) 彙總
+    回傳 {bucket: (數量, 總價值)}
+    """
+    rows = (
+        queryset.order_by()
+        .annotate(
+            summary_status=Case(
+                When(owner_user__isnull=True, then=Value(InventorySummary.IN)),
+                default=Value(InventorySummary.OUT),
+                output_field=CharField(),
+            ),
+        )
+        .values_list("product_id", "owner_user__department_id", "summary_status")
+        .annotate(n=Count("id"), value=Sum("product__price"))
+    )
+    return {
+        (product_id, department_id, status): (n, value or Decimal("0"))
+        for product_id, department_id, status, n, value in rows
+    }
+
+
+def diff(before, after):
+    delta = {}
+    for bucket in before.keys() | after.keys():
+        count_before, value_before = before.get(bucket, (0, Decimal("0")))
+        count_after, value_after = after.get(bucket, (0, Decimal("0")))
+        if count_after != count_before or value_after != value_before:
+            delta[bucket] = (count_after - count_before, value_after - value_before)
+    return delta
+
+
+def asset_delta(instance, before, after):
+    """
+    單筆資產 save / delete 的增量，不需彙總查詢：
+    before / after 為 (product_id, owner_user_id)，新增時 before 為 None、刪除時 after 為 None
+    只查詢持有人的部門與產品價格（instance 已載入的關聯直接使用）
+    """
+    if before == after:
+        return {}
+    states = [(state, sign) for state, sign in ((before, -1), (after, 1)) if state is not None]
+
+    owners = {owner for (_, owner), _ in states if owner is not None}
+    departments = {}
+    owner_field = Asset._meta.get_field("owner_user")
+    if owner_field.is_cached(instance) and instance.owner_user is not None:
+        departments[instance.owner_user.id_number] = instance.owner_user.department_id
+    if owners - departments.keys():
+        departments.update(
+            CustomUser.objects.filter(id_number__in=owners - departments.keys()).values_list("id_number", "department_id")
+        )
+
+    product_ids = {product_id for (product_id, _), _ in states}
+    prices = {}
+    product_field = Asset._meta.get_field("product")
+    if product_field.is_cached(instance) and instance.product is not None:
+        prices[instance.product.pk] = instance.product.price
+    if product_ids - prices.keys():
+        prices.update(Product.objects.filter(pk__in=product_ids - prices.keys()).values_list("pk", "price"))
+
+    delta = {}
+    for (product_id, owner), sign in states:
+        if owner is None:
+            bucket = (product_id, None, InventorySummary.IN)
+        else:
+            bucket = (product_id, departments.get(owner), InventorySummary.OUT)
+        count, value = delta.get(bucket, (0, Decimal("0")))
+        delta[bucket] = (count + sign, value + sign * Decimal(prices.get(product_id) or 0))
+    return {bucket: change for bucket, change in delta.items() if change != (0, Decimal("0"))}
+
+
+def apply_delta(delta):
+    """將增量寫入彙總表；bucket 不存在時先建立"""
+    for (product_id, department_id, status), (count, value) in delta.items():
+        lookup = {"product_id": product_id, "department_id": department_id, "status": status}
+        changes = {"asset_count": F("asset_count") + count, "total_value": F("total_value") + value}
+        with transaction.atomic(savepoint=False):
+            if not InventorySummary.objects.filter(**lookup).update(**changes):
+                InventorySummary.objects.get_or_create(**lookup)
+                InventorySummary.objects.filter(**lookup).update(**changes)
+
+
+def add_assets(queryset):
+    """新增資產（例如 bulk_create 之後）"""
+    apply_delta(summarize(queryset))
+
+
+def lock_assets(queryset):
+    """
+    鎖定 queryset 目前選到的資產，回傳以 pk__in 固定範圍的 queryset 供 track_inventory 使用
+    依持有人等條件篩選的 queryset 在操作前後可能選到不同資產（並行的出入庫），不可直接傳給 track_inventory
+    依 asset_tag 排序鎖定（與批次出入庫相同順序，避免死結）；需在 transaction 內呼叫
+    """
+    pks = list(queryset.select_for_update().order_by("asset_tag").values_list("pk", flat=True))
+    return Asset.objects.filter(pk__in=pks)
+
+
+@contextmanager
+def track_inventory(queryset):
+    """
+    包住會改變資產狀態的操作：前後各彙總一次 queryset，將差異寫入彙總表
+    queryset 需在操作前後都能選到受影響的資產，且這些資產已鎖定（見 lock_assets）
+    """
+    with transaction.atomic():
+        before = summarize(queryset.all())
+        yield
+        apply_delta(diff(before, summarize(queryset.all())))
+
+
+def rebuild_inventory_summary(product_ids=None):
+    """由資產表完整重建彙總表（可只重建指定產品）"""
+    assets = Asset.objects.all()
+    rows = InventorySummary.objects.all()
+    if product_ids is not None:
+        assets = assets.filter(product_id__in=product_ids)
+        rows = rows.filter(product_id__in=product_ids)
+
+    with transaction.atomic():
+        rows.delete()
+        InventorySummary.objects.bulk_create(
+            InventorySummary(
+                product_id=product_id,
+                department_id=department_id,
+                status=status,
+                asset_count=count,
+                total_value=value,
+            )
+            for (product_id, department_id, status), (count, value) in summarize(assets).items()
+        )
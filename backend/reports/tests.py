@@ -1,3 +1,336 @@
-from django.test import TestCase
+import codecs
+import csv
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.core.signals import request_finished
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from departments.models import Department
+from inventory.models import Asset, Product
+from inventory.stock import apply_stock_transactions
+from system.jobs import Worker, enqueue
+from users.importers import import_users
+from users.models import CustomUser
+from .audit import CREATE, UPDATE, current_actor_id
+from .models import AuditEvent, InventorySummary
+from .summary import lock_assets, rebuild_inventory_summary, track_inventory
+
+
+def summary_rows():
+    return {
+        (row.product_id, row.department_id, row.status): (row.asset_count, row.total_value)
+        for row in InventorySummary.objects.exclude(asset_count=0)
+    }
+
+
+# ================================================================
+# 庫存彙總的增量更新
+# ================================================================
+@override_settings(IMPORT_IN_BACKGROUND=False)
+class InventorySummaryDeltaTests(TestCase):
+    def setUp(self):
+        self.it = Department.objects.create(name="資訊部")
+        self.hr = Department.objects.create(name="人事部")
+        self.person = CustomUser.objects.create_user("worker", "B100000001", "員工甲", department=self.it)
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.product = Product.objects.create(code="NB", name="筆電", price=100)
+        self.owned = Asset.objects.create(product=self.product, owner_user=self.person)
+        self.spare = Asset.objects.create(product=self.product)
+
+    def assertMatchesRebuild(self):
+        incremental = summary_rows()
+        rebuild_inventory_summary()
+        self.assertEqual(incremental, summary_rows())
+
+    def test_single_saves_update_summary(self):
+        self.assertEqual(summary_rows(), {
+            (self.product.pk, self.it.pk, InventorySummary.OUT): (1, 100),
+            (self.product.pk, None, InventorySummary.IN): (1, 100),
+        })
+        self.assertMatchesRebuild()
+
+    def test_single_save_applies_in_memory_delta(self):
+        asset = Asset.objects.get(pk=self.spare.pk)
+        asset.owner_user = self.person
+        with CaptureQueriesContext(connection) as queries:
+            asset.save()
+
+        sql = [q["sql"] for q in queries.captured_queries]
+        # 不重新彙總（沒有 SUM / COUNT），每個變動的 bucket 一次 UPDATE
+        self.assertFalse(any("SUM(" in q or "COUNT(" in q for q in sql))
+        self.assertEqual(sum(q.startswith('UPDATE "inventory_summary"') for q in sql), 2)
+        self.assertEqual(summary_rows(), {(self.product.pk, self.it.pk, InventorySummary.OUT): (2, 200)})
+        self.assertMatchesRebuild()
+
+    def test_save_without_bucket_change_skips_summary(self):
+        asset = Asset.objects.get(pk=self.owned.pk)
+        asset.asset_tag = "NB-900"
+        with CaptureQueriesContext(connection) as queries:
+            asset.save()
+
+        self.assertFalse(any("inventory_summary" in q["sql"] for q in queries.captured_queries))
+
+    def test_single_delete_and_product_change(self):
+        other = Product.objects.create(code="PC", name="桌機", price=300)
+        asset = Asset.objects.get(pk=self.owned.pk)
+        asset.product = other
+        asset.save()
+        Asset.objects.get(pk=self.spare.pk).delete()
+
+        self.assertEqual(summary_rows(), {(other.pk, self.it.pk, InventorySummary.OUT): (1, 300)})
+        self.assertMatchesRebuild()
+
+    def test_stock_batch_moves_assets_between_buckets(self):
+        apply_stock_transactions([
+            {"asset_tag": self.spare.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+            {"asset_tag": self.owned.asset_tag, "transaction_type": "IN"},
+            {"asset_tag": self.owned.asset_tag, "transaction_type": "OUT", "person_id": "B100000001"},
+        ])
+
+        self.assertEqual(summary_rows(), {(self.product.pk, self.it.pk, InventorySummary.OUT): (2, 200)})
+        self.assertMatchesRebuild()
+
+    def test_user_department_change_moves_owned_assets(self):
+        response = self.client.put(f"/api/users/{self.person.pk}/", {"department": self.hr.pk}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn((self.product.pk, self.hr.pk, InventorySummary.OUT), summary_rows())
+        self.assertMatchesRebuild()
+
+    def test_bulk_transfer_moves_owned_assets(self):
+        response = self.client.post("/api/users/batch/", {
+            "action": "transfer", "ids": [self.person.pk], "department_id": self.hr.pk,
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn((self.product.pk, self.hr.pk, InventorySummary.OUT), summary_rows())
+        self.assertMatchesRebuild()
+
+    def test_import_department_change_moves_owned_assets(self):
+        import_users([{
+            "id_number": "B100000001", "eip_account": "worker", "name": "員工甲", "department_name": "人事部",
+        }])
+
+        self.assertIn((self.product.pk, self.hr.pk, InventorySummary.OUT), summary_rows())
+        self.assertMatchesRebuild()
+
+    def test_lock_assets_pins_the_selected_rows(self):
+        # 以持有人篩選的 queryset 先鎖定並固定為 pk__in，之後新領用的資產不會被算進差異
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def record_lock(queryset, *args, **kwargs):
+            locked.append(queryset.model)
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, "select_for_update", autospec=True, side_effect=record_lock):
+            assets = lock_assets(Asset.objects.filter(owner_user=self.person))
+
+        with track_inventory(assets):
+            Asset.objects.filter(pk=self.spare.pk).update(owner_user=self.person)
+
+        self.assertEqual(locked, [Asset])
+        self.assertEqual(list(assets.values_list("pk", flat=True)), [self.owned.pk])
+        # spare 的變更不在鎖定範圍內，彙總不受影響
+        self.assertEqual(summary_rows()[(self.product.pk, None, InventorySummary.IN)], (1, 100))
+
+
+# ================================================================
+# 匯出（CSV / XLSX 串流）
+# ================================================================
+class ExportTests(TestCase):
+    def setUp(self):
+        department = Department.objects.create(name="資訊部")
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+        self.person = CustomUser.objects.create_user("worker", "B100000001", "員工甲", department=department)
+        CustomUser.objects.create_user("retired", "B100000002", "員工乙", is_active=False)
+        product = Product.objects.create(code="NB", name="筆電", type="電腦", price=100)
+        self.assets = [Asset.objects.create(product=product) for _ in range(4)]
+        apply_stock_transactions([
+            {"asset_tag": self.assets[0].asset_tag, "transaction_type": "OUT", "person_id": "B100000001", "remark": "領用"},
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, name, **params):
+        response = self.client.get(f"/api/reports/export/{name}/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        response.chunks = list(response.streaming_content)
+        return response, b"".join(response.chunks)
+
+    def csv_rows(self, content):
+        return list(csv.reader(io.StringIO(content.decode("utf-8-sig"))))
+
+    @mock.patch("reports.exports.ROWS_PER_YIELD", 2)
+    def test_assets_csv_streams_in_blocks_with_filters(self):
+        response, content = self.export("assets")
+        # 表頭 + 4 列，每 2 列一個區塊
+        self.assertEqual(len(response.chunks), 3)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertFalse(content.startswith(codecs.BOM_UTF8))
+
+        rows = self.csv_rows(content)
+        self.assertEqual(rows[0][:3], ["資產編號", "產品代碼", "名稱"])
+        self.assertEqual([row[0] for row in rows[1:]], [asset.asset_tag for asset in self.assets])
+        self.assertEqual(rows[1][5:], ["員工甲", "B100000001", "資訊部"])
+
+        _, content = self.export("assets", status="out", bom="true")
+        self.assertTrue(content.startswith(codecs.BOM_UTF8))
+        self.assertEqual([row[0] for row in self.csv_rows(content)[1:]], [self.assets[0].asset_tag])
+
+    def test_users_csv_uses_list_filters(self):
+        _, content = self.export("users", is_active="false")
+
+        self.assertEqual([(row[0], row[-1]) for row in self.csv_rows(content)[1:]], [("員工乙", "離職")])
+
+    def test_transactions_xlsx(self):
+        response, content = self.export("transactions", file_type="xlsx", transaction_type="OUT")
+
+        self.assertIn("spreadsheetml", response["Content-Type"])
+        sheet = load_workbook(io.BytesIO(content), read_only=True).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ("資產編號", "產品代碼", "類型", "日期", "備註"))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual((rows[1][0], rows[1][2], rows[1][4]), (self.assets[0].asset_tag, "OUT", "領用"))
+
+    def test_rejects_unknown_file_type(self):
+        response = self.client.get("/api/reports/export/assets/", {"file_type": "pdf"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+# ================================================================
+# 稽核紀錄（單筆 save）
+# ================================================================
+class AuditSignalTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(code="NB", name="筆電", price=100)
+
+    def test_reading_instances_runs_no_audit_work(self):
+        with mock.patch("reports.signals.stored_snapshot") as stored, self.assertNumQueries(1):
+            list(Product.objects.all())
+
+        stored.assert_not_called()
+
+    def test_update_records_only_changed_fields(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = 120
+        with mock.patch("reports.signals.record") as record:
+            product.save()
+
+        record.assert_called_once_with(
+            "inventory.product", [(product.pk, UPDATE, {"price": "100.00"}, {"price": "120.00"})],
+        )
+
+    def test_update_uses_values_captured_at_load(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.price = 120
+        with mock.patch("reports.signals.stored_snapshot") as stored, \
+                mock.patch("reports.signals.record") as record:
+            product.save()
+            product.price = 150
+            product.save()
+
+        stored.assert_not_called()
+        # 第二次儲存與第一次寫入的值比對
+        self.assertEqual(
+            [call.args[1][0][2:] for call in record.call_args_list],
+            [({"price": "100.00"}, {"price": "120.00"}), ({"price": "120.00"}, {"price": "150.00"})],
+        )
+
+    def test_instance_not_loaded_from_db_reads_stored_values(self):
+        product = Product(pk=self.product.pk, code="NB", name="筆電", price=130)
+        product._state.adding = False
+        with mock.patch("reports.signals.record") as record:
+            product.save()
+
+        self.assertEqual(record.call_args.args[1][0][2:], ({"price": "100.00"}, {"price": "130.00"}))
+
+    def test_requests_do_not_flush_the_buffer(self):
+        # 事件由緩衝區依筆數 / 間隔跨請求批次寫入
+        with mock.patch("reports.audit.audit_buffer.flush") as flush:
+            request_finished.send(sender=None)
+
+        flush.assert_not_called()
+
+    def test_update_fields_limits_the_comparison(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = "未儲存的名稱"
+        product.price = 120
+        with mock.patch("reports.signals.record") as record:
+            product.save(update_fields=["price"])
+
+        _, changes = record.call_args.args
+        self.assertEqual(changes[0][2:], ({"price": "100.00"}, {"price": "120.00"}))
+
+    def test_unchanged_save_and_create(self):
+        with mock.patch("reports.signals.record") as record:
+            Product.objects.get(pk=self.product.pk).save()
+            created = Product.objects.create(code="PC", name="桌機")
+
+        record.assert_called_once()
+        _, changes = record.call_args.args
+        self.assertEqual(changes[0][:2], (created.pk, CREATE))
+
+
+# ================================================================
+# 稽核紀錄（背景工作）
+# ================================================================
+class JobAuditActorTests(TestCase):
+    def test_job_changes_are_attributed_to_the_job_creator(self):
+        admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+        job = enqueue("audit_test", user=admin)
+
+        def handler(job, progress):
+            Product.objects.create(code="NB", name="筆電")
+            return {}
+
+        with mock.patch.dict("system.jobs._handlers", {"audit_test": handler}), \
+                mock.patch("reports.audit.audit_buffer.add") as add:
+            with self.captureOnCommitCallbacks(execute=True):
+                Worker(name="test").execute(job)
+
+        events = add.call_args.args[0]
+        self.assertEqual([(event.entity, event.actor_id) for event in events], [("inventory.product", admin.pk)])
+        # 工作結束後不再沿用
+        self.assertIsNone(current_actor_id())
+
+
+# ================================================================
+# 稽核紀錄查詢
+# ================================================================
+class AuditEventsApiTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_pages_through_events_with_identical_timestamps_by_keyset(self):
+        # 大量匯入的事件時間相同，分頁仍需完整且不重複，不退回 OFFSET
+        occurred_at = timezone.now()
+        AuditEvent.objects.bulk_create(
+            AuditEvent(entity="inventory.asset", entity_id=str(i), action="create", occurred_at=occurred_at)
+            for i in range(120)
+        )
+
+        ids = []
+        url = "/api/reports/audit/?entity=inventory.asset&page_size=50"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any("OFFSET" in q["sql"] for q in queries.captured_queries))
+            ids.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(ids, sorted(AuditEvent.objects.values_list("id", flat=True), reverse=True))
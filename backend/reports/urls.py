@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('inventory-summary/', views.inventory_summary, name='inventory_summary'),  # GET
+    path('export/assets/', views.export_assets, name='export_assets'),
+    path('export/users/', views.export_users, name='export_users'),
+    path('export/transactions/', views.export_transactions, name='export_transactions'),
+    path('audit/', views.audit_events, name='audit_events'),  # GET
+]
@@ -1,3 +1,178 @@
-from django.shortcuts import render
+from django.db.models import F, Sum
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+from users.authentication import ClaimJWTAuthentication
+from inventory.filters import filter_assets, filter_transactions
+from users.filters import filter_users, parse_bool
+from .exports import CSV, EXPORT_CHUNK_SIZE, EXPORT_FILE_TYPES, export_response
+from .filters import filter_audit_events
+from .models import InventorySummary
+from .pagination import AuditEventCursorPagination
 
-# Create your views here.
+# group_by 參數 → 彙總欄位
+SUMMARY_GROUPS = {
+    "product": ["product_id", "product__code", "product__name"],
+    "type": ["product__type"],
+    "department": ["department_id", "department__name"],
+    "status": ["status"],
+}
+
+
+# ================================================================
+# 庫存彙總報表
+# ================================================================
+@api_view(['GET'])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def inventory_summary(request):
+    """
+    讀取預先彙總的庫存表（產品 × 部門 × 狀態）
+    - 篩選：product_code、type、department_id（none = 無部門）、status（IN / OUT）
+    - group_by：product、type、department、status，可用逗號組合；未指定時回傳明細列
+    """
+    params = request.query_params
+    rows = InventorySummary.objects.filter(asset_count__gt=0)
+
+    if params.get("product_code"):
+        rows = rows.filter(product__code=params["product_code"])
+    if params.get("type"):
+        rows = rows.filter(product__type=params["type"])
+    department_id = params.get("department_id")
+    if department_id == "none":
+        rows = rows.filter(department__isnull=True)
+    elif department_id:
+        rows = rows.filter(department_id=department_id)
+    if params.get("status"):
+        rows = rows.filter(status=params["status"].upper())
+
+    totals = rows.aggregate(asset_count=Sum("asset_count"), total_value=Sum("total_value"))
+    totals = {key: value or 0 for key, value in totals.items()}
+
+    group_by = [g for g in params.get("group_by", "").split(",") if g]
+    unknown = [g for g in group_by if g not in SUMMARY_GROUPS]
+    if unknown:
+        return Response({"error": f"無效的 group_by：{', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if group_by:
+        fields = [field for g in group_by for field in SUMMARY_GROUPS[g]]
+        results = list(
+            rows.values(*fields)
+            .annotate(asset_count=Sum("asset_count"), total_value=Sum("total_value"))
+            .order_by(*fields)
+        )
+    else:
+        results = list(
+            rows.annotate(
+                product_code=F("product__code"),
+                product_name=F("product__name"),
+                product_type=F("product__type"),
+                department_name=F("department__name"),
+            )
+            .values(
+                "product_id", "product_code", "product_name", "product_type",
+                "department_id", "department_name", "status", "asset_count", "total_value",
+            )
+            .order_by("product_code", "department_name", "status")
+        )
+
+    return Response({"totals": totals, "results": results}, status=status.HTTP_200_OK)
+
+
+# ================================================================
+# 匯出（CSV / XLSX 串流）
+# 共用參數：file_type=csv|xlsx、bom=true（Excel 用），其餘篩選條件同各列表 API
+# ================================================================
+def export_options(params):
+    file_type = (params.get("file_type") or CSV).lower()
+    if file_type not in EXPORT_FILE_TYPES:
+        raise ValueError(f"無效的 file_type：{file_type}")
+    return {"file_type": file_type, "bom": bool(parse_bool(params.get("bom")))}
+
+
+@api_view(['GET'])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def export_assets(request):
+    try:
+        options = export_options(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = (
+        filter_assets(request.query_params)
+        .order_by("id")
+        .values_list(
+            "asset_tag", "product__code", "product__name", "product__type", "product__price",
+            "owner_user__name", "owner_user__id_number", "owner_user__department__name",
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    header = ["資產編號", "產品代碼", "名稱", "種類", "價格", "持有人", "持有人身份證字號", "持有人部門"]
+    return export_response("assets", header, rows, **options)
+
+
+@api_view(['GET'])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def export_users(request):
+    try:
+        options = export_options(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = (
+        (name, id_number, email, phone, eip_account, department, title, "在職" if is_active else "離職")
+        for name, id_number, email, phone, eip_account, department, title, is_active in
+        filter_users(request.query_params)
+        .values_list("name", "id_number", "email", "phone", "eip_account", "department__name", "title", "is_active")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    header = ["姓名", "身份證字號", "信箱", "電話", "EIP帳號", "部門", "職稱", "狀態"]
+    return export_response("users", header, rows, **options)
+
+
+@api_view(['GET'])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def export_transactions(request):
+    try:
+        options = export_options(request.query_params)
+        transactions = filter_transactions(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = (
+        transactions
+        .order_by("-date", "-id")
+        .values_list("asset__asset_tag", "asset__product__code", "transaction_type", "date", "remark")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    header = ["資產編號", "產品代碼", "類型", "日期", "備註"]
+    return export_response("stock_transactions", header, rows, **options)
+
+
+# ================================================================
+# 稽核紀錄查詢
+# ================================================================
+@api_view(['GET'])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def audit_events(request):
+    """
+    篩選：entity、entity_id、actor、action、date_from / date_to
+    一律以 keyset 分頁回傳（cursor / page_size），由新到舊
+    """
+    try:
+        events = filter_audit_events(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    events = events.values(
+        "id", "entity", "entity_id", "action", "actor_id", "data_before", "data_after", "occurred_at",
+        actor_name=F("actor__name"),
+    )
+    paginator = AuditEventCursorPagination()
+    page = paginator.paginate_queryset(events, request)
+    return paginator.get_paginated_response(page)
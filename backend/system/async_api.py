@@ -0,0 +1,61 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from users.authentication import ClaimJWTAuthentication
+
+_renderer = JSONRenderer()
+
+
+def json_response(data, status=200):
+    """以 DRF 的 JSONRenderer 輸出，格式（日期、Decimal）與 sync view 相同"""
+    return HttpResponse(_renderer.render(data), status=status, content_type="application/json")
+
+
+def async_read_view(sync_view):
+    """
+    ASGI 下的讀取端點（async view）：
+    - GET 以 ClaimJWTAuthentication 的 async 路徑驗證，快照有效時不離開 event loop；
+      相當於 @authentication_classes([ClaimJWTAuthentication]) + @permission_classes([IsAuthenticated])
+    - 其他 method（寫入、OPTIONS、HEAD）交給原本的 sync DRF view 處理，行為不變
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != "GET":
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+            authenticator = ClaimJWTAuthentication()
+            try:
+                result = await authenticator.aauthenticate(request)
+                if result is None:
+                    raise NotAuthenticated()
+            except (AuthenticationFailed, NotAuthenticated) as exc:
+                detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+                response = json_response(detail, status=401)
+                response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+                return response
+
+            request.user, request.auth = result
+            return await view(request, *args, **kwargs)
+
+        # 與 @api_view 相同：以 token 驗證，不需要 CSRF
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
+
+
+async def paginate(paginator, queryset, request):
+    """
+    DRF paginator 的 async 包裝：分頁查詢（count / keyset）在 thread 中執行，
+    回傳 (該頁資料, 將資料包成分頁格式的函式)
+    """
+    drf_request = Request(request)
+    page = await sync_to_async(paginator.paginate_queryset)(queryset, drf_request)
+    return page, lambda data: paginator.get_paginated_response(data).data
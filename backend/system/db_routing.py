@@ -0,0 +1,239 @@
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger("equip_mgmt")
+
+# PostgreSQL 副本的複寫延遲（秒）；WAL 已全部套用時視為 0（閒置的副本不會被誤判為延遲）
+_PG_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() IS NULL OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", ())
+
+
+def sticky_cookie_name():
+    return getattr(settings, "REPLICA_STICKY_COOKIE", "db_primary_until")
+
+
+def sticky_header_name():
+    return getattr(settings, "REPLICA_STICKY_HEADER", "X-DB-Primary-Until")
+
+
+class _ReplicaPool:
+    """
+    副本健康狀態：
+    - 每個副本每 REPLICA_HEALTH_CHECK_INTERVAL 秒檢查一次（連線 + 複寫延遲），檢查之間讀記憶體
+    - 連不上或延遲超過 REPLICA_MAX_LAG 秒的副本暫時不使用；全部不可用時讀取改回主庫
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.healthy = {}
+        self.checked_at = {}
+        self.checking = set()
+        self.counter = itertools.count()
+
+    def interval(self):
+        return getattr(settings, "REPLICA_HEALTH_CHECK_INTERVAL", 5)
+
+    def choose(self):
+        """輪流選擇可用的副本；沒有可用副本時回傳 None"""
+        candidates = [alias for alias in replica_aliases() if self.is_healthy(alias)]
+        if not candidates:
+            return None
+        return candidates[next(self.counter) % len(candidates)]
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        if now - self.checked_at.get(alias, float("-inf")) < self.interval():
+            return self.healthy[alias]
+        with self.lock:
+            # 同一時間只由一個 thread 檢查，其他 thread 沿用上一次的結果
+            if alias in self.checking:
+                return self.healthy.get(alias, False)
+            self.checking.add(alias)
+        try:
+            healthy = self._check(alias)
+        finally:
+            with self.lock:
+                self.checking.discard(alias)
+        previous = self.healthy.get(alias)
+        self.healthy[alias] = healthy
+        self.checked_at[alias] = time.monotonic()
+        if previous is not None and previous != healthy:
+            if healthy:
+                logger.info("資料庫副本 %s 已恢復，讀取重新導向副本", alias)
+            else:
+                logger.warning("資料庫副本 %s 無法使用，讀取改回主庫", alias)
+        return healthy
+
+    def _check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    cursor.execute(_PG_REPLICA_LAG_SQL)
+                    lag = float(cursor.fetchone()[0] or 0)
+                else:
+                    cursor.execute("SELECT 1")
+                    lag = 0.0
+        except DatabaseError as e:
+            logger.warning("資料庫副本 %s 健康檢查失敗：%s", alias, e)
+            try:
+                connection.close()
+            except DatabaseError:
+                pass
+            return False
+        max_lag = getattr(settings, "REPLICA_MAX_LAG", 5)
+        if lag > max_lag:
+            logger.warning("資料庫副本 %s 複寫延遲 %.1f 秒，超過 %s 秒", alias, lag, max_lag)
+            return False
+        return True
+
+
+replicas = _ReplicaPool()
+
+
+class _RoutingState:
+    """單一請求的讀取路由狀態；同一個請求內的查詢固定使用同一個副本"""
+
+    __slots__ = ("read_replica", "alias", "wrote")
+
+    def __init__(self, read_replica):
+        self.read_replica = read_replica
+        self.alias = None
+        self.wrote = False
+
+
+# 只有 ReplicaRoutingMiddleware 處理中的 GET 請求會設定；管理指令、背景 thread 一律使用主庫
+_routing = contextvars.ContextVar("db_routing", default=None)
+
+
+class ReplicaRouter:
+    """
+    GET / HEAD 請求的查詢送往副本（DATABASE_REPLICAS），其餘一律使用主庫：
+    - 請求中一旦寫入，或正在主庫的交易中，之後的讀取都改用主庫
+    - 未設定副本或副本都不可用時等同只有 default
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.read_replica or state.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        if state.alias is None:
+            state.alias = replicas.choose() or DEFAULT_DB_ALIAS
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本與主庫是同一份資料
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本的 schema 由資料庫複寫同步
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    決定請求的查詢是否可以使用副本：
+    - GET / HEAD 使用副本，除非帶有 read-your-writes cookie 或 header
+    - 請求中有寫入時回應 REPLICA_STICKY_COOKIE 與 REPLICA_STICKY_HEADER，之後 REPLICA_STICKY_SECONDS 秒內
+      該用戶端的讀取都走主庫，不會讀到副本尚未同步的舊資料（視窗應大於 REPLICA_MAX_LAG）
+    - 跨來源的前端（frontend/src/api.js）不帶 cookie，由 axios interceptor 把 header 回傳
+    - 串流回應（匯出）在 middleware 結束後才查詢，逐段產生內容時套用同樣的路由
+    同時支援 WSGI（sync）與 ASGI（async）
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.routing_state(request)
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = self.routing_state(request)
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, state)
+
+    def routing_state(self, request):
+        if request.method not in ("GET", "HEAD") or not replica_aliases():
+            return _RoutingState(read_replica=False)
+        return _RoutingState(read_replica=not self.is_sticky(request))
+
+    def is_sticky(self, request):
+        value = request.headers.get(sticky_header_name()) or request.COOKIES.get(sticky_cookie_name())
+        try:
+            return value is not None and float(value) > time.time()
+        except ValueError:
+            return False
+
+    def finish(self, response, state):
+        if state.wrote and replica_aliases():
+            window = getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+            until = str(int(time.time() + window))
+            response[sticky_header_name()] = until
+            response.set_cookie(
+                sticky_cookie_name(),
+                until,
+                max_age=window,
+                httponly=True,
+                secure=settings.SESSION_COOKIE_SECURE,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        elif state.read_replica and response.streaming and not response.is_async:
+            response.streaming_content = _route_chunks(state, response.streaming_content)
+        return response
+
+
+def _route_chunks(state, chunks):
+    # 每段內容各自設定 / 還原 ContextVar，ASGI 在不同 thread 逐段取用時也不會出錯
+    iterator = iter(chunks)
+    while True:
+        token = _routing.set(state)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _routing.reset(token)
+        yield chunk
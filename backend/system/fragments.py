@@ -0,0 +1,110 @@
+import copy
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+
+
+class FragmentCache:
+    """
+    行程內的序列化結果快取（LRU）：
+    - key 為 (serializer, pk, 資料列版本)，版本由序列化時用到的欄位值組成，
+      資料列一變更就會對應到新的 key，舊結果不會被誤用
+    - save / delete signal 與 bulk 操作呼叫 evict() 釋放舊版本佔用的空間
+    - 筆數超過 FRAGMENT_CACHE_MAX_ENTRIES 時淘汰最久未使用的項目
+    - 快取中的結果不交給呼叫端，一律回傳深層複本（巢狀的產品 / 持有人也是獨立的 dict）
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # (model, pk) → {serializer: 目前快取中的版本}，供 evict 與替換舊版本使用
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def max_entries(self):
+        return getattr(settings, "FRAGMENT_CACHE_MAX_ENTRIES", 20000)
+
+    def get_or_build(self, serializer_class, instance, version, build):
+        key = (serializer_class, instance.pk, version)
+        with self.lock:
+            fragment = self.entries.get(key)
+            if fragment is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                # 呼叫端修改回傳值（包含巢狀欄位）不會影響快取
+                return copy.deepcopy(fragment)
+            self.misses += 1
+
+        fragment = build()
+        with self.lock:
+            current = self.versions.setdefault((type(instance), instance.pk), {})
+            old = current.get(serializer_class)
+            if old is not None and old != version:
+                self.entries.pop((serializer_class, instance.pk, old), None)
+            current[serializer_class] = version
+            self.entries[key] = fragment
+            limit = self.max_entries()
+            while len(self.entries) > limit:
+                (old_class, old_pk, old_version), _ = self.entries.popitem(last=False)
+                self._forget(old_class, old_pk, old_version)
+        return copy.deepcopy(fragment)
+
+    def _forget(self, serializer_class, pk, version):
+        index_key = (serializer_class.Meta.model, pk)
+        current = self.versions.get(index_key)
+        if current is not None and current.get(serializer_class) == version:
+            del current[serializer_class]
+            if not current:
+                del self.versions[index_key]
+
+    def evict(self, model, pks):
+        with self.lock:
+            for pk in pks:
+                for serializer_class, version in self.versions.pop((model, pk), {}).items():
+                    self.entries.pop((serializer_class, pk, version), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+fragment_cache = FragmentCache()
+
+
+@lru_cache(maxsize=None)
+def _attnames(model):
+    return tuple(field.attname for field in model._meta.concrete_fields)
+
+
+def row_values(instance):
+    """資料列目前已載入的欄位值（不觸發延遲載入）"""
+    loaded = instance.__dict__
+    return tuple([loaded.get(name) for name in _attnames(type(instance))])
+
+
+class CachedRepresentationMixin:
+    """
+    ModelSerializer 的 to_representation 改為先查 fragment_cache
+    輸出若還依賴其他資料表（例如部門名稱），子類別需覆寫 fragment_version 將其納入版本
+    只用於讀取；帶 context 的序列化（例如依請求而不同的欄位）不可使用
+    """
+
+    def fragment_version(self, instance):
+        return row_values(instance)
+
+    def to_representation(self, instance):
+        if instance.pk is None:
+            return super().to_representation(instance)
+        return fragment_cache.get_or_build(
+            type(self),
+            instance,
+            self.fragment_version(instance),
+            lambda: super(CachedRepresentationMixin, self).to_representation(instance),
+        )
@@ -0,0 +1,187 @@
+import contextvars
+import logging
+import re
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger("equip_mgmt")
+
+# IN (%s, %s, ...) 長度不同時仍視為同一種查詢
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+def normalize_sql(sql):
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+# ================================================================
+# 查詢觀察者
+# 每個連線建立時掛上一個固定的 execute wrapper，依 ContextVar 找出目前請求的觀察者；
+# async view 透過 sync_to_async 在其他 thread 執行的查詢也會帶著同一個 context
+# ================================================================
+_query_observers = contextvars.ContextVar("query_observers", default=())
+
+
+def _observe_query(execute, sql, params, many, context):
+    observers = _query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        for observer in observers:
+            observer.record(sql, elapsed)
+
+
+def install_query_observer(sender, connection, **kwargs):
+    """connection_created 的 receiver"""
+    if _observe_query not in connection.execute_wrappers:
+        # 放在最前面，不影響 connection.execute_wrapper() 以 pop() 移除自己的 wrapper
+        connection.execute_wrappers.insert(0, _observe_query)
+
+
+@contextmanager
+def observe_queries(observer):
+    """區塊內（含其中的 async 呼叫）執行的查詢都會呼叫 observer.record(sql, 秒數)"""
+    token = _query_observers.set(_query_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        _query_observers.reset(token)
+
+
+class QueryRecorder:
+    """
+    累計查詢次數、SQL 時間，以及每個 SQL 的執行次數
+    （SQL 字串本身已是參數化的形式，直接作為 key）
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+
+    def record(self, sql, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        stat = self.statements.get(sql)
+        if stat is None:
+            self.statements[sql] = [1, elapsed]
+        else:
+            stat[0] += 1
+            stat[1] += elapsed
+
+    def repeated(self, limit=5):
+        """依正規化後的 SQL 合併，回傳執行次數最多的 [(sql, 次數, 秒數), ...]"""
+        merged = {}
+        for sql, (count, duration) in self.statements.items():
+            stat = merged.setdefault(normalize_sql(sql), [0, 0.0])
+            stat[0] += count
+            stat[1] += duration
+        ranked = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)
+        return [(sql, count, duration) for sql, (count, duration) in ranked[:limit]]
+
+
+class RequestTimingMiddleware:
+    """
+    記錄每個請求的查詢次數、SQL 時間、view 時間與回應序列化（render）時間：
+    - 以 Server-Timing header 回傳，可在瀏覽器開發者工具查看
+    - 超過 SLOW_REQUEST_MS 的請求，或同一個 SQL 重複 REPEATED_QUERY_THRESHOLD 次以上（疑似 N+1），
+      連同最常重複的 SQL 記錄到 equip_mgmt logger
+    REQUEST_TIMING_ENABLED = False 時不載入此 middleware，沒有任何額外成本
+    串流回應（匯出）在 middleware 結束後才讀取資料庫，不列入統計
+    同時支援 WSGI（sync）與 ASGI（async）
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_TIMING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "SLOW_REQUEST_MS", 500)
+        self.repeat_threshold = getattr(settings, "REPEATED_QUERY_THRESHOLD", 10)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        request._timing_marks = {}
+        start = time.perf_counter()
+        with observe_queries(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        request._timing_marks = {}
+        start = time.perf_counter()
+        with observe_queries(recorder):
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        end = time.perf_counter()
+
+        marks = request._timing_marks
+        view_start = marks.get("view_start", start)
+        view_end = marks.get("view_end", end)
+        timings = {
+            "total": end - start,
+            "view": view_end - view_start,
+            "serialize": end - view_end,
+            "db": recorder.duration,
+        }
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={timings["db"] * 1000:.1f};desc="{recorder.count} queries"',
+            f'view;dur={timings["view"] * 1000:.1f}',
+            f'serialize;dur={timings["serialize"] * 1000:.1f}',
+            f'total;dur={timings["total"] * 1000:.1f}',
+        ])
+        self.log(request, response, recorder, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_marks["view_start"] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF Response 在此之後才 render（JSON 編碼）
+        request._timing_marks["view_end"] = time.perf_counter()
+        return response
+
+    def log(self, request, response, recorder, timings):
+        total_ms = timings["total"] * 1000
+        repeated = recorder.repeated()
+        suspect_n_plus_one = repeated and repeated[0][1] >= self.repeat_threshold
+        if total_ms < self.slow_ms and not suspect_n_plus_one:
+            return
+
+        match = request.resolver_match
+        lines = [
+            "%s %s (%s) → %s：%.1fms，%d queries / SQL %.1fms，view %.1fms，serialize %.1fms" % (
+                request.method,
+                request.path,
+                match.view_name if match else "-",
+                response.status_code,
+                total_ms,
+                recorder.count,
+                timings["db"] * 1000,
+                timings["view"] * 1000,
+                timings["serialize"] * 1000,
+            )
+        ]
+        for sql, count, duration in repeated:
+            if count > 1:
+                lines.append("  ×%d（%.1fms）%s" % (count, duration * 1000, sql[:300]))
+        label = "慢請求" if total_ms >= self.slow_ms else "疑似 N+1 查詢"
+        logger.warning("%s：%s", label, "\n".join(lines))
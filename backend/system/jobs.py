@@ -0,0 +1,231 @@
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger("equip_mgmt")
+
+# 每個工作結束後送出；需要在工作之間收尾的功能（例如稽核紀錄）可連接此 signal
+job_finished = Signal()
+
+# 工作類型 → handler(job, progress)，由各 app 的 jobs.py 以 @job_handler 註冊
+_handlers = {}
+# 工作類型 → cleanup(payload)：工作最終失敗時刪除 payload 指向的暫存資料（例如上傳檔案）
+_cleanups = {}
+
+# Worker.execute 執行中的工作；worker 沒有 request，需要操作者的功能（例如稽核紀錄）改用 job.created_by
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def current_job():
+    return _current_job.get()
+
+
+def job_handler(kind, cleanup=None):
+    """註冊工作類型的處理函式；handler 回傳的 dict 存入 Job.result"""
+
+    def decorator(func):
+        _handlers[kind] = func
+        if cleanup is not None:
+            _cleanups[kind] = cleanup
+        return func
+
+    return decorator
+
+
+def enqueue(kind, payload=None, user=None, rows_total=None):
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        created_by_id=getattr(user, "pk", None),
+        rows_total=rows_total,
+    )
+
+
+def job_data(job):
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "rows_total": job.rows_total,
+        "rows_done": job.rows_done,
+        "error_count": job.error_count,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class JobProgress:
+    """
+    handler 回報進度：update() 直接寫入 Job 資料列
+    在 transaction 外呼叫時立即可見；在 chunk 的 transaction 內呼叫時（checkpoint），與該 chunk 的資料一起 commit。
+    transaction 內的 update() 會持有 Job 資料列的鎖到 commit 為止（heartbeat 也需等待），
+    只應在短的 chunk transaction 內呼叫，不可在整個匯入的 transaction 內逐步回報
+    """
+
+    def __init__(self, job):
+        self.job = job
+
+    def update(self, **fields):
+        fields["heartbeat_at"] = timezone.now()
+        Job.objects.filter(pk=self.job.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self.job, name, value)
+
+
+# ================================================================
+# 佇列
+# ================================================================
+def claim_job(worker_name):
+    """
+    依建立順序領取一個等待中的工作
+    以 status 為條件的 UPDATE 領取，多個 worker 同時領取同一筆時只有一個會成功
+    """
+    candidates = list(
+        Job.objects.filter(status=Job.QUEUED).order_by("id").values_list("id", flat=True)[:10]
+    )
+    for job_id in candidates:
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            worker=worker_name,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def fail_job(job, error, **conditions):
+    """
+    標記工作失敗（不再重試）：清空 payload（例如人員匯入的完整資料），並呼叫該類型的 cleanup 刪除暫存資料
+    conditions 為 UPDATE 的額外條件；回傳是否有更新
+    """
+    updated = Job.objects.filter(pk=job.pk, **conditions).update(
+        status=Job.FAILED, error=error, payload={}, finished_at=timezone.now(),
+    )
+    cleanup = _cleanups.get(job.kind)
+    if updated and cleanup is not None and job.payload:
+        try:
+            cleanup(job.payload)
+        except Exception:
+            logger.exception("背景工作 %s 的暫存資料清除失敗", job)
+    return bool(updated)
+
+
+def requeue_stale_jobs():
+    """
+    heartbeat 超過 JOB_STALE_AFTER 秒未更新的執行中工作（worker 已中止）放回佇列，
+    由下一個 worker 接手（依 handler 的 checkpoint 繼續或重新執行）；中斷超過 JOB_MAX_ATTEMPTS 次則標記失敗
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=getattr(settings, "JOB_STALE_AFTER", 60))
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=stale_before)
+    max_attempts = getattr(settings, "JOB_MAX_ATTEMPTS", 3)
+    failed = 0
+    for job in stale.filter(attempts__gte=max_attempts):
+        # 以 status / heartbeat 為條件：期間被其他 worker 處理過的工作不重複標記
+        failed += fail_job(
+            job, "worker 多次中斷，工作已停止", status=Job.RUNNING, heartbeat_at__lt=stale_before,
+        )
+    requeued = stale.filter(attempts__lt=max_attempts).update(status=Job.QUEUED, worker="")
+    if failed or requeued:
+        logger.warning("背景工作：%d 個中斷的工作重新排入佇列，%d 個標記失敗", requeued, failed)
+    return requeued
+
+
+class _Heartbeat(threading.Thread):
+    """執行期間定期更新 heartbeat_at，讓其他 worker 知道工作仍在進行"""
+
+    def __init__(self, job_id):
+        super().__init__(name=f"job-heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        interval = getattr(settings, "JOB_HEARTBEAT_INTERVAL", 10)
+        try:
+            while not self.stopped.wait(interval):
+                try:
+                    Job.objects.filter(pk=self.job_id, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+                except DatabaseError as e:
+                    logger.warning("背景工作 #%s heartbeat 更新失敗：%s", self.job_id, e)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Worker:
+    """
+    單一行程的 worker：輪詢佇列、執行工作並記錄結果
+    stop() 後處理完目前的工作才結束；行程被強制終止時，工作由其他 worker 依 heartbeat 逾時接手
+    """
+
+    def __init__(self, name=None):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self, once=False):
+        """once=True 時佇列清空即結束"""
+        poll_interval = getattr(settings, "JOB_POLL_INTERVAL", 1.0)
+        reclaim_interval = getattr(settings, "JOB_STALE_AFTER", 60) / 2
+        reclaimed_at = float("-inf")
+        while not self.stopping.is_set():
+            close_old_connections()
+            if time.monotonic() - reclaimed_at >= reclaim_interval:
+                requeue_stale_jobs()
+                reclaimed_at = time.monotonic()
+
+            job = claim_job(self.name)
+            if job is None:
+                if once:
+                    return
+                self.stopping.wait(poll_interval)
+                continue
+            self.execute(job)
+
+    def execute(self, job):
+        logger.info("背景工作 %s 開始（worker %s，第 %d 次）", job, self.name, job.attempts)
+        heartbeat = _Heartbeat(job.pk)
+        heartbeat.start()
+        token = _current_job.set(job)
+        try:
+            handler = _handlers.get(job.kind)
+            if handler is None:
+                raise LookupError(f"未知的工作類型：{job.kind}")
+            result = handler(job, JobProgress(job))
+        except Exception as e:
+            logger.exception("背景工作 %s 失敗", job)
+            fail_job(job, str(e))
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.SUCCEEDED, stage="", result=result, finished_at=timezone.now(),
+            )
+            logger.info("背景工作 %s 完成", job)
+        finally:
+            _current_job.reset(token)
+            heartbeat.stop()
+            job_finished.send(sender=Job, job=job)
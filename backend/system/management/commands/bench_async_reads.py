@@ -0,0 +1,187 @@
+import asyncio
+import math
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from departments.models import Department
+from inventory.models import Asset, StockTransaction
+from users.authentication import set_user_claims
+from users.models import CustomUser
+from users.tokens import RefreshToken
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(math.ceil(len(sorted_values) * pct / 100) - 1, 0)
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "比較 WSGI（sync view）與 ASGI（async view）讀取端點在並行負載下的每秒請求數與延遲分布。"
+        "未指定 --wsgi-url / --asgi-url 時在本行程內以 Django 的 WSGI / ASGI handler 執行；"
+        "要比較實際部署，請分別啟動 gunicorn（backend.wsgi）與 uvicorn（backend.asgi）後以 URL 指定"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", default=None, help="以此 EIP 帳號簽發 token（預設第一位啟用中的人員）")
+        parser.add_argument("--requests", type=int, default=300, help="每個端點、每種模式的請求數")
+        parser.add_argument("--concurrency", type=int, default=32, help="同時進行的請求數")
+        parser.add_argument("--path", action="append", dest="paths", help="要測試的路徑（可重複指定，預設為主要讀取端點）")
+        parser.add_argument("--wsgi-url", default=None, help="WSGI 部署的網址，例如 http://127.0.0.1:8000")
+        parser.add_argument("--asgi-url", default=None, help="ASGI 部署的網址，例如 http://127.0.0.1:8001")
+
+    def handle(self, *args, **options):
+        total = options["requests"]
+        concurrency = options["concurrency"]
+        if total <= 0 or concurrency <= 0:
+            raise CommandError("--requests 與 --concurrency 必須大於 0")
+        if bool(options["wsgi_url"]) != bool(options["asgi_url"]):
+            raise CommandError("--wsgi-url 與 --asgi-url 需同時指定")
+
+        users = CustomUser.objects.filter(is_active=True).order_by("id")
+        user = users.filter(eip_account=options["user"]).first() if options["user"] else users.first()
+        if user is None:
+            raise CommandError("找不到可用的人員")
+        token = str(set_user_claims(RefreshToken.for_user(user), user).access_token)
+        paths = options["paths"] or self.default_paths()
+
+        if options["wsgi_url"]:
+            runners = [
+                ("wsgi", lambda path, count: self.run_http(options["wsgi_url"], path, token, count, concurrency)),
+                ("asgi", lambda path, count: self.run_http(options["asgi_url"], path, token, count, concurrency)),
+            ]
+        else:
+            runners = [
+                ("wsgi", lambda path, count: self.run_wsgi(path, token, count, concurrency)),
+                ("asgi", lambda path, count: asyncio.run(self.run_asgi(path, token, count, concurrency))),
+            ]
+
+        # 本行程內的 Client / AsyncClient 以 testserver 為 Host，需加入 ALLOWED_HOSTS，否則全部回 400
+        hosts = settings.ALLOWED_HOSTS if options["wsgi_url"] else [*settings.ALLOWED_HOSTS, "testserver"]
+        failed = 0
+        self.stdout.write(f"{total} requests / endpoint, concurrency {concurrency}")
+        self.stdout.write(f"{'mode':<5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}  path")
+        with override_settings(ALLOWED_HOSTS=hosts):
+            for path in paths:
+                for mode, run in runners:
+                    # 預熱：載入 middleware、啟用人員快照與 fragment cache，不列入統計
+                    run(path, min(concurrency, total))
+                    elapsed, latencies, errors = run(path, total)
+                    failed += errors
+                    latencies.sort()
+                    self.stdout.write(
+                        f"{mode:<5} {len(latencies) / elapsed:>8.1f} "
+                        f"{percentile(latencies, 50) * 1000:>8.1f} "
+                        f"{percentile(latencies, 95) * 1000:>8.1f} "
+                        f"{percentile(latencies, 99) * 1000:>8.1f} "
+                        f"{errors:>6}  {path}"
+                    )
+        # 錯誤回應通常比正常回應快得多，數字不具參考性
+        if failed:
+            raise CommandError(f"共有 {failed} 個請求未回傳 200，請確認路徑、token 與 ALLOWED_HOSTS 後再比較")
+
+    def default_paths(self):
+        paths = ["/api/inventory/assets/?page_size=50", "/api/users/?page=1", "/api/departments/"]
+        asset = Asset.objects.order_by("id").values("id", "asset_tag").first()
+        if asset:
+            paths.insert(1, f"/api/inventory/assets/{asset['id']}/")
+        transaction = StockTransaction.objects.filter(asset__isnull=False).values("asset__asset_tag").first()
+        if transaction:
+            paths.insert(2, f"/api/inventory/stock_history/{transaction['asset__asset_tag']}/")
+        if not Department.objects.exists():
+            paths.remove("/api/departments/")
+        return paths
+
+    # ------------------------------------------------------------
+    # 本行程內：WSGI handler（thread pool）
+    # ------------------------------------------------------------
+    def run_wsgi(self, path, token, total, concurrency):
+        def worker(count):
+            client = Client(HTTP_AUTHORIZATION=f"Bearer {token}")
+            latencies, errors = [], 0
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = client.get(path)
+                    latencies.append(time.perf_counter() - start)
+                    errors += response.status_code != 200
+            finally:
+                connections.close_all()
+            return latencies, errors
+
+        return self.run_threads(worker, total, concurrency)
+
+    # ------------------------------------------------------------
+    # 本行程內：ASGI handler（asyncio，backend.urls_async）
+    # ------------------------------------------------------------
+    async def run_asgi(self, path, token, total, concurrency):
+        async def worker(count):
+            client = AsyncClient()
+            headers = {"Authorization": f"Bearer {token}"}
+            latencies, errors = [], 0
+            for _ in range(count):
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+            return latencies, errors
+
+        with override_settings(ROOT_URLCONF="backend.urls_async"):
+            start = time.perf_counter()
+            results = await asyncio.gather(*(worker(count) for count in self.split(total, concurrency)))
+            elapsed = time.perf_counter() - start
+        return self.merge(elapsed, results)
+
+    # ------------------------------------------------------------
+    # 實際部署：HTTP
+    # ------------------------------------------------------------
+    def run_http(self, base_url, path, token, total, concurrency):
+        url = base_url.rstrip("/") + path
+
+        def worker(count):
+            latencies, errors = [], 0
+            for _ in range(count):
+                request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+                start = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        response.read()
+                        failed = response.status != 200
+                except (urllib.error.URLError, OSError):
+                    failed = True
+                latencies.append(time.perf_counter() - start)
+                errors += failed
+            return latencies, errors
+
+        return self.run_threads(worker, total, concurrency)
+
+    # ------------------------------------------------------------
+    def run_threads(self, worker, total, concurrency):
+        counts = self.split(total, concurrency)
+        with ThreadPoolExecutor(max_workers=len(counts)) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(worker, counts))
+            elapsed = time.perf_counter() - start
+        return self.merge(elapsed, results)
+
+    @staticmethod
+    def split(total, concurrency):
+        workers = min(total, concurrency)
+        return [total // workers + (1 if i < total % workers else 0) for i in range(workers)]
+
+    @staticmethod
+    def merge(elapsed, results):
+        latencies, errors = [], 0
+        for worker_latencies, worker_errors in results:
+            latencies.extend(worker_latencies)
+            errors += worker_errors
+        return elapsed, latencies, errors
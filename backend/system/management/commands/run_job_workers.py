@@ -0,0 +1,68 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.module_loading import autodiscover_modules
+
+from system.jobs import Worker
+from system.metrics import registry
+
+
+def run_worker(once):
+    worker = Worker()
+    # SIGTERM / Ctrl-C：處理完目前的工作後結束
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    try:
+        worker.run(once=once)
+    finally:
+        # fork 出的行程以 os._exit 結束，不會執行 atexit
+        registry.dump(force=True)
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "啟動背景工作 worker（匯入等）；多個行程平行領取佇列中的工作"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=None,
+            help="worker 行程數（預設 JOB_WORKER_PROCESSES）",
+        )
+        parser.add_argument("--once", action="store_true", help="佇列清空後即結束")
+
+    def handle(self, *args, **options):
+        processes = options["processes"] or getattr(settings, "JOB_WORKER_PROCESSES", 2)
+        if processes <= 0:
+            raise CommandError("--processes 必須大於 0")
+
+        # 載入各 app 的 jobs.py，註冊工作類型
+        autodiscover_modules("jobs")
+
+        if processes == 1:
+            run_worker(options["once"])
+            return
+
+        # fork 前關閉連線，子行程各自建立自己的資料庫連線
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=run_worker, args=(options["once"],), name=f"job-worker-{i}")
+            for i in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        self.stdout.write(f"started {processes} job workers")
+
+        def forward(signum, frame):
+            for process in workers:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for process in workers:
+            process.join()
+        self.stdout.write(self.style.SUCCESS("job workers stopped"))
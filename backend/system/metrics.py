@@ -0,0 +1,355 @@
+import atexit
+import json
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .instrumentation import observe_queries
+
+# 秒
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 每個請求的查詢次數
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, amount=1, **labels):
+        self.registry.inc(self, self._key(labels), amount)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        self.registry.observe(self, self._key(labels), value)
+
+
+class MetricsRegistry:
+    """
+    行程內的 metrics：
+    - 計數與 histogram 都只在記憶體中累加（一次 dict 查詢 + 加法）
+    - 設定 METRICS_DIR 時，每 METRICS_DUMP_INTERVAL 秒將本行程的累計值寫入
+      <METRICS_DIR>/metrics_<host>_<pid>_<隨機碼>.json（暫存檔 + os.replace，讀取端不會看到寫到一半的檔案）；
+      隨機碼讓重啟後沿用同一 pid 的 worker 不會覆寫舊 worker 的累計值
+    - /api/system/metrics 讀取目錄內所有 worker 的檔案加總後輸出；
+      已結束的 worker（同一台主機上 pid 已不存在）的檔案併入 metrics_exited.json 後刪除，
+      計數不會因 worker 重啟而倒退，檔案也不會無限增加
+    """
+
+    EXITED_FILE = "metrics_exited.json"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.values = {}
+        self.dumped_at = 0.0
+        self.pid = os.getpid()
+        self.process_id = _new_process_id()
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(self, name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, help_text, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    # ------------------------------------------------------------
+    # 累加
+    # ------------------------------------------------------------
+    def inc(self, metric, key, amount):
+        with self.lock:
+            self.values[(metric.name, key)] = self.values.get((metric.name, key), 0) + amount
+
+    def observe(self, metric, key, value):
+        with self.lock:
+            state = self.values.get((metric.name, key))
+            if state is None:
+                # [各 bucket 計數..., sum, count]
+                state = self.values[(metric.name, key)] = [0] * len(metric.buckets) + [0.0, 0]
+            for i, bound in enumerate(metric.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    # ------------------------------------------------------------
+    # 跨 worker 共用
+    # ------------------------------------------------------------
+    def directory(self):
+        path = getattr(settings, "METRICS_DIR", None)
+        return Path(path) if path else None
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                [name, list(key), list(value) if isinstance(value, list) else value]
+                for (name, key), value in self.values.items()
+            ]
+
+    def _check_fork(self):
+        # fork 出的子行程（例如 gunicorn preload）使用新的識別碼，不沿用父行程的累計值
+        if os.getpid() != self.pid:
+            with self.lock:
+                if os.getpid() != self.pid:
+                    self.pid = os.getpid()
+                    self.process_id = _new_process_id()
+                    self.values = {}
+
+    def dump(self, force=False):
+        directory = self.directory()
+        if directory is None:
+            return
+        self._check_fork()
+        now = time.monotonic()
+        if not force and now - self.dumped_at < getattr(settings, "METRICS_DUMP_INTERVAL", 5):
+            return
+        self.dumped_at = now
+        directory.mkdir(parents=True, exist_ok=True)
+        _write_json(directory / f"metrics_{self.process_id}.json", self.snapshot())
+
+    def collect(self):
+        """回傳 {(name, key): value}：有 METRICS_DIR 時為所有 worker 的加總"""
+        directory = self.directory()
+        if directory is None:
+            return _merge(self.snapshot(), self.metrics)
+
+        self.dump(force=True)
+        # 併入已結束 worker 與讀取都在同一把鎖內，讀取端不會看到只併了一半的狀態
+        with _directory_lock(directory):
+            self._fold_exited(directory)
+            rows = []
+            for path in directory.glob("metrics_*.json"):
+                rows.extend(_read_json(path))
+        return _merge(rows, self.metrics)
+
+    def _fold_exited(self, directory):
+        exited = [path for path in directory.glob("metrics_*.json") if _process_exited(path)]
+        if not exited:
+            return
+        target = directory / self.EXITED_FILE
+        rows = _read_json(target)
+        for path in exited:
+            rows.extend(_read_json(path))
+        merged = _merge(rows)
+        _write_json(target, [[name, list(key), value] for (name, key), value in merged.items()])
+        for path in exited:
+            path.unlink(missing_ok=True)
+
+    # ------------------------------------------------------------
+    # Prometheus text format
+    # ------------------------------------------------------------
+    def render(self):
+        values = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for (metric_name, key), value in sorted(values.items()):
+                if metric_name != name:
+                    continue
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                # 累加時已是各 bucket 的累積計數（value <= le）
+                for bound, count in zip(metric.buckets, value):
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _new_process_id():
+    return f"{socket.gethostname()}_{os.getpid()}_{uuid.uuid4().hex[:12]}"
+
+
+def _process_exited(path):
+    """metrics_<host>_<pid>_<隨機碼>.json 的 worker 是否已結束；只判斷本機的檔案，其他主機的一律視為仍在執行"""
+    prefix, _, _ = path.stem.rpartition("_")
+    host_part, _, pid = prefix.rpartition("_")
+    if not host_part.startswith("metrics_") or not pid.isdigit():
+        return False
+    if host_part[len("metrics_"):] != socket.gethostname():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def _read_json(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return []
+
+
+def _write_json(path, rows):
+    temp = path.with_name(f".{path.stem}.tmp")
+    temp.write_text(json.dumps(rows))
+    os.replace(temp, path)
+
+
+def _merge(rows, metrics=None):
+    merged = {}
+    for name, key, value in rows:
+        if metrics is not None and name not in metrics:
+            continue
+        slot = (name, tuple(key))
+        if isinstance(value, list):
+            current = merged.setdefault(slot, [0] * len(value))
+            for i, v in enumerate(value):
+                current[i] += v
+        else:
+            merged[slot] = merged.get(slot, 0) + value
+    return merged
+
+
+@contextmanager
+def _directory_lock(directory):
+    # 只有設定 METRICS_DIR（多個 gunicorn worker，Unix）時使用
+    import fcntl
+
+    with open(directory / ".metrics.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+atexit.register(registry.dump, force=True)
+
+http_requests_total = registry.counter(
+    "http_requests_total", "請求數", ("view", "method", "status"),
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "請求處理時間（秒）", ("view", "status"),
+)
+db_queries_per_request = registry.histogram(
+    "db_queries_per_request", "每個請求的查詢次數", ("view",), buckets=QUERY_COUNT_BUCKETS,
+)
+db_time_per_request_seconds = registry.histogram(
+    "db_time_per_request_seconds", "每個請求的 SQL 總時間（秒）", ("view",),
+)
+import_rows_total = registry.counter(
+    "import_rows_total", "匯入處理的資料列數", ("kind", "result"),
+)
+import_duration_seconds = registry.histogram(
+    "import_duration_seconds", "單次匯入的處理時間（秒）", ("kind",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+
+def record_import(kind, duration, **rows):
+    """匯入結束後呼叫：rows 為 result → 筆數，例如 created=10, failed=2"""
+    for result, count in rows.items():
+        if count:
+            import_rows_total.inc(count, kind=kind, result=result)
+    import_duration_seconds.observe(duration, kind=kind)
+    registry.dump()
+
+
+class _QueryCounter:
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def record(self, sql, elapsed):
+        self.count += 1
+        self.duration += elapsed
+
+
+class MetricsMiddleware:
+    """
+    每個請求依 URL name 與狀態碼記錄請求數、處理時間與查詢次數
+    METRICS_ENABLED = False 時不載入；同時支援 WSGI（sync）與 ASGI（async）
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries = _QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(queries):
+            response = self.get_response(request)
+        return self.finish(request, response, queries, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        queries = _QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(queries):
+            response = await self.get_response(request)
+        return self.finish(request, response, queries, time.perf_counter() - start)
+
+    def finish(self, request, response, queries, duration):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        status = str(response.status_code)
+        http_requests_total.inc(view=view, method=request.method, status=status)
+        http_request_duration_seconds.observe(duration, view=view, status=status)
+        db_queries_per_request.observe(queries.count, view=view)
+        db_time_per_request_seconds.observe(queries.duration, view=view)
+        registry.dump()
+        return response
@@ -1,4 +1,81 @@
-from django.db import models
+import threading
+import time
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class VersionStamp(models.Model):
+    """
+    跨 worker 共用的版本號：資料變更時 bump，各行程比對版本決定是否重新載入快取
+    """
+    key = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+    @staticmethod
+    def bump(key):
+        now = timezone.now()
+        with transaction.atomic(savepoint=False):
+            updated = VersionStamp.objects.filter(key=key).update(version=F("version") + 1, updated_at=now)
+            if not updated:
+                _, created = VersionStamp.objects.get_or_create(key=key, defaults={"version": 1, "updated_at": now})
+                if not created:
+                    VersionStamp.objects.filter(key=key).update(version=F("version") + 1, updated_at=now)
+
+    @staticmethod
+    def current(key):
+        return VersionStamp.objects.filter(key=key).values_list("version", flat=True).first() or 0
+
+
+SETTINGS_VERSION_KEY = "system_settings"
+
+
+class _SettingsSnapshot:
+    """
+    行程內的 SystemSetting 快照：
+    TTL 內直接讀記憶體；過期後只查一次版本號，版本變更才重新載入全部設定
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = None
+        self.version = None
+        self.checked_at = 0.0
+
+    def ttl(self):
+        return getattr(settings, "SYSTEM_SETTINGS_CACHE_TTL", 5)
+
+    def get(self, key):
+        # 先讀到區域變數：同一行程的 set_value() 可能隨時 invalidate（values 設為 None）
+        now = time.monotonic()
+        values = self.values
+        if values is None or now - self.checked_at >= self.ttl():
+            with self.lock:
+                if self.values is None or now - self.checked_at >= self.ttl():
+                    self._refresh()
+                    self.checked_at = time.monotonic()
+                values = self.values
+        return values.get(key)
+
+    def _refresh(self):
+        version = VersionStamp.current(SETTINGS_VERSION_KEY)
+        if self.values is None or version != self.version:
+            self.values = dict(SystemSetting.objects.values_list("key", "value"))
+            self.version = version
+
+    def invalidate(self):
+        with self.lock:
+            self.values = None
+
+
+settings_snapshot = _SettingsSnapshot()
+
 
 class SystemSetting(models.Model):
     key = models.CharField(max_length=100, unique=True)
@@ -9,15 +86,65 @@ class SystemSetting(models.Model):
 
     @staticmethod
     def get_value(key, default=None):
-        try:
-            setting = SystemSetting.objects.get(key=key)
-            return setting.value.lower() in ("true", "1", "yes")
-        except SystemSetting.DoesNotExist:
+        value = settings_snapshot.get(key)
+        if value is None:
             return default
+        return value.lower() in ("true", "1", "yes")
 
     @staticmethod
     def set_value(key, value):
-        setting, _ = SystemSetting.objects.update_or_create(
-            key=key, defaults={"value": str(value)}
-        )
+        with transaction.atomic():
+            setting, _ = SystemSetting.objects.update_or_create(
+                key=key, defaults={"value": str(value)}
+            )
+            VersionStamp.bump(SETTINGS_VERSION_KEY)
+        # 本行程立即生效，其他 worker 於 TTL 內看到新版本號後重新載入
+        settings_snapshot.invalidate()
         return setting
+
+
+class Job(models.Model):
+    """
+    背景工作（例如大量匯入）：API 建立後立即回應，由 run_job_workers 啟動的 worker 依建立順序領取執行
+    進度（stage / rows_done）在 transaction 外回報；handler 可將 checkpoint 存入 result 並與資料一起 commit，
+    worker 中斷後由下一個 worker 依 checkpoint 繼續（人員匯入），或整批 rollback 後重新執行（資產匯入）
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "等待中"),
+        (RUNNING, "執行中"),
+        (SUCCEEDED, "完成"),
+        (FAILED, "失敗"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    payload = models.JSONField(default=dict, blank=True)
+    # 目前階段（例如人員匯入的 hash / write），供前端顯示
+    stage = models.CharField(max_length=20, blank=True)
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    rows_done = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    result = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # worker 領取：WHERE status = 'queued' ORDER BY id
+            models.Index(fields=["status", "id"], name="job_status_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} {self.status}"
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+
+from departments.models import Department
+from inventory.models import Asset, Product
+from users.models import CustomUser
+from .fragments import fragment_cache
+from .versioning import touch_tables
+
+# ================================================================
+# 資料表版本號（條件式 GET 的 ETag / Last-Modified）與序列化快取的清除
+# bulk 操作不會觸發 signal，由各自的程式呼叫 touch_tables / fragment_cache.evict
+# ================================================================
+
+# 刪除時 SET_NULL 會以 UPDATE 改到的其他資料表
+# （資產的持有人、部門的主管；部門 API 以 fields='__all__' 輸出 manager）
+CASCADE_TABLES = {
+    CustomUser: (Asset, Department),
+    Department: (CustomUser,),
+}
+
+
+def table_post_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    # 登入只更新 last_login，不影響任何 API 輸出
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    touch_tables(sender)
+    fragment_cache.evict(sender, [instance.pk])
+
+
+def table_post_delete(sender, instance, **kwargs):
+    touch_tables(sender, *CASCADE_TABLES.get(sender, ()))
+    fragment_cache.evict(sender, [instance.pk])
+
+
+for _model in (Asset, Product, CustomUser, Department):
+    post_save.connect(table_post_save, sender=_model, dispatch_uid=f"table_post_save_{_model._meta.label_lower}")
+    post_delete.connect(table_post_delete, sender=_model, dispatch_uid=f"table_post_delete_{_model._meta.label_lower}")
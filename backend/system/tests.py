@@ -1,3 +1,385 @@
-from django.test import TestCase
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from departments.models import Department
+from inventory.jobs import enqueue_asset_import
+from inventory.models import Asset, Product
+from inventory.serializers import AssetSerializer
+from users.authentication import set_user_claims
+from users.models import CustomUser
+from users.tokens import RefreshToken
+from .db_routing import ReplicaRoutingMiddleware, _routing
+from .fragments import fragment_cache
+from .instrumentation import RequestTimingMiddleware
+from .jobs import Worker, enqueue, requeue_stale_jobs
+from .metrics import MetricsRegistry, _process_exited
+from .models import SETTINGS_VERSION_KEY, Job, SystemSetting, VersionStamp, settings_snapshot
+from .views import metrics_view
+
+
+# ================================================================
+# 資料表版本號
+# ================================================================
+class TableVersionSignalTests(TestCase):
+    def test_deleting_user_touches_tables_it_set_null_on(self):
+        manager = CustomUser.objects.create_user("manager", "A100000001", "主管")
+        Department.objects.create(name="資訊部", manager=manager)
+
+        with mock.patch("system.signals.touch_tables") as touch:
+            manager.delete()
+
+        touched = {model for call in touch.call_args_list for model in call.args}
+        self.assertLessEqual({CustomUser, Asset, Department}, touched)
+
+
+# ================================================================
+# SystemSetting 行程內快照
+# ================================================================
+@override_settings(SYSTEM_SETTINGS_CACHE_TTL=60)
+class SettingsSnapshotTests(TestCase):
+    KEY = "ENABLE_PRODUCT_DUPLICATE_CHECK"
+
+    def setUp(self):
+        settings_snapshot.invalidate()
+        self.addCleanup(settings_snapshot.invalidate)
+        SystemSetting.set_value(self.KEY, False)
+
+    def expire(self):
+        settings_snapshot.checked_at -= 61
+
+    def test_reads_within_ttl_do_not_query(self):
+        self.assertFalse(SystemSetting.get_value(self.KEY))
+        with self.assertNumQueries(0):
+            self.assertFalse(SystemSetting.get_value(self.KEY))
+            self.assertEqual(SystemSetting.get_value("MISSING", "x"), "x")
+
+    def test_other_worker_change_is_seen_after_version_bump(self):
+        self.assertFalse(SystemSetting.get_value(self.KEY))
+        # 其他 worker 的 set_value：寫入設定並 bump 版本號，本行程的快照未被 invalidate
+        SystemSetting.objects.filter(key=self.KEY).update(value="True")
+        VersionStamp.bump(SETTINGS_VERSION_KEY)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(SystemSetting.get_value(self.KEY))
+        self.expire()
+        with self.assertNumQueries(2):
+            self.assertTrue(SystemSetting.get_value(self.KEY))
+
+    def test_expired_snapshot_only_checks_version_when_unchanged(self):
+        SystemSetting.get_value(self.KEY)
+        self.expire()
+        with self.assertNumQueries(1):
+            self.assertFalse(SystemSetting.get_value(self.KEY))
+
+    def test_set_value_takes_effect_immediately_in_this_process(self):
+        self.assertFalse(SystemSetting.get_value(self.KEY))
+        SystemSetting.set_value(self.KEY, True)
+        self.assertTrue(SystemSetting.get_value(self.KEY))
+
+
+# ================================================================
+# /api/system/metrics 存取限制
+# ================================================================
+class MetricsAccessTests(TestCase):
+    def get(self, **meta):
+        return metrics_view(RequestFactory().get("/api/system/metrics", **meta))
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_allowlist_rejects_proxied_requests(self):
+        self.assertEqual(self.get(REMOTE_ADDR="127.0.0.1").status_code, 200)
+        self.assertEqual(self.get(REMOTE_ADDR="10.0.0.5").status_code, 403)
+        # 本機反向代理轉發的外部請求
+        self.assertEqual(self.get(REMOTE_ADDR="127.0.0.1", HTTP_X_FORWARDED_FOR="203.0.113.7").status_code, 403)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.get(REMOTE_ADDR="127.0.0.1").status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        response = self.get(HTTP_AUTHORIZATION="Bearer s3cret", HTTP_X_FORWARDED_FOR="203.0.113.7")
+        self.assertEqual(response.status_code, 200)
+
+
+# ================================================================
+# 序列化結果快取
+# ================================================================
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        fragment_cache.clear()
+        self.addCleanup(fragment_cache.clear)
+        department = Department.objects.create(name="資訊部")
+        self.owner = CustomUser.objects.create_user("owner", "A100000001", "持有人", department=department)
+        self.product = Product.objects.create(code="NB", name="筆電", type="電腦", price=100)
+        self.asset = Asset.objects.create(product=self.product, owner_user=self.owner)
+
+    def serialize(self):
+        asset = Asset.objects.select_related("product", "owner_user__department").get(pk=self.asset.pk)
+        return AssetSerializer(asset).data
+
+    def test_hit_returns_independent_copy(self):
+        first = self.serialize()
+        misses = fragment_cache.misses
+        first["product"]["name"] = "改過"
+        first["owner_user"]["department_name"] = "改過"
+
+        second = self.serialize()
+        # 資產、產品、持有人全部命中
+        self.assertEqual(fragment_cache.misses, misses)
+        self.assertEqual(second["product"]["name"], "筆電")
+        self.assertEqual(second["owner_user"]["department_name"], "資訊部")
+
+    def test_updates_without_signals_produce_new_fragments(self):
+        self.serialize()
+        Product.objects.filter(pk=self.product.pk).update(name="桌機")
+        self.owner.name = "新持有人"
+        CustomUser.objects.bulk_update([self.owner], ["name"])
+        Department.objects.filter(pk=self.owner.department_id).update(name="總務部")
+
+        data = self.serialize()
+        self.assertEqual(data["product"]["name"], "桌機")
+        self.assertEqual(data["owner_user"]["name"], "新持有人")
+        self.assertEqual(data["owner_user"]["department_name"], "總務部")
+
+
+# ================================================================
+# 請求計時與 N+1 偵測
+# ================================================================
+@override_settings(REQUEST_TIMING_ENABLED=True, SLOW_REQUEST_MS=10_000, REPEATED_QUERY_THRESHOLD=5)
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+
+    def run_view(self, view):
+        return RequestTimingMiddleware(lambda request: view())(RequestFactory().get("/api/test"))
+
+    def test_server_timing_reports_query_count(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/api/users/", {"page_size": 5})
+
+        timing = response["Server-Timing"]
+        self.assertIn(f'desc="{len(queries.captured_queries)} queries"', timing)
+        for name in ("db", "view", "serialize", "total"):
+            self.assertRegex(timing, rf"{name};dur=\d+\.\d")
+
+    def test_repeated_statements_are_logged_as_n_plus_one(self):
+        def view():
+            for pk in range(6):
+                CustomUser.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        with self.assertLogs("equip_mgmt", "WARNING") as logs:
+            response = self.run_view(view)
+
+        self.assertIn('desc="6 queries"', response["Server-Timing"])
+        self.assertIn("疑似 N+1 查詢", logs.output[0])
+        self.assertIn("×6", logs.output[0])
+
+    def test_fast_request_without_repeats_is_not_logged(self):
+        def view():
+            CustomUser.objects.exists()
+            return HttpResponse()
+
+        with mock.patch("system.instrumentation.logger") as logger:
+            self.run_view(view)
+        logger.warning.assert_not_called()
+
+    @override_settings(REQUEST_TIMING_ENABLED=False)
+    def test_disabled_middleware_is_not_loaded(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestTimingMiddleware(lambda request: HttpResponse())
+
+
+# ================================================================
+# ASGI 的 async 讀取端點
+# ================================================================
+@override_settings(ROOT_URLCONF="backend.urls_async")
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        department = Department.objects.create(name="資訊部")
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員", department=department)
+        product = Product.objects.create(code="NB", name="筆電", type="電腦", price=100)
+        self.asset = Asset.objects.create(product=product, owner_user=self.admin)
+        token = set_user_claims(RefreshToken.for_user(self.admin), self.admin).access_token
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def sync_responses(self, urls):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with override_settings(ROOT_URLCONF="backend.urls"):
+            return {url: json.loads(client.get(url).content) for url in urls}
+
+    async def test_async_reads_match_sync_responses(self):
+        urls = (
+            "/api/inventory/assets/",
+            "/api/inventory/assets/?page_size=1",
+            f"/api/inventory/assets/{self.asset.pk}/",
+            f"/api/inventory/stock_history/{self.asset.asset_tag}/",
+            "/api/users/?page_size=5",
+            "/api/departments/",
+        )
+        expected = await sync_to_async(self.sync_responses)(urls)
+
+        client = AsyncClient()
+        for url in urls:
+            response = await client.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.json(), expected[url], url)
+
+    async def test_requires_token(self):
+        response = await AsyncClient().get("/api/inventory/assets/")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+    async def test_writes_are_handled_by_the_sync_view(self):
+        response = await AsyncClient().post(
+            "/api/users/", {"name": "新人員"}, content_type="application/json", headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "缺少必填欄位：id_number"})
+
+
+# ================================================================
+# 跨 worker metrics：worker 重啟後計數不倒退
+# ================================================================
+class MetricsRestartTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        override = override_settings(METRICS_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def registry(self, amount):
+        registry = MetricsRegistry()
+        registry.counter("restart_total", "test").inc(amount)
+        registry.dump(force=True)
+        return registry
+
+    def total(self, registry):
+        return registry.collect()[("restart_total", ())]
+
+    def test_reused_pid_does_not_overwrite_and_exited_files_are_folded(self):
+        old = self.registry(5)
+        old_file = self.directory / f"metrics_{old.process_id}.json"
+        # 重啟後的 worker 拿到同一個 pid
+        new = self.registry(1)
+        self.assertEqual(new.pid, old.pid)
+        self.assertEqual(self.total(new), 6)
+
+        with mock.patch("system.metrics._process_exited", side_effect=lambda path: path == old_file):
+            self.assertEqual(self.total(new), 6)
+        self.assertFalse(old_file.exists())
+        self.assertTrue((self.directory / MetricsRegistry.EXITED_FILE).exists())
+
+        new.counter("restart_total", "test").inc(2)
+        self.assertEqual(self.total(new), 8)
+        self.assertEqual(len(list(self.directory.glob("metrics_*.json"))), 2)
+
+    def test_process_exited_checks_pid_on_this_host(self):
+        registry = self.registry(1)
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        host = socket.gethostname()
+        self.assertFalse(_process_exited(self.directory / f"metrics_{registry.process_id}.json"))
+        self.assertTrue(_process_exited(self.directory / f"metrics_{host}_{process.pid}_abc.json"))
+        self.assertFalse(_process_exited(self.directory / f"metrics_other-host_{process.pid}_abc.json"))
+        self.assertFalse(_process_exited(self.directory / MetricsRegistry.EXITED_FILE))
+
+
+# ================================================================
+# 副本路由：read-your-writes
+# ================================================================
+@override_settings(DATABASE_REPLICAS=["replica1"], REPLICA_STICKY_SECONDS=10)
+class ReplicaStickinessTests(TestCase):
+    def run_middleware(self, request, write=False):
+        states = []
+
+        def view(request):
+            states.append(_routing.get())
+            if write:
+                Department.objects.create(name="資訊部")
+            return HttpResponse()
+
+        return ReplicaRoutingMiddleware(view)(request), states[0]
+
+    def test_write_returns_header_and_cookie(self):
+        response, _ = self.run_middleware(RequestFactory().post("/api/departments/"), write=True)
+
+        until = int(response["X-DB-Primary-Until"])
+        self.assertGreater(until, time.time())
+        self.assertEqual(response.cookies["db_primary_until"].value, str(until))
+
+    def test_echoed_header_keeps_reads_on_primary(self):
+        until = str(int(time.time()) + 10)
+        _, sticky = self.run_middleware(RequestFactory().get("/api/departments/", HTTP_X_DB_PRIMARY_UNTIL=until))
+        _, expired = self.run_middleware(RequestFactory().get("/api/departments/", HTTP_X_DB_PRIMARY_UNTIL="1"))
+
+        self.assertFalse(sticky.read_replica)
+        self.assertTrue(expired.read_replica)
+
+
+# ================================================================
+# 背景工作失敗時清除暫存資料
+# ================================================================
+@override_settings(JOB_STALE_AFTER=60, JOB_MAX_ATTEMPTS=3)
+class JobFailureCleanupTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(JOB_UPLOAD_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def enqueue_upload(self):
+        job = enqueue_asset_import(SimpleUploadedFile("assets.csv", b"product_code\nNB\n"), user=None)
+        return job, Path(job.payload["path"])
+
+    def test_handler_failure_removes_upload_and_payload(self):
+        job, path = self.enqueue_upload()
+        self.assertTrue(path.exists())
+
+        with mock.patch("inventory.jobs._import_file", side_effect=RuntimeError("壞掉了")):
+            Worker(name="test").execute(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.payload), (Job.FAILED, "壞掉了", {}))
+        self.assertFalse(path.exists())
+
+    def test_stale_job_out_of_attempts_is_cleaned_up(self):
+        job, path = self.enqueue_upload()
+        users = enqueue("user_import", {"data": [{"id_number": "A100000001"}]})
+        retry = enqueue("user_import", {"data": [{"id_number": "A100000002"}]})
+        stale = timezone.now() - timedelta(seconds=120)
+        Job.objects.filter(pk__in=[job.pk, users.pk]).update(status=Job.RUNNING, attempts=3, heartbeat_at=stale)
+        Job.objects.filter(pk=retry.pk).update(status=Job.RUNNING, attempts=1, heartbeat_at=stale)
+
+        requeue_stale_jobs()
+
+        for failed in (job, users):
+            failed.refresh_from_db()
+            self.assertEqual((failed.status, failed.payload), (Job.FAILED, {}))
+        self.assertFalse(path.exists())
+        retry.refresh_from_db()
+        self.assertEqual(retry.status, Job.QUEUED)
+        self.assertEqual(retry.payload["data"], [{"id_number": "A100000002"}])
@@ -0,0 +1,33 @@
+class LoadedValuesMixin:
+    """
+    保存資料列從資料庫載入時的欄位值（instance._loaded_values，key 為 attname）：
+    - 於 from_db 記錄，只多一個 dict，不做任何格式轉換
+    - save() 後更新為已寫入的值，refresh_from_db() / 延遲載入後更新為讀到的值
+    儲存前的 signal（稽核紀錄、庫存彙總）以此作為原值，不需再查詢一次資料庫；
+    不是從資料庫載入的 instance 沒有 _loaded_values
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_loaded_values(fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_loaded_values(kwargs.get("update_fields"))
+
+    def _remember_loaded_values(self, fields=None):
+        loaded = self.__dict__
+        names = None if fields is None else set(fields)
+        values = getattr(self, "_loaded_values", None) or {}
+        for field in self._meta.concrete_fields:
+            if field.attname not in loaded:
+                continue
+            if names is None or field.name in names or field.attname in names:
+                values[field.attname] = loaded[field.attname]
+        self._loaded_values = values
@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import get_product_check_setting, toggle_product_check_setting
+from .views import get_product_check_setting, job_detail, metrics_view, toggle_product_check_setting
 
 urlpatterns = [
     path("check-setting/", get_product_check_setting),
     path("toggle-setting/", toggle_product_check_setting),
+    path("metrics", metrics_view, name="metrics"),
+    path("jobs/<int:pk>/", job_detail, name="job_detail"),  # GET
 ]
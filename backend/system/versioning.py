@@ -0,0 +1,123 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import VersionStamp
+
+# 每張資料表一個版本號：VersionStamp(key="table:<app_label>.<model>")
+TABLE_VERSION_PREFIX = "table:"
+
+
+def table_key(model):
+    return f"{TABLE_VERSION_PREFIX}{model._meta.label_lower}"
+
+
+class _BumpTable:
+    """on_commit callback；保留 key 以便同一個交易內去重"""
+
+    def __init__(self, key):
+        self.key = key
+
+    def __call__(self):
+        VersionStamp.bump(self.key)
+
+
+def touch_tables(*models):
+    """
+    標記資料表已變更：交易 commit 後 bump 該表的版本號
+    （不在交易中時立即 bump）。同一個交易內重複標記只會 bump 一次，
+    且 bump 在交易外執行，不會讓並行的寫入排隊等待版本號的 row lock
+    """
+    connection = transaction.get_connection()
+    pending = set()
+    if connection.in_atomic_block:
+        pending = {
+            callback.key for _, callback, *_ in connection.run_on_commit
+            if isinstance(callback, _BumpTable)
+        }
+    for key in {table_key(model) for model in models} - pending:
+        transaction.on_commit(_BumpTable(key))
+
+
+def _stamp_rows(keys):
+    return VersionStamp.objects.filter(key__in=keys).values_list("key", "version", "updated_at")
+
+
+def table_versions(*models):
+    """回傳 (版本字串, 最後修改時間)；以一次查詢讀取所有相關資料表的版本號"""
+    keys = sorted(table_key(model) for model in models)
+    return _summarize(keys, list(_stamp_rows(keys)))
+
+
+async def atable_versions(*models):
+    keys = sorted(table_key(model) for model in models)
+    return _summarize(keys, [row async for row in _stamp_rows(keys)])
+
+
+def _summarize(keys, stamp_rows):
+    rows = {key: (version, updated_at) for key, version, updated_at in stamp_rows}
+    versions = ",".join(f"{key}={rows.get(key, (0, None))[0]}" for key in keys)
+    modified = [updated_at for _, updated_at in rows.values() if updated_at is not None]
+    return versions, max(modified) if modified else None
+
+
+def conditional_on_tables(*models):
+    """
+    GET / HEAD 的條件式請求：
+    - ETag 由相關資料表的版本號與完整 URL 組成
+    - If-None-Match / If-Modified-Since 符合時，在查詢與序列化之前直接回傳 304
+    - 200 回應附上 ETag / Last-Modified
+    需放在 @api_view 與權限 decorator 之下，驗證通過後才判斷；async view 亦可使用
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+
+                etag, last_modified = _validators(request, *await atable_versions(*models))
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                return _finalize(response, etag, last_modified)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = _validators(request, *table_versions(*models))
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return _finalize(response, etag, last_modified)
+
+        return wrapper
+
+    return decorator
+
+
+def _validators(request, versions, modified):
+    digest = hashlib.sha1(f"{request.get_full_path()}|{versions}".encode()).hexdigest()
+    return f'"{digest}"', int(modified.timestamp()) if modified else None
+
+
+def _finalize(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    # 瀏覽器每次都需帶條件重新驗證，不可依 Last-Modified 自行推算快取時間
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
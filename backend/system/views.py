@@ -1,6 +1,14 @@
-from rest_framework.decorators import api_view
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import SystemSetting
+from users.authentication import ClaimJWTAuthentication
+from .jobs import job_data
+from .metrics import registry
+from .models import Job, SystemSetting
 
 @api_view(["GET"])
 def get_product_check_setting(request):
@@ -12,3 +20,39 @@ def toggle_product_check_setting(request):
     enabled = bool(request.data.get("enabled", False))
     SystemSetting.set_value("ENABLE_PRODUCT_DUPLICATE_CHECK", enabled)
     return Response({"enabled": enabled})
+
+
+@api_view(["GET"])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def job_detail(request, pk):
+    """背景工作的狀態與進度；只有建立者與管理員可查詢"""
+    job = Job.objects.filter(pk=pk).first()
+    if job is None or (job.created_by_id != request.user.pk and not request.user.is_staff):
+        return Response({"error": "工作不存在"}, status=404)
+    return Response(job_data(job))
+
+
+# 經過反向代理的請求會帶這些 header；此時 REMOTE_ADDR 是 proxy 本身，不能用來判斷來源
+PROXY_HEADERS = ("HTTP_X_FORWARDED_FOR", "HTTP_X_REAL_IP", "HTTP_FORWARDED")
+
+
+def metrics_access_allowed(request):
+    """
+    設定 METRICS_TOKEN 時只接受 Authorization: Bearer <token>；
+    未設定時才退回 METRICS_ALLOWED_IPS，且拒絕經過反向代理轉發的請求
+    """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token:
+        scheme, _, credentials = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(credentials.encode(), token.encode())
+    if any(header in request.META for header in PROXY_HEADERS):
+        return False
+    return request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """Prometheus text format；不經 JWT 驗證，存取限制見 metrics_access_allowed"""
+    if not metrics_access_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
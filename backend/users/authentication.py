@@ -0,0 +1,207 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from system.models import VersionStamp
+from users.models import CustomUser
+
+# 人員啟用狀態變更（離職、刪除、復職）時 bump，各 worker 依此重新載入
+AUTH_USERS_VERSION_KEY = "auth_users"
+
+# 登入時寫入 token 的人員資料（access token 由 refresh token 複製這些 claim）
+USER_CLAIMS = ("eip_account", "name", "department_id", "is_active", "is_staff")
+
+ACTIVE = "active"
+REVOKED = "revoked"
+UNKNOWN = "unknown"
+
+
+def set_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def user_from_claims(token):
+    """
+    由 token claim 建立 request.user，不查詢資料庫
+    只有 USER_CLAIMS 內的欄位有值，僅供讀取，不可呼叫 save()
+    """
+    user = CustomUser(
+        id=token[api_settings.USER_ID_CLAIM],
+        **{claim: token[claim] for claim in USER_CLAIMS},
+    )
+    user._state.adding = False
+    user._state.db = "default"
+    return user
+
+
+def has_user_claims(token):
+    return all(claim in token for claim in USER_CLAIMS)
+
+
+class _ActiveUsersSnapshot:
+    """
+    行程內的啟用人員 id 快照：
+    - 載入時記下所有啟用中的 id 與目前最大 id
+    - id 不大於最大 id 且不在集合內 → 已停用或已刪除，token 失效
+    - id 大於最大 id → 快照之後才建立的人員，交由資料庫確認
+    TTL 內直接讀記憶體；過期後只查一次版本號，版本變更才重新載入
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active_ids = None
+        self.max_id = 0
+        self.version = None
+        self.checked_at = 0.0
+
+    def ttl(self):
+        return getattr(settings, "AUTH_VERSION_CHECK_INTERVAL", 5)
+
+    def is_fresh(self):
+        return self.active_ids is not None and time.monotonic() - self.checked_at < self.ttl()
+
+    def state(self, user_id):
+        if not self.is_fresh():
+            with self.lock:
+                if not self.is_fresh():
+                    self._refresh()
+                    self.checked_at = time.monotonic()
+        return self.lookup(user_id)
+
+    def lookup(self, user_id):
+        """只讀記憶體中的快照，不檢查 TTL；快照剛被 invalidate 時回傳 UNKNOWN"""
+        active_ids = self.active_ids
+        if active_ids is None:
+            return UNKNOWN
+        if user_id in active_ids:
+            return ACTIVE
+        if user_id <= self.max_id:
+            return REVOKED
+        return UNKNOWN
+
+    def _refresh(self):
+        version = VersionStamp.current(AUTH_USERS_VERSION_KEY)
+        if self.active_ids is None or version != self.version:
+            ids = list(CustomUser.objects.filter(is_active=True).values_list("id", flat=True))
+            self.max_id = CustomUser.objects.order_by("-id").values_list("id", flat=True).first() or 0
+            self.active_ids = frozenset(ids)
+            self.version = version
+            user_cache.clear()
+
+    def invalidate(self):
+        with self.lock:
+            self.active_ids = None
+
+
+class _UserCache:
+    """舊格式 token（沒有 claim）或新建人員的短 TTL 使用者快取"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = {}
+
+    def ttl(self):
+        return getattr(settings, "AUTH_USER_CACHE_TTL", 30)
+
+    def get(self, user_id):
+        entry = self.users.get(user_id)
+        now = time.monotonic()
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        user = CustomUser.objects.filter(id=user_id).first()
+        with self.lock:
+            self.users[user_id] = (user, now + self.ttl())
+        return user
+
+    def clear(self):
+        with self.lock:
+            self.users = {}
+
+
+active_users = _ActiveUsersSnapshot()
+user_cache = _UserCache()
+
+
+def invalidate_user_tokens():
+    """
+    人員停用 / 刪除 / 復職後呼叫：
+    本行程立即重新載入，其他 worker 於 AUTH_VERSION_CHECK_INTERVAL 內看到新版本號
+    """
+    VersionStamp.bump(AUTH_USERS_VERSION_KEY)
+    active_users.invalidate()
+    user_cache.clear()
+
+
+def load_token_user(user_id):
+    """refresh 時重新確認人員狀態，回傳 CustomUser；已停用或不存在時回傳 None"""
+    if active_users.state(user_id) == REVOKED:
+        return None
+    user = user_cache.get(user_id)
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+class ClaimJWTAuthentication(JWTAuthentication):
+    """
+    以 token 內已簽章的 claim 建立 request.user，一般請求不查詢資料庫：
+    - 停用 / 刪除的人員由啟用人員快照判斷（版本號同步）
+    - 沒有 claim 的舊 token 或快照之後新建的人員，改用短 TTL 的使用者快取
+    """
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        state = active_users.state(user_id)
+        if state == REVOKED:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if state == ACTIVE and has_user_claims(validated_token):
+            return user_from_claims(validated_token)
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def get_user_id(self, validated_token):
+        try:
+            return int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    # ------------------------------------------------------------
+    # async view 使用（request 為 Django HttpRequest）
+    # ------------------------------------------------------------
+    async def aauthenticate(self, request):
+        """與 authenticate() 相同，回傳 (user, token) 或 None（沒有帶 token）"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        """
+        快照在 TTL 內且 token 帶 claim 時直接在 event loop 上建立 user；
+        需要查詢資料庫（快照過期、舊 token、新建人員）時才交給 thread 執行 get_user
+        """
+        user_id = self.get_user_id(validated_token)
+        if active_users.is_fresh():
+            state = active_users.lookup(user_id)
+            if state == REVOKED:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            if state == ACTIVE and has_user_claims(validated_token):
+                return user_from_claims(validated_token)
+        return await sync_to_async(self.get_user)(validated_token)
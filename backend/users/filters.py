@@ -0,0 +1,63 @@
+from django.db.models import Q
+from users.models import CustomUser
+
+# 前端可用的排序欄位 → ORM 欄位
+USER_ORDERING_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "eip_account": "eip_account",
+    "id_number": "id_number",
+    "department": "department__name",
+}
+
+
+def parse_bool(value):
+    """將 query string 的 true/false 轉為布林，無法判斷時回傳 None"""
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    if value in ("true", "1", "yes"):
+        return True
+    if value in ("false", "0", "no"):
+        return False
+    return None
+
+
+def filter_users(params, queryset=None):
+    """
+    依 query 參數篩選人員：
+    - department：部門名稱；department_id：部門 ID
+    - is_active：true / false
+    - search：姓名 / EIP 帳號 / 身份證字號 模糊搜尋（PostgreSQL 以 pg_trgm 索引處理，見 users 0007 migration）
+    - ordering：排序欄位，前綴 "-" 為遞減，例如 -name
+    """
+    qs = queryset if queryset is not None else CustomUser.objects.all()
+    qs = qs.select_related("department")
+
+    department_name = params.get("department")
+    if department_name:
+        qs = qs.filter(department__name=department_name)
+
+    department_id = params.get("department_id")
+    if department_id:
+        qs = qs.filter(department_id=department_id)
+
+    is_active = parse_bool(params.get("is_active"))
+    if is_active is not None:
+        qs = qs.filter(is_active=is_active)
+
+    search = (params.get("search") or "").strip()
+    if search:
+        qs = qs.filter(
+            Q(name__icontains=search)
+            | Q(eip_account__icontains=search)
+            | Q(id_number__icontains=search)
+        )
+
+    ordering = params.get("ordering") or "name"
+    descending = ordering.startswith("-")
+    field = USER_ORDERING_FIELDS.get(ordering.lstrip("-"), "name")
+    # 以 id 作為次要排序，確保分頁結果穩定
+    if descending:
+        return qs.order_by(f"-{field}", "-id")
+    return qs.order_by(field, "id")
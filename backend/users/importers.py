@@ -0,0 +1,202 @@
+import time
+
+from django.db import transaction
+
+from departments.models import Department
+from inventory.models import Asset
+from reports.audit import record_created, record_updates
+from reports.summary import lock_assets, track_inventory
+from system.fragments import fragment_cache
+from system.metrics import record_import
+from system.versioning import touch_tables
+from users.authentication import invalidate_user_tokens
+from users.models import CustomUser
+from users.passwords import hash_passwords, log_progress
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# 匯入時會覆寫的欄位（以 id_number 為唯一鍵）
+UPSERT_FIELDS = [
+    "name", "email", "phone", "title", "eip_account",
+    "department", "is_active", "password",
+]
+# 稽核紀錄比對的欄位（不含密碼）
+AUDIT_FIELDS = [
+    "name", "email", "phone", "title", "eip_account",
+    "department_id", "is_active",
+]
+
+
+def clean_entry(entry):
+    return {
+        key: (entry.get(key) or "").strip()
+        for key in ("id_number", "eip_account", "name", "department_name", "title", "email", "phone")
+    }
+
+
+def import_users(users_data, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, checkpoint=None, resume=None):
+    """
+    人員批次匯入 / 更新：
+    - 密碼雜湊在 transaction 之外以 process pool 平行計算
+    - 缺少的部門一次建立
+    - 以 id_number 為唯一鍵，bulk_create(update_conflicts=True) 分批 upsert
+    - created / updated 由匯入前已存在的 id_number 集合計算
+    每個 chunk 各自一個 transaction：upsert 可重複執行，中斷時已 commit 的 chunk 保留，
+    重新匯入同一批資料結果相同
+    progress(stage, done, total)：stage 為 "hash" 或 "write"，於 transaction 之外呼叫
+    checkpoint(state)：在每個 chunk 的 transaction 內呼叫，state 與該 chunk 的資料一起 commit；
+    之後以 resume=state 重新執行時從 state["offset"] 繼續（背景工作中斷後接手）
+    回傳 {"created": n, "updated": n, "skipped": [...]}
+    """
+    start = time.perf_counter()
+    skipped = []
+    rows = {}  # id_number → cleaned entry（同一檔案重複時以最後一筆為準）
+
+    for entry in users_data:
+        if not isinstance(entry, dict):
+            skipped.append({"entry": entry, "reason": "資料格式錯誤"})
+            continue
+        cleaned = clean_entry(entry)
+        if not all([cleaned["id_number"], cleaned["eip_account"], cleaned["name"], cleaned["department_name"]]):
+            skipped.append({"entry": entry, "reason": "缺少必填欄位"})
+            continue
+        rows.pop(cleaned["id_number"], None)
+        rows[cleaned["id_number"]] = cleaned
+
+    # 同一 EIP 帳號不可對應到多個身份證字號
+    eip_owner = {}
+    for id_number, row in list(rows.items()):
+        owner = eip_owner.setdefault(row["eip_account"], id_number)
+        if owner != id_number:
+            skipped.append({"entry": rows.pop(id_number), "reason": "EIP帳號重複"})
+
+    # 上述檢查每次執行結果相同；寫入階段才發現的跳過項目由 checkpoint 保存
+    state = {"offset": 0, "created": 0, "updated": 0, "skipped": []}
+    state.update(resume or {})
+    entries = list(rows.values())
+    pending = entries[state["offset"]:]
+
+    # 預設密碼為身份證字號
+    hash_progress = log_progress("使用者密碼雜湊")
+    if progress:
+        hash_progress = _staged(progress, "hash", hash_progress)
+    hashes = dict(zip(
+        (row["id_number"] for row in pending),
+        hash_passwords([row["id_number"] for row in pending], progress=hash_progress),
+    ))
+
+    departments = ensure_departments({row["department_name"] for row in pending})
+
+    for offset in range(state["offset"], len(entries), chunk_size):
+        chunk = entries[offset:offset + chunk_size]
+        with transaction.atomic():
+            created, updated = _upsert_chunk(chunk, departments, hashes, state["skipped"])
+            state = {
+                **state,
+                "offset": offset + len(chunk),
+                "created": state["created"] + created,
+                "updated": state["updated"] + updated,
+            }
+            if checkpoint:
+                checkpoint(state)
+        if progress:
+            progress("write", state["offset"], len(entries))
+
+    if state["updated"]:
+        # 匯入會將既有人員設為在職（復職），需同步啟用人員快照
+        invalidate_user_tokens()
+
+    skipped.extend(state["skipped"])
+    record_import(
+        "users", time.perf_counter() - start,
+        created=state["created"], updated=state["updated"], skipped=len(skipped),
+    )
+    return {
+        "created": state["created"],
+        "updated": state["updated"],
+        "skipped": skipped,
+    }
+
+
+def _upsert_chunk(chunk, departments, hashes, skipped):
+    """寫入一個 chunk（需在 transaction 內）；回傳 (新增數, 更新數)，跳過的資料加入 skipped"""
+    id_numbers = [row["id_number"] for row in chunk]
+    # 鎖定既有人員再鎖定其資產（與出入庫相同順序），upsert 期間不會有資產被領用或歸還
+    existing = {
+        row["id_number"]: row
+        for row in CustomUser.objects.select_for_update().filter(id_number__in=id_numbers)
+        .order_by("id").values("id", "id_number", *AUDIT_FIELDS)
+    }
+    # EIP 帳號已被其他人員使用時跳過，避免整批 upsert 因唯一鍵衝突失敗
+    taken = dict(
+        CustomUser.objects.filter(eip_account__in=[row["eip_account"] for row in chunk])
+        .values_list("eip_account", "id_number")
+    )
+
+    users = []
+    for row in chunk:
+        owner = taken.get(row["eip_account"])
+        if owner is not None and owner != row["id_number"]:
+            skipped.append({"entry": row, "reason": "EIP帳號已被其他人員使用"})
+            continue
+        users.append(build_user(row, departments[row["department_name"]], hashes[row["id_number"]]))
+
+    # 既有人員的部門可能變更，需同步庫存彙總
+    with track_inventory(lock_assets(Asset.objects.filter(owner_user_id__in=list(existing)))):
+        CustomUser.objects.bulk_create(
+            users,
+            batch_size=len(chunk),
+            update_conflicts=True,
+            unique_fields=["id_number"],
+            update_fields=UPSERT_FIELDS,
+        )
+
+    updated = [user for user in users if user.id_number in existing]
+    record_created(CustomUser, [user for user in users if user.id_number not in existing])
+    record_updates(CustomUser, [
+        (
+            existing[user.id_number]["id"],
+            {field: existing[user.id_number][field] for field in AUDIT_FIELDS},
+            {field: getattr(user, field) for field in AUDIT_FIELDS},
+        )
+        for user in updated
+    ])
+    touch_tables(CustomUser)
+    fragment_cache.evict(CustomUser, [row["id"] for row in existing.values()])
+    return len(users) - len(updated), len(updated)
+
+
+def ensure_departments(names):
+    """取得部門名稱 → Department，不存在的部門一次建立"""
+    departments = {d.name: d for d in Department.objects.filter(name__in=names)}
+    missing = names - departments.keys()
+    if missing:
+        Department.objects.bulk_create(
+            [Department(name=name) for name in missing], ignore_conflicts=True
+        )
+        created = list(Department.objects.filter(name__in=missing))
+        record_created(Department, created)
+        touch_tables(Department)
+        departments.update({d.name: d for d in created})
+    return departments
+
+
+def _staged(progress, stage, also):
+    def callback(done, total):
+        also(done, total)
+        progress(stage, done, total)
+    return callback
+
+
+def build_user(row, department, password_hash):
+    return CustomUser(
+        id_number=row["id_number"],
+        eip_account=row["eip_account"],
+        name=row["name"],
+        email=row["email"],
+        phone=row["phone"],
+        title=row["title"],
+        department=department,
+        is_active=True,  # 若之前離職，現在重新入職
+        password=password_hash,
+    )
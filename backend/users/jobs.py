@@ -0,0 +1,29 @@
+from system.jobs import enqueue, job_handler
+from users.importers import import_users
+
+USER_IMPORT = "user_import"
+
+
+def enqueue_user_import(users_data, user):
+    return enqueue(USER_IMPORT, {"data": users_data}, user=user, rows_total=len(users_data))
+
+
+@job_handler(USER_IMPORT)
+def run_user_import(job, progress):
+    """
+    人員匯入：以 id_number upsert，每個 chunk 各自 commit
+    checkpoint（已寫入的筆數與累計結果）與該 chunk 的資料一起 commit，worker 中斷後由下一個 worker 從該處繼續
+    進度依 import_users 的階段回報（hash：密碼雜湊，write：寫入）
+    """
+    def report(stage, done, total):
+        progress.update(stage=stage, rows_done=done, rows_total=total)
+
+    def checkpoint(state):
+        progress.update(result={"checkpoint": state})
+
+    result = import_users(
+        job.payload["data"], progress=report, checkpoint=checkpoint, resume=job.result.get("checkpoint"),
+    )
+    # 匯入資料已不需要，清空以免佔用空間
+    progress.update(payload={}, error_count=len(result["skipped"]))
+    return result
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.passwords import hash_passwords, hash_workers
+
+
+class Command(BaseCommand):
+    help = "比較批次密碼雜湊的單行程與 process pool 平行計算耗時"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=None, help="預設為 CPU 核心數")
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        workers = options["workers"] or hash_workers()
+        raw = [f"A{i:09d}" for i in range(count)]
+
+        start = time.perf_counter()
+        hash_passwords(raw, workers=1)
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hash_passwords(raw, workers=workers, threshold=0)
+        parallel = time.perf_counter() - start
+
+        self.stdout.write(f"passwords={count} workers={workers}")
+        self.stdout.write(f"serial={serial:.2f}s ({count / serial:.0f}/s)")
+        self.stdout.write(f"parallel={parallel:.2f}s ({count / parallel:.0f}/s)")
+        self.stdout.write(f"speedup={serial / parallel:.2f}x")
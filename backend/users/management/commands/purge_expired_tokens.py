@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = "分批刪除已過期的 outstanding token（其黑名單紀錄會一併刪除）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="每批刪除的筆數")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size 必須大於 0")
+
+        expired = OutstandingToken.objects.filter(expires_at__lt=timezone.now())
+        deleted = 0
+        last_id = 0
+        while True:
+            # expires_at 沒有索引：依主鍵往後掃描，每批從上一批的位置繼續
+            ids = list(expired.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            self.stdout.write(f"deleted {deleted} tokens")
+
+        self.stdout.write(self.style.SUCCESS(f"purged {deleted} expired tokens"))
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# filter_users 的 search 使用 icontains，PostgreSQL 上為 UPPER("欄位"::text) LIKE UPPER(%s)
+# 前後都有萬用字元時 btree 索引無法使用，改以相同運算式建立 pg_trgm GIN 索引
+SEARCH_INDEXES = {
+    'user_name_search_trgm_idx': 'name',
+    'user_eip_search_trgm_idx': 'eip_account',
+    'user_idno_search_trgm_idx': 'id_number',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    # 只有 PostgreSQL 建立 pg_trgm 索引
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index, column in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index} '
+            f'ON users_customuser USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_name_trgm_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 
+from system.tracking import LoadedValuesMixin
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, eip_account, id_number, name, password=None, **extra_fields):
         if not eip_account:
@@ -29,7 +31,7 @@ class CustomUserManager(BaseUserManager):
         return self.get(eip_account=eip_account)
 
 
-class CustomUser(AbstractBaseUser, PermissionsMixin):
+class CustomUser(LoadedValuesMixin, AbstractBaseUser, PermissionsMixin):
     eip_account = models.CharField(max_length=100, unique=True)
     id_number = models.CharField(max_length=20, unique=True)
     name = models.CharField(max_length=150)
@@ -51,5 +53,13 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     objects = CustomUserManager()
 
+    class Meta:
+        indexes = [
+            # 人員列表：部門 + 在職狀態篩選，依姓名排序
+            models.Index(fields=["department", "is_active", "name", "id"], name="user_dept_active_name_idx"),
+            models.Index(fields=["is_active", "name", "id"], name="user_active_name_idx"),
+            models.Index(fields=["name", "id"], name="user_name_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.eip_account})"
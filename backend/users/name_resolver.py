@@ -0,0 +1,201 @@
+import threading
+from collections import defaultdict
+
+from django.db import connections, router
+
+from system.models import VersionStamp
+from system.versioning import table_key
+from users.models import CustomUser
+
+EXACT = "exact"
+AMBIGUOUS = "ambiguous"
+UNMATCHED = "unmatched"
+
+DEFAULT_CANDIDATE_LIMIT = 10
+# 與 pg_trgm 預設的 similarity threshold 相同
+SIMILARITY_THRESHOLD = 0.3
+
+
+def user_candidate(user, score=None):
+    candidate = {
+        "id_number": user.id_number,
+        "name": user.name,
+        "department": user.department.name if user.department else None,
+        "email": user.email,
+        "phone": user.phone,
+    }
+    if score is not None:
+        candidate["score"] = round(score, 3)
+    return candidate
+
+
+def trigrams(text):
+    """與 pg_trgm 相同的切法：小寫、前補兩個空白、後補一個空白"""
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+class UserNameResolver:
+    """
+    依姓名批次找出人員：
+    1. 完全相符（一次 name__in 查詢）：唯一 → exact，多筆 → ambiguous
+    2. 無完全相符：以包含（icontains）比對，唯一 → exact，多筆 → ambiguous
+    3. 都沒有：unmatched，並附上相似姓名作為建議
+    PostgreSQL 使用 pg_trgm GIN 索引以單一查詢處理整批姓名；
+    其他資料庫（SQLite）使用行程內共用的字元 / trigram 索引（memory_index）
+    resolve() 回傳 {name: {"status", "user", "candidates"}}
+    """
+
+    def __init__(self, limit=DEFAULT_CANDIDATE_LIMIT):
+        self.limit = limit
+        self.using = router.db_for_read(CustomUser)
+
+    def resolve(self, names):
+        names = {name.strip() for name in names if name and name.strip()}
+        results = {}
+        if not names:
+            return results
+
+        exact = defaultdict(list)
+        for user in CustomUser.objects.using(self.using).filter(name__in=names).select_related("department"):
+            exact[user.name].append(user)
+
+        for name, users in exact.items():
+            if len(users) == 1:
+                results[name] = {"status": EXACT, "user": users[0], "candidates": []}
+            else:
+                results[name] = {
+                    "status": AMBIGUOUS,
+                    "user": None,
+                    "candidates": [user_candidate(u, 1.0) for u in users[:self.limit]],
+                }
+
+        remaining = names - results.keys()
+        if remaining:
+            if connections[self.using].vendor == "postgresql":
+                matches = self._fuzzy_postgresql(remaining)
+            else:
+                matches = self._fuzzy_memory(remaining)
+            self._attach_fuzzy_results(results, remaining, matches)
+
+        return results
+
+    def _attach_fuzzy_results(self, results, names, matches):
+        # matches: name → [(user_id, score, contains)]，已依 contains、score 排序
+        user_ids = {user_id for rows in matches.values() for user_id, _, _ in rows}
+        users = CustomUser.objects.using(self.using).select_related("department").in_bulk(user_ids)
+
+        for name in names:
+            rows = [(users[uid], score, contains) for uid, score, contains in matches.get(name, []) if uid in users]
+            containing = [user for user, _, contains in rows if contains]
+            candidates = [user_candidate(user, score) for user, score, _ in rows]
+
+            if len(containing) == 1:
+                results[name] = {"status": EXACT, "user": containing[0], "candidates": []}
+            elif len(containing) > 1:
+                results[name] = {"status": AMBIGUOUS, "user": None, "candidates": candidates}
+            else:
+                results[name] = {"status": UNMATCHED, "user": None, "candidates": candidates}
+
+    # ------------------------------------------------------------
+    # PostgreSQL：pg_trgm
+    # ------------------------------------------------------------
+    def _fuzzy_postgresql(self, names):
+        names = sorted(names)
+        patterns = [f"%{escape_like(name)}%" for name in names]
+        table = CustomUser._meta.db_table
+        sql = f"""
+            SELECT q.name, u.id, similarity(u.name, q.name), u.name ILIKE q.pattern
+            FROM unnest(%s::text[], %s::text[]) AS q(name, pattern)
+            CROSS JOIN LATERAL (
+                SELECT id, name FROM {table}
+                WHERE name ILIKE q.pattern OR name %% q.name
+                ORDER BY name ILIKE q.pattern DESC, similarity(name, q.name) DESC, id
+                LIMIT %s
+            ) u
+        """
+        matches = defaultdict(list)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, [names, patterns, self.limit])
+            for name, user_id, score, contains in cursor.fetchall():
+                matches[name].append((user_id, score, contains))
+        return matches
+
+    # ------------------------------------------------------------
+    # 其他資料庫：記憶體索引
+    # ------------------------------------------------------------
+    def _fuzzy_memory(self, names):
+        index = memory_index.get(self.using)
+        matches = {}
+        for name in names:
+            lowered = name.lower()
+            # 包含比對：每個字元都出現的人員取交集後再確認子字串
+            postings = [index["chars"].get(ch, set()) for ch in set(lowered)]
+            containing = set.intersection(*postings) if postings else set()
+            containing = {uid for uid in containing if lowered in index["names"][uid].lower()}
+
+            similar = set()
+            for gram in trigrams(name):
+                similar |= index["trigrams"].get(gram, set())
+
+            scored = []
+            for uid in containing | similar:
+                score = similarity(name, index["names"][uid])
+                contains = uid in containing
+                if contains or score >= SIMILARITY_THRESHOLD:
+                    scored.append((uid, score, contains))
+            scored.sort(key=lambda row: (not row[2], -row[1], row[0]))
+            matches[name] = scored[:self.limit]
+        return matches
+
+
+class _MemoryIndex:
+    """
+    行程內共用的姓名索引（非 PostgreSQL 使用）：
+    每次取用只查詢 CustomUser 資料表的版本號，人員新增 / 修改（touch_tables）後才重新載入全部姓名
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.key = None
+
+    def get(self, using):
+        # 先讀版本號再讀資料：載入期間的寫入會使版本號變更，下次取用時重新載入
+        key = (using, VersionStamp.objects.using(using).filter(key=table_key(CustomUser))
+               .values_list("version", flat=True).first() or 0)
+        with self.lock:
+            if self.index is None or self.key != key:
+                self.index = self._build(using)
+                self.key = key
+            return self.index
+
+    def invalidate(self):
+        with self.lock:
+            self.index = None
+
+    def _build(self, using):
+        names = {}
+        chars = defaultdict(set)
+        grams = defaultdict(set)
+        for user_id, name in CustomUser.objects.using(using).values_list("id", "name").iterator():
+            names[user_id] = name
+            for ch in set(name.lower()):
+                chars[ch].add(user_id)
+            for gram in trigrams(name):
+                grams[gram].add(user_id)
+        return {"names": names, "chars": chars, "trigrams": grams}
+
+
+memory_index = _MemoryIndex()
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
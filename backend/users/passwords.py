@@ -0,0 +1,119 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+logger = logging.getLogger("equip_mgmt")
+
+# 少於此數量時直接在目前行程計算，避免啟動 process pool 的成本
+DEFAULT_PARALLEL_THRESHOLD = 200
+HASH_CHUNK_SIZE = 50
+# 未設定 PASSWORD_HASH_WORKERS 時的上限，避免佔滿主機所有核心影響其他請求
+DEFAULT_MAX_WORKERS = 4
+
+
+def hash_workers():
+    configured = getattr(settings, "PASSWORD_HASH_WORKERS", None)
+    if configured:
+        return configured
+    return min(os.cpu_count() or 1, DEFAULT_MAX_WORKERS)
+
+
+def _init_worker():
+    # spawn 出來的子行程需自行載入 Django 設定
+    django.setup()
+
+
+def _hash_chunk(raw_passwords):
+    return [make_password(raw) for raw in raw_passwords]
+
+
+class _HashPool:
+    """
+    每個行程共用一個 process pool，第一次需要時才啟動（spawn 子行程需數秒載入 Django）
+    pool 損壞（子行程被終止）時丟棄，下次重新建立；fork 出的子行程（job worker）各自建立
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.workers = None
+        self.pid = None
+
+    def get(self, workers):
+        with self.lock:
+            if self.executor is not None and (self.pid != os.getpid() or self.workers != workers):
+                if self.pid == os.getpid():
+                    self.executor.shutdown(wait=False)
+                self.executor = None
+            if self.executor is None:
+                # 使用 spawn：子行程不繼承父行程的資料庫連線
+                self.executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+                self.workers = workers
+                self.pid = os.getpid()
+            return self.executor
+
+    def discard(self, executor):
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+
+
+_pool = _HashPool()
+
+
+def hash_passwords(raw_passwords, progress=None, workers=None, threshold=None):
+    """
+    批次計算密碼雜湊，回傳與輸入順序相同的 list
+    數量達門檻時以行程共用的 process pool（預設為 CPU 核心數，最多 DEFAULT_MAX_WORKERS）平行計算；
+    progress(done, total) 會在每個 chunk 完成時呼叫
+    """
+    raw_passwords = list(raw_passwords)
+    total = len(raw_passwords)
+    workers = workers or hash_workers()
+    if threshold is None:
+        threshold = getattr(settings, "PASSWORD_HASH_PARALLEL_THRESHOLD", DEFAULT_PARALLEL_THRESHOLD)
+
+    chunks = [raw_passwords[i:i + HASH_CHUNK_SIZE] for i in range(0, total, HASH_CHUNK_SIZE)]
+    hashes = []
+
+    if workers <= 1 or total < threshold:
+        for chunk in chunks:
+            hashes.extend(_hash_chunk(chunk))
+            if progress:
+                progress(len(hashes), total)
+        return hashes
+
+    executor = _pool.get(workers)
+    try:
+        for result in executor.map(_hash_chunk, chunks):
+            hashes.extend(result)
+            if progress:
+                progress(len(hashes), total)
+    except BrokenProcessPool:
+        _pool.discard(executor)
+        raise
+    return hashes
+
+
+def log_progress(label, step=10):
+    """回傳一個將進度（每 step %）寫入 equip_mgmt logger 的 progress callback"""
+    last = [-step]
+
+    def progress(done, total):
+        percent = done * 100 // total if total else 100
+        if percent - last[0] >= step or done == total:
+            last[0] = percent
+            logger.info("%s: %d / %d (%d%%)", label, done, total, percent)
+    return progress
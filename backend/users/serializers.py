@@ -1,8 +1,15 @@
 from rest_framework import serializers
 from users.models import CustomUser
 from departments.models import Department
+from system.fragments import CachedRepresentationMixin, row_values
 
-class CustomUserSerializer(serializers.ModelSerializer):
+
+def user_fragment_version(user):
+    # department_name 來自部門資料表，一併納入版本
+    department = user.department if user.department_id is not None else None
+    return row_values(user), department.name if department is not None else None
+
+class CustomUserSerializer(CachedRepresentationMixin, serializers.ModelSerializer):
     department = serializers.PrimaryKeyRelatedField(
         queryset=Department.objects.all(),
         required=False,
@@ -16,3 +23,6 @@ class CustomUserSerializer(serializers.ModelSerializer):
             'id', 'id_number', 'name', 'email', 'phone',
             'title', 'eip_account', 'department', 'department_name','is_active',
         ]
+
+    def fragment_version(self, instance):
+        return user_fragment_version(instance)
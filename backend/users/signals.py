@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_tokens
+from .models import CustomUser
+
+# ================================================================
+# 人員停用 / 刪除後，其 token 需在各 worker 失效
+# bulk 操作（批次離職、匯入復職）由呼叫端直接 invalidate_user_tokens()
+# ================================================================
+
+
+@receiver(pre_save, sender=CustomUser)
+def user_pre_save(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    # 只有在職狀態實際變更才需要讓各 worker 重新載入；登入只更新 last_login，不需處理
+    instance._was_active = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and "is_active" not in update_fields:
+        return
+    instance._was_active = (
+        sender._base_manager.using(using).filter(pk=instance.pk).values_list("is_active", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=CustomUser)
+def user_post_save(sender, instance, created=False, raw=False, **kwargs):
+    # 新建人員不在快照內會改查資料庫
+    if raw or created:
+        return
+    was_active = getattr(instance, "_was_active", None)
+    if was_active is not None and was_active != instance.is_active:
+        invalidate_user_tokens()
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_post_delete(sender, instance, **kwargs):
+    invalidate_user_tokens()
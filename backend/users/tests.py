@@ -1,3 +1,431 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from departments.models import Department
+from system.models import VersionStamp
+from users.importers import import_users
+from users.models import CustomUser
+from users.name_resolver import AMBIGUOUS, EXACT, UNMATCHED, UserNameResolver, memory_index
+from users.passwords import HASH_CHUNK_SIZE, _HashPool, _pool, hash_passwords
+from users.tokens import TOKEN_BLACKLIST_VERSION_KEY, _BlacklistFilter
+
+
+def user_entry(id_number, eip_account, name, department_name="資訊部", **extra):
+    return {
+        "id_number": id_number,
+        "eip_account": eip_account,
+        "name": name,
+        "department_name": department_name,
+        **extra,
+    }
+
+
+# ================================================================
+# 人員批次匯入（upsert）
+# ================================================================
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        self.it = Department.objects.create(name="資訊部")
+
+    def test_creates_new_and_updates_existing_users(self):
+        existing = CustomUser.objects.create_user(
+            "old.eip", "A100000001", "舊姓名", department=self.it, is_active=False,
+        )
+
+        result = import_users([
+            user_entry("A100000001", "old.eip", "新姓名", "總務部", phone="0912"),
+            user_entry("A100000002", "new.eip", "新人員"),
+        ])
+
+        self.assertEqual((result["created"], result["updated"], result["skipped"]), (1, 1, []))
+        existing.refresh_from_db()
+        self.assertEqual(existing.name, "新姓名")
+        self.assertEqual(existing.phone, "0912")
+        self.assertEqual(existing.department.name, "總務部")
+        # 匯入視為復職
+        self.assertTrue(existing.is_active)
+        created = CustomUser.objects.get(id_number="A100000002")
+        self.assertEqual(created.department, self.it)
+        self.assertTrue(created.check_password("A100000002"))
+
+    def test_duplicate_id_number_in_payload_keeps_last_entry(self):
+        result = import_users([
+            user_entry("A100000001", "first.eip", "第一筆"),
+            user_entry("A100000001", "second.eip", "第二筆"),
+        ])
+
+        self.assertEqual(result["created"], 1)
+        user = CustomUser.objects.get(id_number="A100000001")
+        self.assertEqual((user.eip_account, user.name), ("second.eip", "第二筆"))
+
+    def test_duplicate_eip_account_in_payload_is_skipped(self):
+        result = import_users([
+            user_entry("A100000001", "same.eip", "甲"),
+            user_entry("A100000002", "same.eip", "乙"),
+            user_entry("A100000003", "", "缺帳號"),
+        ])
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(
+            sorted(item["reason"] for item in result["skipped"]),
+            ["EIP帳號重複", "缺少必填欄位"],
+        )
+        self.assertFalse(CustomUser.objects.filter(id_number="A100000002").exists())
+
+    def test_eip_account_owned_by_another_user_is_skipped(self):
+        CustomUser.objects.create_user("taken.eip", "A100000001", "原持有人")
+
+        result = import_users([
+            user_entry("A100000002", "taken.eip", "新人員"),
+            user_entry("A100000003", "free.eip", "另一位"),
+        ])
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual([item["reason"] for item in result["skipped"]], ["EIP帳號已被其他人員使用"])
+        self.assertEqual(CustomUser.objects.get(eip_account="taken.eip").id_number, "A100000001")
+
+    def test_swapping_eip_accounts_skips_both_without_failing(self):
+        # 兩位既有人員互換 EIP 帳號：單一 upsert 無法處理唯一鍵互換，兩筆都回報跳過，其他資料照常匯入
+        a = CustomUser.objects.create_user("eip.a", "A100000001", "甲", department=self.it)
+        b = CustomUser.objects.create_user("eip.b", "A100000002", "乙", department=self.it)
+
+        result = import_users([
+            user_entry("A100000001", "eip.b", "甲"),
+            user_entry("A100000002", "eip.a", "乙"),
+            user_entry("A100000003", "eip.c", "丙"),
+        ])
+
+        self.assertEqual((result["created"], result["updated"]), (1, 0))
+        self.assertEqual(len(result["skipped"]), 2)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.eip_account, b.eip_account), ("eip.a", "eip.b"))
+
+
+class ImportUsersChunkTests(TestCase):
+    def entries(self):
+        return [user_entry(f"A10000000{i}", f"user{i}.eip", f"人員{i}") for i in range(1, 6)]
+
+    def test_each_chunk_commits_with_its_checkpoint(self):
+        # 進度在 transaction 外回報，checkpoint 在 chunk 的 transaction 內
+        base_depth = len(connection.atomic_blocks)
+        checkpoints, reports = [], []
+
+        def checkpoint(state):
+            checkpoints.append((len(connection.atomic_blocks) - base_depth, state["offset"], state["created"]))
+
+        def progress(stage, done, total):
+            if stage == "write":
+                reports.append((len(connection.atomic_blocks) - base_depth, done))
+
+        import_users(self.entries(), chunk_size=2, progress=progress, checkpoint=checkpoint)
+
+        self.assertEqual(checkpoints, [(1, 2, 2), (1, 4, 4), (1, 5, 5)])
+        self.assertEqual(reports, [(0, 2), (0, 4), (0, 5)])
+
+    def test_resume_continues_after_checkpoint(self):
+        entries = self.entries()
+        resume = {"offset": 4, "created": 4, "updated": 0, "skipped": []}
+
+        with mock.patch("users.importers.hash_passwords", side_effect=lambda values, progress: values) as hashes:
+            result = import_users(entries, chunk_size=2, resume=resume)
+
+        hashes.assert_called_once_with(["A100000005"], progress=mock.ANY)
+        self.assertEqual((result["created"], result["updated"]), (5, 0))
+        self.assertEqual(list(CustomUser.objects.values_list("id_number", flat=True)), ["A100000005"])
+
+
+@override_settings(IMPORT_IN_BACKGROUND=False)
+class UsersBulkImportApiTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_import_returns_counts(self):
+        response = self.client.post("/api/users/batch/", {
+            "action": "import",
+            "data": [user_entry("A100000001", "new.eip", "新人員"), "not-a-dict"],
+        }, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual([item["reason"] for item in response.data["skipped"]], ["資料格式錯誤"])
+
+    def test_import_requires_list(self):
+        response = self.client.post("/api/users/batch/", {"action": "import", "data": {}}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+
+
+# ================================================================
+# 人員批次轉移部門 / 離職
+# ================================================================
+@mock.patch("users.views.views_batch.BULK_UPDATE_CHUNK_SIZE", 2)
+class UsersBulkUpdateTests(TestCase):
+    def setUp(self):
+        self.it = Department.objects.create(name="資訊部")
+        self.hr = Department.objects.create(name="人事部")
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+        self.people = [
+            CustomUser.objects.create_user(f"user{i}", f"B10000000{i}", f"人員{i}", department=self.it)
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def bulk(self, **data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/users/batch/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "users_customuser"')]
+        return response.data, updates
+
+    def test_transfer_updates_department_in_chunks(self):
+        ids = [person.pk for person in self.people] + [99999, "abc"]
+
+        data, updates = self.bulk(action="transfer", ids=ids, department_id=self.hr.pk)
+
+        self.assertEqual(data["updated"], ids[:5])
+        self.assertEqual(data["not_found"], [99999, "abc"])
+        self.assertEqual(len(updates), 3)
+        self.assertTrue(all(sql.startswith('UPDATE "users_customuser" SET "department_id" = ') for sql in updates))
+        self.assertEqual(CustomUser.objects.filter(department=self.hr).count(), 5)
+
+    def test_retire_only_writes_is_active(self):
+        ids = [str(self.people[0].pk), self.people[1].pk, 99999]
+
+        data, updates = self.bulk(action="retire", ids=ids)
+
+        self.assertEqual((data["retired"], data["not_found"], data["retired_count"]), (ids[:2], [99999], 2))
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SET "is_active" = ', updates[0])
+        self.assertNotIn('"department_id"', updates[0])
+        self.assertEqual(
+            set(CustomUser.objects.filter(is_active=False).values_list("pk", flat=True)),
+            {self.people[0].pk, self.people[1].pk},
+        )
+
+
+# ================================================================
+# 批次密碼雜湊
+# ================================================================
+class HashPasswordsTests(TestCase):
+    def test_serial_path_keeps_order_and_reports_progress(self):
+        raw = [f"A{n:09d}" for n in range(HASH_CHUNK_SIZE + 5)]
+        progress = mock.Mock()
+
+        hashes = hash_passwords(raw, progress=progress, workers=4, threshold=len(raw) + 1)
+
+        self.assertTrue(all(check_password(r, h) for r, h in zip(raw, hashes)))
+        self.assertEqual(progress.call_args_list, [mock.call(HASH_CHUNK_SIZE, len(raw)), mock.call(len(raw), len(raw))])
+
+    def test_parallel_path_maps_chunks_on_the_shared_pool(self):
+        raw = [f"A{n:09d}" for n in range(HASH_CHUNK_SIZE * 2 + 1)]
+        progress = mock.Mock()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            with mock.patch.object(_pool, "get", return_value=executor) as get:
+                hashes = hash_passwords(raw, progress=progress, workers=2, threshold=1)
+
+        get.assert_called_once_with(2)
+        self.assertTrue(all(check_password(r, h) for r, h in zip(raw, hashes)))
+        self.assertEqual([c.args[0] for c in progress.call_args_list], [50, 100, 101])
+
+    def test_pool_is_reused_and_rebuilt_after_fork_or_breakage(self):
+        pool = _HashPool()
+        executor = pool.get(2)
+        self.assertIs(pool.get(2), executor)
+
+        with mock.patch("users.passwords.os.getpid", return_value=-1):
+            forked = pool.get(2)
+        self.assertIsNot(forked, executor)
+        executor.shutdown(wait=False)
+
+        pool.discard(forked)
+        self.assertIsNone(pool.executor)
+
+
+# ================================================================
+# 人員列表（伺服器端篩選、搜尋、分頁）
+# ================================================================
+class UsersListTests(TestCase):
+    def setUp(self):
+        it = Department.objects.create(name="資訊部")
+        hr = Department.objects.create(name="人事部")
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員", department=it)
+        for i in range(1, 6):
+            CustomUser.objects.create_user(f"it{i}", f"B10000000{i}", f"資訊{i}", department=it)
+        CustomUser.objects.create_user("hr1", "C100000001", "人事甲", department=hr, is_active=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def list_users(self, **params):
+        return self.client.get("/api/users/", params)
+
+    def test_filters_and_paginates_with_total_count(self):
+        response = self.list_users(department="資訊部", is_active="true", ordering="-name", page=2, page_size=2)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["count"], response.data["total_pages"], response.data["page"]), (6, 3, 2))
+        self.assertEqual([user["name"] for user in response.data["results"]], ["資訊3", "資訊2"])
+
+        retired = self.list_users(is_active="false", page_size=20).data
+        self.assertEqual([user["eip_account"] for user in retired["results"]], ["hr1"])
+        search = self.list_users(search="B10000000", page_size=20).data
+        self.assertEqual(search["count"], 5)
+
+    def test_page_query_count_does_not_grow_with_page_size(self):
+        def queries_for(page_size):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.list_users(page_size=page_size).status_code, 200)
+            return len(queries.captured_queries)
+
+        # 部門名稱以 select_related 一起取得，不會每位人員多一次查詢
+        self.assertEqual(queries_for(2), queries_for(7))
+
+
+# ================================================================
+# 姓名批次比對
+# ================================================================
+class UserNameResolverTests(TestCase):
+    def setUp(self):
+        # 記憶體索引依 commit 後 bump 的版本號重建，測試的 transaction 不會 commit
+        memory_index.invalidate()
+        self.admin = CustomUser.objects.create_user("admin", "A000000000", "管理員")
+        self.wang = CustomUser.objects.create_user("wang1", "B100000001", "王小明")
+        CustomUser.objects.create_user("wang2", "B100000002", "王小華")
+        CustomUser.objects.create_user("lin1", "B100000003", "林大同")
+        CustomUser.objects.create_user("lin2", "B100000004", "林大同")
+
+    def test_exact_ambiguous_and_unmatched(self):
+        results = UserNameResolver().resolve(["王小明", "林大同", "小明", "王小", "王小明同", " ", ""])
+
+        self.assertEqual(set(results), {"王小明", "林大同", "小明", "王小", "王小明同"})
+        self.assertEqual((results["王小明"]["status"], results["王小明"]["user"]), (EXACT, self.wang))
+        # 同名兩人
+        self.assertEqual(results["林大同"]["status"], AMBIGUOUS)
+        self.assertEqual({c["id_number"] for c in results["林大同"]["candidates"]}, {"B100000003", "B100000004"})
+        # 唯一包含 → exact；多人包含 → ambiguous
+        self.assertEqual((results["小明"]["status"], results["小明"]["user"]), (EXACT, self.wang))
+        self.assertEqual(results["王小"]["status"], AMBIGUOUS)
+        self.assertEqual(len(results["王小"]["candidates"]), 2)
+        # 找不到時附上相似姓名，依相似度排序
+        missing = results["王小明同"]
+        self.assertEqual((missing["status"], missing["user"]), (UNMATCHED, None))
+        self.assertEqual(missing["candidates"][0]["id_number"], "B100000001")
+        scores = [c["score"] for c in missing["candidates"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_query_count_does_not_grow_with_names(self):
+        resolver = UserNameResolver()
+        resolver.resolve(["暖機"])
+
+        def queries_for(names):
+            with CaptureQueriesContext(connection) as queries:
+                resolver.resolve(names)
+            return len(queries.captured_queries)
+
+        self.assertEqual(queries_for(["王小明", "小明"]), queries_for(["王小明", "小明", "王小", "大同", "陳小明", "林"]))
+
+    def test_resolve_endpoint_validates_names(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.post("/api/users/resolve/", {"names": ["小明", "不存在"]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["小明"]["user"]["id_number"], "B100000001")
+        self.assertEqual(response.data["不存在"]["status"], UNMATCHED)
+        self.assertEqual(client.post("/api/users/resolve/", {"names": [1]}, format="json").status_code, 400)
+
+
+# ================================================================
+# 人員停用時讓 token 失效
+# ================================================================
+class UserTokenInvalidationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("worker", "B100000001", "員工甲")
+
+    def save_with(self, **fields):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        for name, value in fields.items():
+            setattr(user, name, value)
+        with mock.patch("users.signals.invalidate_user_tokens") as invalidate:
+            user.save()
+        return invalidate
+
+    def test_editing_other_fields_does_not_invalidate(self):
+        self.save_with(phone="0912345678").assert_not_called()
+
+    def test_deactivating_and_reactivating_invalidates(self):
+        self.save_with(is_active=False).assert_called_once()
+        self.save_with(is_active=True).assert_called_once()
+
+    def test_login_update_does_not_invalidate(self):
+        with mock.patch("users.signals.invalidate_user_tokens") as invalidate:
+            self.user.save(update_fields=["last_login"])
+
+        invalidate.assert_not_called()
+
+    def test_delete_invalidates(self):
+        with mock.patch("users.signals.invalidate_user_tokens") as invalidate:
+            self.user.delete()
+
+        invalidate.assert_called_once()
+
+
+# ================================================================
+# refresh token 黑名單 Bloom filter 同步
+# ================================================================
+@override_settings(AUTH_VERSION_CHECK_INTERVAL=0)
+class BlacklistFilterSyncTests(TestCase):
+    def setUp(self):
+        self.filter = _BlacklistFilter()
+
+    def blacklist(self, pk, jti):
+        token = OutstandingToken.objects.create(
+            jti=jti, token=jti, expires_at=timezone.now() + timedelta(days=1),
+        )
+        BlacklistedToken.objects.create(id=pk, token=token)
+        VersionStamp.bump(TOKEN_BLACKLIST_VERSION_KEY)
+
+    def test_loads_existing_and_new_blacklist_entries(self):
+        self.blacklist(1, "jti-1")
+        self.assertTrue(self.filter.might_contain("jti-1"))
+        self.assertFalse(self.filter.might_contain("jti-2"))
+
+        self.blacklist(2, "jti-2")
+
+        self.assertTrue(self.filter.might_contain("jti-2"))
+
+    def test_lower_id_committed_later_is_not_missed(self):
+        # id 1 先取號但較晚 commit：同步時已看到 id 2，之後仍須載入 id 1
+        self.filter.might_contain("warm-up")
+        self.blacklist(2, "jti-2")
+        self.assertTrue(self.filter.might_contain("jti-2"))
+
+        self.blacklist(1, "jti-1")
+
+        self.assertTrue(self.filter.might_contain("jti-1"))
+        self.assertEqual((self.filter.safe_id, self.filter.gaps), (2, {}))
+
+    def test_gap_is_dropped_after_overlap(self):
+        self.filter.might_contain("warm-up")
+        self.blacklist(2, "jti-2")
+        self.filter.might_contain("jti-2")
+        self.assertEqual(list(self.filter.gaps), [1])
+
+        with override_settings(TOKEN_BLACKLIST_SYNC_OVERLAP=0):
+            VersionStamp.bump(TOKEN_BLACKLIST_VERSION_KEY)
+            self.filter.might_contain("jti-2")
+
+        self.assertEqual((self.filter.safe_id, self.filter.gaps, self.filter.seen), (2, {}, set()))
@@ -0,0 +1,158 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+from system.models import VersionStamp
+
+# 黑名單新增 / 清理時 bump，各 worker 依此同步 Bloom filter
+TOKEN_BLACKLIST_VERSION_KEY = "token_blacklist"
+
+
+class BloomFilter:
+    """
+    固定大小的 Bloom filter：不在集合內的 key 一定回傳 False，
+    在集合內的 key 一定回傳 True，不在集合內的 key 有 error_rate 機率誤判為 True
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # 以一次 blake2b 產生兩個 64-bit 值，組合出 k 個位置（double hashing）
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class _BlacklistFilter:
+    """
+    行程內的黑名單 JTI Bloom filter：
+    - 第一次使用時由資料庫載入所有未過期的黑名單 JTI
+    - TTL 內直接讀記憶體；過期後只查一次版本號，版本變更才載入新增的黑名單
+    - 筆數超過容量時以兩倍容量重建，維持誤判率
+    Bloom filter 不可漏掉任何黑名單（不可有 false negative）：
+    PostgreSQL 的 sequence id 不一定依 commit 順序出現（id 10 可能在 id 11 之後才 commit），
+    因此只推進到「之前沒有缺號」的 id（safe_id）；之後的範圍每次同步都重新讀取，
+    缺號超過 TOKEN_BLACKLIST_SYNC_OVERLAP 秒仍未出現才視為已 rollback
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.safe_id = 0
+        self.seen = set()   # safe_id 之後已載入的 id
+        self.gaps = {}      # 缺號 → 第一次發現的時間
+        self.version = None
+        self.checked_at = 0.0
+
+    def ttl(self):
+        return getattr(settings, "AUTH_VERSION_CHECK_INTERVAL", 5)
+
+    def overlap(self):
+        return getattr(settings, "TOKEN_BLACKLIST_SYNC_OVERLAP", 60)
+
+    def might_contain(self, jti):
+        now = time.monotonic()
+        if self.filter is None or now - self.checked_at >= self.ttl():
+            with self.lock:
+                if self.filter is None or now - self.checked_at >= self.ttl():
+                    self._refresh()
+                    self.checked_at = time.monotonic()
+        return jti in self.filter
+
+    def add(self, jti):
+        with self.lock:
+            if self.filter is not None:
+                self.filter.add(jti)
+
+    def _refresh(self):
+        version = VersionStamp.current(TOKEN_BLACKLIST_VERSION_KEY)
+        if self.filter is None:
+            self._rebuild(getattr(settings, "TOKEN_BLACKLIST_FILTER_CAPACITY", 100000))
+        elif version != self.version or self.gaps:
+            self._load(BlacklistedToken.objects.filter(id__gt=self.safe_id))
+            if self.filter.count > self.filter.capacity:
+                self._rebuild(self.filter.count * 2)
+        self.version = version
+
+    def _rebuild(self, capacity):
+        # 最後 overlap 秒內加入的黑名單之間可能還有未 commit 的 id，safe_id 停在這之前
+        cutoff = timezone.now() - timedelta(seconds=self.overlap())
+        safe_id = (
+            BlacklistedToken.objects.filter(blacklisted_at__lt=cutoff)
+            .order_by("-id").values_list("id", flat=True).first() or 0
+        )
+        active = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        capacity = max(capacity, active.count() * 2)
+        self.filter = BloomFilter(capacity, getattr(settings, "TOKEN_BLACKLIST_FILTER_ERROR_RATE", 0.001))
+        self.safe_id = safe_id
+        self.seen = set()
+        self.gaps = {}
+        self._load(active)
+
+    def _load(self, queryset):
+        for pk, jti in queryset.order_by("id").values_list("id", "token__jti").iterator(chunk_size=5000):
+            if pk in self.seen:
+                continue
+            self.filter.add(jti)
+            if pk > self.safe_id:
+                self.seen.add(pk)
+        self._advance()
+
+    def _advance(self):
+        if not self.seen:
+            self.gaps = {}
+            return
+        now = time.monotonic()
+        gaps = {}
+        for pk in range(self.safe_id + 1, max(self.seen)):
+            if pk not in self.seen:
+                first_noticed = self.gaps.get(pk, now)
+                if now - first_noticed < self.overlap():
+                    gaps[pk] = first_noticed
+        self.gaps = gaps
+        self.safe_id = min(gaps) - 1 if gaps else max(self.seen)
+        self.seen = {pk for pk in self.seen if pk > self.safe_id}
+
+
+blacklist_filter = _BlacklistFilter()
+
+
+class RefreshToken(BaseRefreshToken):
+    """
+    黑名單檢查先查行程內的 Bloom filter：
+    不在 filter 內的 JTI 一定沒有被列入黑名單，不需查詢資料庫；可能命中時才以資料庫確認
+    """
+
+    def check_blacklist(self):
+        if not blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            return
+        super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        VersionStamp.bump(TOKEN_BLACKLIST_VERSION_KEY)
+        # 本行程立即生效，其他 worker 於 AUTH_VERSION_CHECK_INTERVAL 內同步
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
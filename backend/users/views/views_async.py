@@ -0,0 +1,26 @@
+from departments.models import Department
+from system.async_api import async_read_view, json_response, paginate
+from system.versioning import conditional_on_tables
+from users.filters import filter_users
+from users.models import CustomUser
+from users.pagination import UserPagination
+from users.serializers import CustomUserSerializer
+from users.views import views_user
+
+User = CustomUser  # 避免混淆
+
+# ASGI（backend.urls_async）使用的 async 讀取端點；POST 仍由 views_user.users_list 處理
+
+
+@async_read_view(views_user.users_list)
+@conditional_on_tables(User, Department)
+async def users_list(request):
+    qs = filter_users(request.GET)
+
+    # 帶 page / page_size 時回傳分頁格式，否則維持原本的完整列表
+    if "page" in request.GET or "page_size" in request.GET:
+        page, paginated = await paginate(UserPagination(), qs, request)
+        return json_response(paginated(CustomUserSerializer(page, many=True).data))
+
+    rows = [user async for user in qs]
+    return json_response(CustomUserSerializer(rows, many=True).data)
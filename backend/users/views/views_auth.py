@@ -1,9 +1,11 @@
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import authenticate
+from users.authentication import load_token_user, set_user_claims
+from users.tokens import RefreshToken
 
 # ------------------------------
 # login
@@ -19,7 +21,8 @@ def login_view(request):
     if user is None:
         return Response({'detail': 'Invalid credentials'}, status=401)
     
-    refresh = RefreshToken.for_user(user)
+    # 人員資料寫入 token，之後的請求不需再查詢使用者
+    refresh = set_user_claims(RefreshToken.for_user(user), user)
     access = refresh.access_token
     
     return Response({
@@ -46,11 +49,16 @@ def token_refresh_view(request):
     
     try:
         refresh = RefreshToken(refresh_token)
-        access = str(refresh.access_token)
-        return Response({"access": access})
     except TokenError:
         return Response({"detail": "Invalid refresh token"}, status=401)
 
+    # 已停用 / 刪除的人員不可再換發；claim 以目前的人員資料更新
+    user = load_token_user(int(refresh[api_settings.USER_ID_CLAIM]))
+    if user is None:
+        return Response({"detail": "User is inactive"}, status=401)
+    access = set_user_claims(refresh.access_token, user)
+    return Response({"access": str(access)})
+
 
 # ------------------------------
 # logout
@@ -1,14 +1,71 @@
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from users.authentication import ClaimJWTAuthentication, invalidate_user_tokens
+from django.conf import settings
+from django.db import transaction
 from users.models import CustomUser
 from departments.models import Department
+from users.importers import import_users
+from users.jobs import enqueue_user_import
+from system.jobs import job_data
+from inventory.models import Asset
+from reports.audit import record_updates
+from reports.summary import lock_assets, track_inventory
+from system.fragments import fragment_cache
+from system.versioning import touch_tables
 
 User = CustomUser
 
+BULK_UPDATE_CHUNK_SIZE = 1000
+
+
+def update_users_in_chunks(ids, **fields):
+    """
+    以 UPDATE ... WHERE id IN (...) 分批更新指定欄位（只寫入該欄位）
+    鎖定時一併讀出原值，供稽核紀錄比對
+    回傳 (已更新的 ids, 找不到的 ids)，順序與輸入相同
+    """
+    requested = {}
+    for uid in ids:
+        try:
+            requested.setdefault(int(uid), uid)
+        except (TypeError, ValueError):
+            continue
+
+    found = set()
+    pks = list(requested)
+    columns = [User._meta.get_field(name).attname for name in fields]
+    after = {column: getattr(value, "pk", value) for column, value in zip(columns, fields.values())}
+    with transaction.atomic():
+        for start in range(0, len(pks), BULK_UPDATE_CHUNK_SIZE):
+            chunk = pks[start:start + BULK_UPDATE_CHUNK_SIZE]
+            rows = list(
+                User.objects.select_for_update().filter(id__in=chunk).values("id", *columns)
+            )
+            existing = [row["id"] for row in rows]
+            User.objects.filter(id__in=existing).update(**fields)
+            record_updates(User, [
+                (row["id"], {column: row[column] for column in columns}, after)
+                for row in rows
+            ])
+            found.update(existing)
+        touch_tables(User)
+        fragment_cache.evict(User, found)
+
+    updated = [requested[pk] for pk in pks if pk in found]
+    not_found = [uid for uid in ids if _as_pk(uid) not in found]
+    return updated, not_found
+
+
+def _as_pk(uid):
+    try:
+        return int(uid)
+    except (TypeError, ValueError):
+        return None
+
 @api_view(['POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimJWTAuthentication])
 @permission_classes([IsAuthenticated])
 def users_bulk(request):
     """
@@ -25,53 +82,12 @@ def users_bulk(request):
         if not isinstance(users_data, list):
             return Response({"error": "資料格式錯誤，必須是 JSON 陣列"}, status=400)
 
-        created_count = 0
-        updated_count = 0
-        skipped = []
-
-        for entry in users_data:
-            try:
-                id_number = entry.get("id_number", "").strip()
-                eip_account = entry.get("eip_account", "").strip()
-                name = entry.get("name", "").strip()
-                dept_name = entry.get("department_name", "").strip()
-                title = entry.get("title", "").strip()
-                email = entry.get("email", "").strip()
-                phone = entry.get("phone", "").strip()
-
-                if not all([id_number, eip_account, name, dept_name]):
-                    skipped.append({"entry": entry, "reason": "缺少必填欄位"})
-                    continue
-
-                department, _ = Department.objects.get_or_create(name=dept_name)
-                person, created = User.objects.update_or_create(
-                    id_number=id_number,
-                    defaults={
-                        "name": name,
-                        "email": email,
-                        "phone": phone,
-                        "title": title,
-                        "eip_account": eip_account,
-                        "department": department,
-                        "is_active": True,  # 若之前離職，現在重新入職
-                    }
-                )
-                person.set_password(id_number)
-                person.save()
-
-                if created:
-                    created_count += 1
-                else:
-                    updated_count += 1
-
-            except Exception as e:
-                skipped.append({"entry": entry, "reason": str(e)})
+        # 背景工作：立即回傳 job，進度見 /api/system/jobs/<id>/
+        if settings.IMPORT_IN_BACKGROUND:
+            job = enqueue_user_import(users_data, request.user)
+            return Response(job_data(job), status=202)
 
-        return Response({
-            "created": created_count,
-            "updated": updated_count,
-            "skipped": skipped
-        })
+        return Response(import_users(users_data))
 
     elif action == "transfer":
         ids = data.get("ids")
@@ -84,17 +100,14 @@ def users_bulk(request):
         except Department.DoesNotExist:
             return Response({"error": "目標部門不存在"}, status=400)
 
-        updated = []
-        not_found = []
-
-        for uid in ids:
-            try:
-                person = User.objects.get(id=uid)
-                person.department = department
-                person.save()
-                updated.append(uid)
-            except User.DoesNotExist:
-                not_found.append(uid)
+        # 轉移部門會改變其持有資產在庫存彙總中的部門
+        # 先鎖定人員再鎖定其資產（與出入庫相同順序），期間不會有資產被領用或歸還
+        pks = [pk for pk in map(_as_pk, ids) if pk is not None]
+        with transaction.atomic():
+            list(User.objects.select_for_update().filter(id__in=pks).order_by("id").values_list("id", flat=True))
+            assets = lock_assets(Asset.objects.filter(owner_user__id__in=pks))
+            with track_inventory(assets):
+                updated, not_found = update_users_in_chunks(ids, department=department)
 
         return Response({
             "updated": updated,
@@ -107,18 +120,11 @@ def users_bulk(request):
         if not ids:
             return Response({"error": "請提供 ids 陣列"}, status=400)
 
-        retired = []
-        not_found = []
-
-        for uid in ids:
-            try:
-                person = User.objects.get(id=uid)
-                # 假設離職是設定某個欄位，如 is_active=False
-                person.is_active = False
-                person.save()
-                retired.append(uid)
-            except User.DoesNotExist:
-                not_found.append(uid)
+        # 離職：is_active=False
+        retired, not_found = update_users_in_chunks(ids, is_active=False)
+        if retired:
+            # 離職人員的 token 立即失效
+            invalidate_user_tokens()
 
         return Response({
             "retired": retired,
@@ -2,23 +2,35 @@ from rest_framework.decorators import api_view, authentication_classes, permissi
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from users.authentication import ClaimJWTAuthentication
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from users.models import CustomUser
 from users.serializers import CustomUserSerializer
+from users.filters import filter_users
+from users.pagination import UserPagination
+from users.name_resolver import UserNameResolver
 from departments.models import Department
+from inventory.models import Asset
+from reports.summary import lock_assets, track_inventory
+from system.versioning import conditional_on_tables
 
 User = CustomUser  # 避免混淆
 
 @api_view(['GET', 'POST'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimJWTAuthentication])
 @permission_classes([IsAuthenticated])
+@conditional_on_tables(User, Department)
 def users_list(request):
     if request.method == 'GET':
-        department_name = request.GET.get("department")
-        qs = User.objects.all()
-        if department_name:
-            qs = qs.filter(department__name=department_name)
+        qs = filter_users(request.GET)
+
+        # 帶 page / page_size 時回傳分頁格式，否則維持原本的完整列表
+        if "page" in request.GET or "page_size" in request.GET:
+            paginator = UserPagination()
+            page = paginator.paginate_queryset(qs, request)
+            serializer = CustomUserSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
 
         serializer = CustomUserSerializer(qs, many=True)
         return Response(serializer.data, status=200)
@@ -53,8 +65,9 @@ def users_list(request):
 
 
 @api_view(['GET', 'PUT', 'DELETE'])
-@authentication_classes([JWTAuthentication])
+@authentication_classes([ClaimJWTAuthentication])
 @permission_classes([IsAuthenticated])
+@conditional_on_tables(User, Department)
 def users_detail(request, pk):
     person = get_object_or_404(User, id=pk)
 
@@ -65,10 +78,39 @@ def users_detail(request, pk):
     elif request.method == 'PUT':
         serializer = CustomUserSerializer(person, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            # 部門變更會影響其持有資產在庫存彙總中的部門
+            # 先鎖定人員再鎖定其資產（與出入庫相同順序），期間不會有資產被領用或歸還
+            with transaction.atomic():
+                User.objects.select_for_update().filter(pk=person.pk).exists()
+                assets = lock_assets(Asset.objects.filter(owner_user_id=person.id_number))
+                with track_inventory(assets):
+                    serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
     elif request.method == 'DELETE':
         person.delete()
         return Response({"message": "User deleted successfully"}, status=204)
+
+
+@api_view(['POST'])
+@authentication_classes([ClaimJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def users_resolve(request):
+    """
+    依姓名批次查找人員：names=[...]
+    回傳每個姓名的 status（exact / ambiguous / unmatched）、user 與排序後的 candidates
+    """
+    names = request.data.get("names")
+    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        return Response({"error": "names 必須是字串陣列"}, status=400)
+
+    results = UserNameResolver().resolve(names)
+    return Response({
+        name: {
+            "status": result["status"],
+            "user": CustomUserSerializer(result["user"]).data if result["user"] else None,
+            "candidates": result["candidates"],
+        }
+        for name, result in results.items()
+    })
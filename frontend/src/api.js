@@ -19,6 +19,17 @@ const clearTokens = () => {
   localStorage.removeItem("refresh_token");
 };
 
+// ====== 寫入後的讀取走主庫（read-your-writes） ======
+// 後端在有寫入的回應帶上 X-DB-Primary-Until（秒數時間戳），期限內的請求把它帶回去
+// 跨來源的 cookie 不會送出，所以改用 header
+const PRIMARY_UNTIL_HEADER = "X-DB-Primary-Until";
+let primaryUntil = 0;
+
+const rememberPrimaryUntil = (response) => {
+  const value = Number(response?.headers?.[PRIMARY_UNTIL_HEADER.toLowerCase()]);
+  if (value > primaryUntil) primaryUntil = value;
+};
+
 // ====== 主動檢查 token 是否快過期 ======
 const isTokenExpiringSoon = (token) => {
   if (!token) return true;
@@ -87,13 +98,21 @@ api.interceptors.request.use(async (config) => {
     config.headers.Authorization = `Bearer ${token}`;
   }
 
+  if (primaryUntil > Date.now() / 1000) {
+    config.headers[PRIMARY_UNTIL_HEADER] = String(primaryUntil);
+  }
+
   return config;
 }, (error) => Promise.reject(error));
 
 // ====== Response 攔截器 ======
 api.interceptors.response.use(
-  (response) => response,
+  (response) => {
+    rememberPrimaryUntil(response);
+    return response;
+  },
   async (error) => {
+    rememberPrimaryUntil(error.response);
     const originalRequest = error.config;
     
     // 如果 config 不存在 (極少數情況)，直接 reject